@@ -7,6 +7,7 @@ from __future__ import annotations
 import logging
 import types
 from collections.abc import Iterable, Iterator
+from copy import deepcopy
 from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
 from pathlib import Path
@@ -40,6 +41,136 @@ class ConfigurationError(Exception):
     """Error in pool configuration"""
 
 
+# parsed YAML files by resolved path, with the file stat when parsed
+ParsedYaml = dict[Path, tuple[tuple[int, int], Any]]
+_PARSED_YAML: ParsedYaml = {}
+
+
+def _parse_yaml(path: Path) -> Any:
+    path = path.resolve()
+    stat = path.stat()
+    # a modified file is parsed again
+    key = (stat.st_mtime_ns, stat.st_size)
+    cached = _PARSED_YAML.get(path)
+    if cached is None or cached[0] != key:
+        cached = (key, yaml.safe_load(path.read_text()))
+        _PARSED_YAML[path] = cached
+    return cached[1]
+
+
+def load_yaml(path: Path) -> Any:
+    """Parse a YAML file, at most once per process (unless the file is modified).
+
+    The parsed result is shared, so a copy is returned that the caller may modify.
+    """
+    return deepcopy(_parse_yaml(path))
+
+
+def parse_pool_files(paths: Iterable[Path]) -> ParsedYaml:
+    """Parse pool files and all parents they refer to, so they can be passed to
+    `preload_yaml` in worker processes instead of being parsed again by each.
+
+    Files which don't exist are skipped, so the error is raised when the pool is
+    loaded.
+    """
+    result: ParsedYaml = {}
+    pending = list(paths)
+    while pending:
+        path = pending.pop().resolve()
+        if path in result or not path.is_file():
+            continue
+        raw = _parse_yaml(path)
+        result[path] = _PARSED_YAML[path]
+        if isinstance(raw, dict):
+            pending.extend(
+                path.parent / f"{parent}.yml" for parent in raw.get("parents", [])
+            )
+    return result
+
+
+def preload_yaml(parsed: ParsedYaml) -> None:
+    """Add YAML files parsed by `parse_pool_files` in another process."""
+    _PARSED_YAML.update(parsed)
+
+
+# cron fields are: second minute hour day-of-month month day-of-week
+# each field in an entry is a set of values, or None for "*"
+CronEntry = tuple[frozenset[int] | None, ...]
+# order in which fields are merged: the calendar fields vary most in annual schedules
+CRON_MERGE_ORDER = (3, 4, 2, 1, 0, 5)
+# order in which fields are compared when sorting the result
+CRON_SORT_ORDER = (4, 3, 5, 2, 1, 0)
+
+
+def _cron_field(values: frozenset[int] | None) -> str:
+    """Format the values for a cron field, using ranges and steps where possible"""
+    if values is None:
+        return "*"
+    ordered = sorted(values)
+    parts = []
+    idx = 0
+    while idx < len(ordered):
+        end = idx
+        if idx + 2 < len(ordered):
+            step = ordered[idx + 1] - ordered[idx]
+            while end + 1 < len(ordered) and ordered[end + 1] - ordered[end] == step:
+                end += 1
+        # a range is only shorter than a list for 3 or more values
+        if end - idx >= 2:
+            part = f"{ordered[idx]}-{ordered[end]}"
+            parts.append(part if step == 1 else f"{part}/{step}")
+            idx = end + 1
+        else:
+            parts.append(str(ordered[idx]))
+            idx += 1
+    return ",".join(parts)
+
+
+def compact_crons(times: Iterable[tuple[int | None, ...]]) -> list[str]:
+    """Build a compact set of cron patterns which fire at exactly the given times.
+
+    Args:
+        times: cron field values for each time (None for "*")
+
+    Returns:
+        Strings in simple cron format. Patterns which differ in only one field are
+        merged, until no more patterns can be merged.
+    """
+    entries: set[CronEntry] = {
+        tuple(None if value is None else frozenset((value,)) for value in time)
+        for time in times
+    }
+    merged = True
+    while merged:
+        merged = False
+        for field in CRON_MERGE_ORDER:
+            groups: dict[CronEntry, set[int]] = {}
+            for entry in entries:
+                values = entry[field]
+                if values is None:
+                    break
+                rest = entry[:field] + entry[field + 1 :]
+                groups.setdefault(rest, set()).update(values)
+            else:
+                if len(groups) < len(entries):
+                    entries = {
+                        (*rest[:field], frozenset(values), *rest[field:])
+                        for rest, values in groups.items()
+                    }
+                    merged = True
+
+    def _sort_key(entry: CronEntry) -> tuple[int, ...]:
+        return tuple(
+            -1 if entry[field] is None else min(entry[field] or ())
+            for field in CRON_SORT_ORDER
+        )
+
+    return [
+        " ".join(_cron_field(values) for values in entry)
+        for entry in sorted(entries, key=_sort_key)
+    ]
+
+
 class MachineTypes:
     """Database of all machine types available, by provider and architecture."""
 
@@ -51,6 +182,15 @@ class MachineTypes:
     def from_file(cls, machines_yml: Path) -> MachineTypes:
         return cls(yaml.safe_load(machines_yml.read_text()))
 
+    @property
+    def max_launch_configs(self) -> int | None:
+        return self._data.get("max_launch_configs")
+
+    def _machine(
+        self, provider: str, architecture: str, machine: str
+    ) -> dict[str, Any]:
+        return self._data.get(provider, {}).get(architecture, {}).get(machine, {})
+
     def cpus(self, provider: str, architecture: str, machine: str):
         return self._data[provider][architecture][machine]["cpu"]
 
@@ -60,11 +200,23 @@ class MachineTypes:
         architecture: str,
         machine: str,
     ) -> frozenset[str]:
-        machine_data = (
-            self._data.get(provider, {}).get(architecture, {}).get(machine, {})
-        )
+        machine_data = self._machine(provider, architecture, machine)
         return frozenset(machine_data.get("zone_blacklist", []))
 
+    def cost(
+        self, provider: str, architecture: str, machine: str, zone: str
+    ) -> float | None:
+        """Expected hourly cost per CPU of a machine in a zone, accounting for
+        preemption. None if there is no price for the zone, or the CPU count of
+        the machine is unknown."""
+        machine_data = self._machine(provider, architecture, machine)
+        price = machine_data.get("prices", {}).get(zone)
+        cpu = machine_data.get("cpu")
+        if price is None or not cpu:
+            return None
+        preemption = machine_data.get("preemption", {}).get(zone, 0)
+        return float(price) / cpu / (1 - preemption)
+
 
 @dataclass
 class FuzzingPoolConfig:
@@ -131,11 +283,11 @@ class FuzzingPoolConfig:
             raise ConfigurationError(
                 f"attempt to resolve cyclic configuration, {name} already encountered"
             )
-        raw = yaml.safe_load(path.read_text())
+        raw = load_yaml(path)
         result: dict[str, Any] = {}
 
         for parent in raw.get("parents", []):
-            par = cls._load_partial(path.parent / f"{parent}.yml", loaded)
+            par = cls._load_partial(path.parent / f"{parent}.yml", loaded | {name})
             cls._overwrite(result, par)
         cls._overwrite(result, raw)
         return result
@@ -313,6 +465,10 @@ class FuzzingPoolConfig:
                     )
             yield type(self)(**this)
 
+    def launch_params(self) -> dict[str, Any]:
+        """Parameters used by `fuzzing-pool-launch` to run a task in this pool"""
+        return {"command": self.command, "env": self.env, "name": self.name}
+
     def get_machine_list(
         self, machine_types: MachineTypes
     ) -> Iterable[tuple[str, frozenset[str]]]:
@@ -352,30 +508,34 @@ class FuzzingPoolConfig:
         interval = timedelta(seconds=self.cycle_time)
 
         # special case if the cycle time is a factor of 24 hours
+        times: list[tuple[int | None, ...]] = []
         if (24 * 60 * 60) % self.cycle_time == 0:
             stop = now + timedelta(days=1)
             while now < stop:
                 now += interval
-                yield f"{now.second} {now.minute} {now.hour} * * *"
-            return
+                times.append((now.second, now.minute, now.hour, None, None, None))
 
         # special case if the cycle time is a factor of 7 days
-        if (7 * 24 * 60 * 60) % self.cycle_time == 0:
+        elif (7 * 24 * 60 * 60) % self.cycle_time == 0:
             stop = now + timedelta(days=7)
             while now < stop:
                 now += interval
                 weekday = now.isoweekday() % 7
-                yield f"{now.second} {now.minute} {now.hour} * * {weekday}"
-            return
+                times.append((now.second, now.minute, now.hour, None, None, weekday))
 
         # if the cycle can't be represented as a daily or weekly pattern, then it is
         #   awkward to represent in cron format: resort to generating an annual schedule
         # the cycle will glitch if it really runs for the full year, and either have
         #   dead time or overlapping runs, happening once around the anniversary.
-        stop = now + timedelta(days=365)
-        while now < stop:
-            now += interval
-            yield f"{now.second} {now.minute} {now.hour} {now.day} {now.month} *"
+        else:
+            stop = now + timedelta(days=365)
+            while now < stop:
+                now += interval
+                times.append(
+                    (now.second, now.minute, now.hour, now.day, now.month, None)
+                )
+
+        yield from compact_crons(times)
 
     @staticmethod
     def alias_cpu(cpu_name: str) -> str:
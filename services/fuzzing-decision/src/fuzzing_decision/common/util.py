@@ -8,11 +8,13 @@ import os
 import re
 import stat
 from collections.abc import Callable
+from functools import cache
 from pathlib import Path
 from typing import Any
 
 import yaml
-from jsonschema import validate
+from jsonschema.exceptions import best_match
+from jsonschema.validators import validator_for
 from referencing import Registry, Resource
 
 PathArg = str | Path
@@ -31,17 +33,32 @@ def _load_schema_cache() -> Registry:
 SCHEMA_CACHE = _load_schema_cache()
 
 
+SCHEMAS_BY_NAME = {
+    SCHEMA_CACHE[uri].contents["title"]: SCHEMA_CACHE[uri].contents
+    for uri in SCHEMA_CACHE
+}
+
+
 def _schema_by_name(name: str):
-    for uri in SCHEMA_CACHE:
-        schema = SCHEMA_CACHE[uri]
-        if schema.contents["title"] == name:
-            return schema.contents
-    raise RuntimeError(f"Unknown schema name: {name}")  # pragma: no cover
+    try:
+        return SCHEMAS_BY_NAME[name]
+    except KeyError:  # pragma: no cover
+        raise RuntimeError(f"Unknown schema name: {name}") from None
 
 
-def validate_schema_by_name(instance: dict[str, str] | str, name: str):
+@cache
+def _validator_by_name(name: str):
     schema = _schema_by_name(name)
-    return validate(instance=instance, schema=schema, registry=SCHEMA_CACHE)
+    cls = validator_for(schema)
+    cls.check_schema(schema)
+    return cls(schema, registry=SCHEMA_CACHE)
+
+
+def validate_schema_by_name(instance: dict[str, str] | str, name: str):
+    # same as `jsonschema.validate()`, but the validator is built once per schema
+    error = best_match(_validator_by_name(name).iter_errors(instance))
+    if error is not None:
+        raise error
 
 
 def onerror(func: Callable[[PathArg], None], path: PathArg, _exc_info: Any) -> None:
@@ -9,16 +9,14 @@ import os
 import subprocess
 import tempfile
 from pathlib import Path
-from time import sleep
 from typing import Any
 
 import yaml
 
 from . import taskcluster
+from .retry import GIT_RETRY, is_transient_git_error
 
 LOG = logging.getLogger(__name__)
-RETRIES = 10
-RETRY_SLEEP = 30
 
 
 class Workflow:
@@ -127,20 +125,22 @@ class Workflow:
                     f"ssh -v -i '{self.ssh_private_key}' -o IdentitiesOnly=yes"
                 )
             cmd = ["git", "fetch", "-q", "origin", revision]
-            for _ in range(RETRIES - 1):
-                result = subprocess.run(
-                    cmd, cwd=str(path), env=env, stdout=subprocess.PIPE
+            try:
+                GIT_RETRY.call(
+                    lambda: subprocess.run(
+                        cmd,
+                        cwd=str(path),
+                        env=env,
+                        check=True,
+                        capture_output=True,
+                        text=True,
+                    ),
+                    "git fetch",
+                    is_transient_git_error,
                 )
-                if result.returncode == 0:
-                    break
-                LOG.warning(
-                    "git fetch returned %d, retrying after %ds",
-                    result.returncode,
-                    RETRY_SLEEP,
-                )
-                sleep(RETRY_SLEEP)
-            else:
-                subprocess.check_output(cmd, cwd=str(path))
+            except subprocess.CalledProcessError as exc:
+                LOG.error("git fetch returned error:\n%s", exc.stderr)
+                raise
             cmd = ["git", "-c", "advice.detachedHead=false", "checkout", revision]
             subprocess.check_output(cmd, cwd=str(path))
             LOG.info(f"Using cloned config files in {path}")
@@ -15,4 +15,7 @@ PROVIDER_IDS = {
     "gcp": "community-tc-workers-google",
 }
 DECISION_TASK_SECRET = "project/fuzzing/decision"
+# resolved pool configuration published by the decision task for fuzzing tasks
+POOL_CONFIG_ARTIFACT = "private/fuzzing/pool-config.json"
+POOL_CONFIG_PATH = "/tmp/pool-config.json"
 CANCEL_TASK_DAYS = 2
@@ -4,28 +4,115 @@
 
 from __future__ import annotations
 
+import asyncio
 import logging
+from itertools import chain
+from time import monotonic
+from typing import Any
+from weakref import WeakKeyDictionary
 
+from taskcluster.exceptions import TaskclusterFailure, TaskclusterRestFailure
 from tcadmin.resources import Hook, WorkerPool
 
 from ..common import taskcluster
-from .pool import cancel_tasks
+from . import HOOK_PREFIX
+from .pool import MAX_CONCURRENT_REQUESTS, active_tasks, recent_fires
 
 LOG = logging.getLogger(__name__)
 
+# tc-admin may run callbacks for many resources at once, so requests made by all
+# callbacks on an event loop share one limit
+_REQUEST_LIMITS: WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore] = (
+    WeakKeyDictionary()
+)
+
+
+def _request_limit() -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    if loop not in _REQUEST_LIMITS:
+        _REQUEST_LIMITS[loop] = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+    return _REQUEST_LIMITS[loop]
+
+
+async def _list_fire_tasks(
+    queue: Any, fire: dict[str, Any]
+) -> list[tuple[dict[str, Any], bool]]:
+    """Get tasks in the group created by a hook fire"""
+    scheduled = fire["firedBy"] == "schedule"
+    query: dict[str, str] = {}
+    tasks: list[tuple[dict[str, Any], bool]] = []
+    while True:
+        async with _request_limit():
+            try:
+                result = await queue.listTaskGroup(fire["taskId"], query=query)
+            except TaskclusterFailure as exc:
+                if "No task-group with taskGroupId" in str(exc):
+                    return tasks
+                raise
+        tasks.extend((task, scheduled) for task in result["tasks"])
+        if not result.get("continuationToken"):
+            return tasks
+        query = {"continuationToken": result["continuationToken"]}
+
+
+async def list_hook_tasks(worker_type: str) -> tuple[list[dict[str, Any]], bool]:
+    """List pending & running tasks created by recent fires of a hook.
+
+    Async equivalent of `pool.list_hook_tasks`.
+    """
+    hooks = taskcluster.get_service("hooks", use_async=True)
+    queue = taskcluster.get_service("queue", use_async=True)
+
+    start = monotonic()
+    try:
+        async with _request_limit():
+            result = await hooks.listLastFires(HOOK_PREFIX, worker_type)
+    except TaskclusterRestFailure as msg:
+        if "No such hook" in str(msg):
+            return [], False
+        raise
+    fires = recent_fires(result["lastFires"])
+
+    fire_tasks = await asyncio.gather(
+        *(_list_fire_tasks(queue, fire) for fire in fires)
+    )
+    LOG.info("Listed %d task groups in %.1fs", len(fires), monotonic() - start)
+
+    return active_tasks(chain.from_iterable(fire_tasks))
+
+
+async def _cancel_task(queue: Any, task_id: str) -> None:
+    async with _request_limit():
+        try:
+            LOG.warning(f"=> cancelling: {task_id}")
+            await queue.cancelTask(task_id)
+        except Exception:
+            LOG.exception(f"Exception calling cancelTask({task_id})")
+
 
 async def cancel_pool_tasks(action: list[str], resource: WorkerPool) -> None:
     """Cancel all the tasks on a WorkerPool being updated or deleted"""
     assert isinstance(resource, WorkerPool)
 
     _, worker_type = resource.workerPoolId.split("/")
-    cancel_tasks(worker_type)
+    tasks, scheduled = await list_hook_tasks(worker_type)
+    if scheduled:
+        LOG.info(f"{worker_type} decision is scheduled, not cancelling tasks")
+        return
+
+    queue = taskcluster.get_service("queue", use_async=True)
+    start = monotonic()
+    await asyncio.gather(
+        *(_cancel_task(queue, task["status"]["taskId"]) for task in tasks)
+    )
+    LOG.info("Cancelled %d tasks in %.1fs", len(tasks), monotonic() - start)
 
 
 async def trigger_hook(action: list[str], resource: WorkerPool) -> None:
     """Trigger a Hook after it is created or updated"""
     assert isinstance(resource, Hook)
 
-    hooks = taskcluster.get_service("hooks")
+    hooks = taskcluster.get_service("hooks", use_async=True)
     LOG.info(f"Triggering hook {resource.hookGroupId} / {resource.hookId}")
-    hooks.triggerHook(resource.hookGroupId, resource.hookId, {})
+    async with _request_limit():
+        await hooks.triggerHook(resource.hookGroupId, resource.hookId, {})
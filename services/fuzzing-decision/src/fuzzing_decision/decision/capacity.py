@@ -0,0 +1,93 @@
+# This Source Code Form is subject to the terms of the Mozilla Public License,
+# v. 2.0. If a copy of the MPL was not distributed with this file, You can
+# obtain one at http://mozilla.org/MPL/2.0/.
+
+from __future__ import annotations
+
+import logging
+import math
+from dataclasses import dataclass, field
+from pathlib import Path
+from statistics import median
+
+import yaml
+
+LOG = logging.getLogger(__name__)
+
+# capacity per running task when there are no metrics for a pool.
+# Taskcluster seems to not reuse workers very quickly in some cases, so without
+# this we end up with a lot of pending tasks.
+DEFAULT_SLACK = 2
+# bounds for the capacity per running task when calculated from metrics
+MIN_SLACK = 1.0
+MAX_SLACK = 3.0
+
+
+@dataclass(frozen=True)
+class PoolMetrics:
+    """Historical metrics exported for a worker pool.
+
+    running: samples of the number of running tasks
+    task_duration: duration of task runs (seconds)
+    worker_lifetime: time from requesting a worker until it is removed (seconds)
+    worker_tasks: number of tasks run by each worker
+    """
+
+    running: list[int] = field(default_factory=list)
+    task_duration: list[float] = field(default_factory=list)
+    worker_lifetime: list[float] = field(default_factory=list)
+    worker_tasks: list[int] = field(default_factory=list)
+
+    @classmethod
+    def from_file(cls, path: Path) -> dict[str, PoolMetrics]:
+        """Load metrics for each pool from a YAML (or JSON) file, by worker pool name"""
+        data = yaml.safe_load(path.read_text()) or {}
+        assert isinstance(data, dict), f"Expected a mapping of pools in {path}"
+        return {name: cls(**metrics) for name, metrics in data.items()}
+
+
+def recommend_capacity(
+    name: str, running: int, metrics: PoolMetrics | None, max_tasks: int = 0
+) -> tuple[int, int]:
+    """Recommend capacity for a worker pool.
+
+    Args:
+        name: worker pool name (for logging)
+        running: number of tasks expected to be running at once
+        metrics: historical metrics for the pool, if any
+        max_tasks: maximum number of tasks run by each worker (0 for no limit)
+
+    Returns:
+        max_capacity and min_capacity
+    """
+    if metrics is None or not metrics.task_duration or not metrics.worker_lifetime:
+        return running * DEFAULT_SLACK, 0
+    if metrics.worker_tasks:
+        tasks_per_worker = max(median(metrics.worker_tasks), 1)
+    elif max_tasks == 1:
+        tasks_per_worker = 1
+    else:
+        # workers are reused, but it's unknown how often
+        return running * DEFAULT_SLACK, 0
+
+    # each task holds capacity for longer than it runs while workers start, stop,
+    # and wait between tasks. that overhead is shared by the tasks each worker runs
+    duration = max(median(metrics.task_duration), 1)
+    overhead = max(median(metrics.worker_lifetime) - tasks_per_worker * duration, 0)
+    slack = 1 + overhead / (tasks_per_worker * duration)
+    slack = min(max(slack, MIN_SLACK), MAX_SLACK)
+    max_capacity = max(1, math.ceil(running * slack))
+
+    # keep workers for tasks which are always running instead of recycling them
+    min_capacity = 0
+    if metrics.running:
+        min_capacity = min(sorted(metrics.running)[len(metrics.running) // 10], running)
+    LOG.info(
+        "%s: recommended capacity %d-%d (%.2f per task, default %d)",
+        name,
+        min_capacity,
+        max_capacity,
+        slack,
+        running * DEFAULT_SLACK,
+    )
+    return max_capacity, min_capacity
@@ -5,8 +5,10 @@
 
 import logging
 import os
+from pathlib import Path
 
 from ..common.cli import build_cli_parser
+from ..common.retry import STATS as RETRY_STATS
 from .workflow import Workflow
 
 
@@ -26,6 +28,18 @@ def main() -> None:
         action="store_true",
         help="Build the task group, but exit before creating tasks in Taskcluster.",
     )
+    parser.add_argument(
+        "--config-bundle",
+        type=Path,
+        help="Write the resolved pool configuration for fuzzing tasks to this path",
+    )
+    parser.add_argument(
+        "--reconcile",
+        action="store_true",
+        help="Keep running tasks which match the pool configuration, and only "
+        "create missing tasks or replace stale ones.",
+        default=os.environ.get("FUZZING_RECONCILE") == "1",
+    )
     args = parser.parse_args()
 
     # We need both task & task group information
@@ -49,4 +63,12 @@ def main() -> None:
     workflow.clone(config)
 
     # Build all task definitions for that pool
-    workflow.build_tasks(args.pool_name, args.task_id, config, dry_run=args.dry_run)
+    workflow.build_tasks(
+        args.pool_name,
+        args.task_id,
+        config,
+        dry_run=args.dry_run,
+        config_bundle=args.config_bundle,
+        reconcile=args.reconcile,
+    )
+    RETRY_STATS.log_summary()
@@ -4,15 +4,21 @@
 
 from __future__ import annotations
 
+import hashlib
+import json
 import logging
 import math
 import os
-from collections.abc import Iterator
-from dataclasses import dataclass
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from copy import deepcopy
+from dataclasses import asdict, dataclass
 from datetime import datetime, timedelta, timezone
 from itertools import chain
 from pathlib import Path
 from string import Template
+from tempfile import NamedTemporaryFile
+from time import monotonic
 from typing import Any
 
 import dateutil.parser
@@ -29,21 +35,34 @@ from ..common.pool import (
     FuzzingPoolConfig,
     MachineTypes,
 )
+from ..common.retry import TC_RETRY, is_transient_tc_error
 from ..common.util import parse_size, parse_time, validate_schema_by_name
 from . import (
     CANCEL_TASK_DAYS,
     DECISION_TASK_SECRET,
     HOOK_PREFIX,
     OWNER_EMAIL,
+    POOL_CONFIG_ARTIFACT,
+    POOL_CONFIG_PATH,
     PROVIDER_IDS,
     PROVISIONER_ID,
     SCHEDULER_ID,
     WORKER_POOL_PREFIX,
 )
+from .capacity import PoolMetrics, recommend_capacity
 from .providers import Provider
 
 LOG = logging.getLogger(__name__)
 
+# maximum number of Taskcluster API calls in flight at once
+MAX_CONCURRENT_REQUESTS = 16
+# task tag holding the configuration fingerprint, used to reconcile tasks
+CONFIG_TAG = "fuzzing-config"
+# task fields which differ between decision tasks, excluded from the fingerprint
+VOLATILE_TASK_FIELDS = ("created", "deadline", "dependencies", "expires", "taskGroupId")
+# the pool configuration is hashed instead of the revision it came from
+VOLATILE_TASK_ENV = ("FUZZING_GIT_REVISION", "TASKCLUSTER_FUZZING_DECISION")
+
 DESCRIPTION = """*DO NOT EDIT* - This resource is configured automatically.
 
 Fuzzing resources generated by https://github.com/MozillaSecurity/orion/tree/master/services/fuzzing-decision"""
@@ -61,19 +80,115 @@ DECISION_TASK = Template((TEMPLATES / "decision.yaml").read_text())
 FUZZING_TASK = Template((TEMPLATES / "fuzzing.yaml").read_text())
 
 
+def _index_cache_path() -> Path | None:
+    if "ORION_INDEX_CACHE" in os.environ:
+        return Path(os.environ["ORION_INDEX_CACHE"])
+    cache_home = os.environ.get("XDG_CACHE_HOME")
+    if not cache_home:
+        try:
+            cache_home = str(Path.home() / ".cache")
+        except RuntimeError:
+            # no home directory to cache in, don't cache on disk
+            return None
+    # not shared with other services, which would overwrite each other's entries
+    return Path(cache_home) / "orion" / "fuzzing-decision" / "index-tasks.json"
+
+
 class MountArtifactResolver:
-    CACHE: dict[str, int] = {}  # noqa: RUF012 cache of orion service -> taskId
+    """Resolve index namespaces to the task IDs they currently point to.
+
+    Results are kept in memory, and on disk at CACHE_PATH until the index entry
+    expires, or MAX_AGE passes, whichever is first. If CACHE_PATH is None, the
+    default location is found when the cache is used.
+    """
+
+    CACHE: dict[str, str] = {}  # noqa: RUF012 cache of orion service -> taskId
+    CACHE_PATH: Path | None = None
+    # namespaces are re-indexed when images are rebuilt, so don't trust them for long
+    MAX_AGE = timedelta(hours=1)
+
+    @classmethod
+    def _cache_path(cls) -> Path | None:
+        if cls.CACHE_PATH is not None:
+            return cls.CACHE_PATH
+        return _index_cache_path()
+
+    @classmethod
+    def _load_cache(cls) -> dict[str, dict[str, str]]:
+        cache_path = cls._cache_path()
+        if cache_path is None:
+            return {}
+        try:
+            data = json.loads(cache_path.read_text())
+            now = datetime.now(timezone.utc)
+            return {
+                namespace: entry
+                for namespace, entry in data.items()
+                if dateutil.parser.isoparse(entry["expires"]) > now
+            }
+        except FileNotFoundError:
+            return {}
+        except (AttributeError, KeyError, OSError, TypeError, ValueError) as exc:
+            LOG.warning(f"Ignoring invalid index cache {cache_path}: {exc}")
+            return {}
 
     @classmethod
-    def lookup_taskid(cls, namespace: str) -> int:
-        if namespace not in cls.CACHE:
-            # need to resolve "image" to a task ID where the mount
-            # artifact is
+    def _save_cache(cls, entries: dict[str, dict[str, str]]) -> None:
+        cache_path = cls._cache_path()
+        if cache_path is None:
+            return
+        tmp = None
+        try:
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            # write a unique temporary file and rename it over the cache, so readers
+            # never see a partial file
+            with NamedTemporaryFile(
+                "w", dir=cache_path.parent, prefix=f"{cache_path.name}.", delete=False
+            ) as out:
+                tmp = Path(out.name)
+                json.dump(entries, out, indent=2, sort_keys=True)
+            tmp.replace(cache_path)
+        except OSError as exc:
+            LOG.warning(f"Failed to write index cache {cache_path}: {exc}")
+            if tmp is not None:
+                tmp.unlink(missing_ok=True)
+
+    @classmethod
+    def resolve(cls, namespaces: Iterable[str]) -> dict[str, str]:
+        """Resolve many namespaces, looking up any not cached concurrently.
+
+        Arguments:
+            namespaces: index namespaces to resolve
+
+        Returns:
+            taskId for each namespace
+        """
+        wanted = set(namespaces)
+        missing = sorted(wanted - cls.CACHE.keys())
+        if missing:
+            entries = cls._load_cache()
+            for namespace in missing:
+                if namespace in entries:
+                    cls.CACHE[namespace] = entries[namespace]["taskId"]
+            missing = [namespace for namespace in missing if namespace not in entries]
+        if missing:
             idx = taskcluster.get_service("index")
-            result = idx.findTask(namespace)
-            cls.CACHE[namespace] = result["taskId"]
+            with ThreadPoolExecutor(MAX_CONCURRENT_REQUESTS) as executor:
+                results = list(executor.map(idx.findTask, missing))
+            max_expires = datetime.now(timezone.utc) + cls.MAX_AGE
+            for namespace, result in zip(missing, results, strict=True):
+                cls.CACHE[namespace] = result["taskId"]
+                expires = min(dateutil.parser.isoparse(result["expires"]), max_expires)
+                entries[namespace] = {
+                    "taskId": result["taskId"],
+                    "expires": stringDate(expires),
+                }
+            cls._save_cache(entries)
+        return {namespace: cls.CACHE[namespace] for namespace in wanted}
 
-        return cls.CACHE[namespace]
+    @classmethod
+    def lookup_taskid(cls, namespace: str) -> str:
+        return cls.resolve([namespace])[namespace]
 
 
 def add_task_image(task: dict[str, Any], config: FuzzingPoolConfig) -> None:
@@ -84,7 +199,7 @@ def add_task_image(task: dict[str, Any], config: FuzzingPoolConfig) -> None:
     if config.worker == "generic" and config.platform != "linux":
         assert isinstance(config.container, dict)
         assert config.container["type"] != "docker-image"
-        task_id: str | int
+        task_id: str
         if config.container["type"] == "indexed-image":
             # need to resolve "image" to a task ID where the mount artifact is
             task_id = MountArtifactResolver.lookup_taskid(config.container["namespace"])
@@ -201,78 +316,207 @@ def configure_task(
         task["payload"]["env"].update(env)
 
 
-def cancel_tasks(worker_type: str) -> None:
-    # Avoid cancelling self
-    self_task_id = os.getenv("TASK_ID")
-
-    hooks = taskcluster.get_service("hooks")
-    queue = taskcluster.get_service("queue")
-
+def recent_fires(last_fires: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    """Successful hook fires which may still have active tasks"""
     # cycle only hook fires after this limit
     cycle_limit = datetime.now(timezone.utc) - timedelta(days=CANCEL_TASK_DAYS)
+    return [
+        fire
+        for fire in last_fires
+        if fire["result"] == "success"
+        and dateutil.parser.isoparse(fire["taskCreateTime"]) >= cycle_limit
+    ]
 
-    # Get tasks by hook
-    def iter_tasks_by_hook(hook_id: str):
-        try:
-            for fire in hooks.listLastFires(HOOK_PREFIX, hook_id)["lastFires"]:
-                if fire["result"] != "success":
-                    continue
-                task_created_time = dateutil.parser.isoparse(fire["taskCreateTime"])
-                if task_created_time < cycle_limit:
-                    continue
-                try:
-                    result = queue.listTaskGroup(fire["taskId"])
-                except TaskclusterFailure as exc:
-                    if "No task-group with taskGroupId" in str(exc):
-                        continue
-                    raise
-                while result.get("continuationToken"):
-                    yield from [
-                        (task, (fire["firedBy"] == "schedule"))
-                        for task in result["tasks"]
-                    ]
-                    result = queue.listTaskGroup(
-                        fire["taskId"],
-                        query={"continuationToken": result["continuationToken"]},
-                    )
-                yield from [
-                    (task, (fire["firedBy"] == "schedule")) for task in result["tasks"]
-                ]
-        except TaskclusterRestFailure as msg:
-            if "No such hook" in str(msg):
-                return None
-            raise
 
-    tasks_to_cancel = []
-    for task, scheduled in iter_tasks_by_hook(worker_type):
-        task_id = task["status"]["taskId"]
-
-        if task_id == self_task_id:
-            if scheduled:
-                # if this decision task was the result of a scheduled hook, don't
-                # cancel anything. if cycle_time is shorter than max_run_time, we
-                # want prior tasks to remain running
-                LOG.info(f"{self_task_id} is scheduled, not cancelling tasks")
-                return None
-            # avoid cancelling self
+def active_tasks(
+    fire_tasks: Iterable[tuple[dict[str, Any], bool]],
+) -> tuple[list[dict[str, Any]], bool]:
+    """Filter tasks listed from hook fires to those pending or running.
+
+    Arguments:
+        fire_tasks: tasks (from `listTaskGroup`), and whether the hook fire which
+                    created them was scheduled
+
+    Returns:
+        The active tasks (excluding this decision task), and whether this decision
+        task was the result of a scheduled hook fire.
+    """
+    # Avoid cancelling self
+    self_task_id = os.getenv("TASK_ID")
+
+    active = []
+    self_scheduled = False
+    for task, scheduled in fire_tasks:
+        if task["status"]["taskId"] == self_task_id:
+            self_scheduled = scheduled
             continue
 
         # State can be pending,running,completed,failed,exception
-        # We only cancel pending & running tasks
+        # We only consider pending & running tasks
         if any(
             run["state"] in {"pending", "running"} for run in task["status"]["runs"]
         ):
-            tasks_to_cancel.append(task_id)
-    LOG.info(f"{self_task_id} is cancelling {len(tasks_to_cancel)} tasks")
+            active.append(task)
+    return active, self_scheduled
+
+
+def list_hook_tasks(worker_type: str) -> tuple[list[dict[str, Any]], bool]:
+    """List pending & running tasks created by recent fires of a hook.
+
+    Returns:
+        The tasks (from `listTaskGroup`, excluding this decision task), and whether
+        this decision task was the result of a scheduled hook fire.
+    """
+    hooks = taskcluster.get_service("hooks")
+    queue = taskcluster.get_service("queue")
+
+    start = monotonic()
+    try:
+        fires = recent_fires(hooks.listLastFires(HOOK_PREFIX, worker_type)["lastFires"])
+    except TaskclusterRestFailure as msg:
+        if "No such hook" in str(msg):
+            return [], False
+        raise
+
+    # Get tasks in the group created by a hook fire
+    def list_fire_tasks(fire: dict[str, Any]) -> list[tuple[dict[str, Any], bool]]:
+        scheduled = fire["firedBy"] == "schedule"
+        try:
+            result = queue.listTaskGroup(fire["taskId"])
+        except TaskclusterFailure as exc:
+            if "No task-group with taskGroupId" in str(exc):
+                return []
+            raise
+        tasks = [(task, scheduled) for task in result["tasks"]]
+        while result.get("continuationToken"):
+            result = queue.listTaskGroup(
+                fire["taskId"],
+                query={"continuationToken": result["continuationToken"]},
+            )
+            tasks.extend((task, scheduled) for task in result["tasks"])
+        return tasks
+
+    with ThreadPoolExecutor(MAX_CONCURRENT_REQUESTS) as executor:
+        fire_tasks = list(executor.map(list_fire_tasks, fires))
+    LOG.info("Listed %d task groups in %.1fs", len(fires), monotonic() - start)
 
-    for task_id in tasks_to_cancel:
-        # Cancel the task
+    return active_tasks(chain.from_iterable(fire_tasks))
+
+
+def cancel_task_ids(task_ids: list[str]) -> None:
+    """Cancel tasks concurrently, logging any errors"""
+    queue = taskcluster.get_service("queue")
+
+    def cancel(task_id: str) -> None:
         try:
             LOG.warning(f"=> cancelling: {task_id}")
             queue.cancelTask(task_id)
         except Exception:
             LOG.exception(f"Exception calling cancelTask({task_id})")
 
+    start = monotonic()
+    with ThreadPoolExecutor(MAX_CONCURRENT_REQUESTS) as executor:
+        executor.map(cancel, task_ids)
+    LOG.info("Cancelled %d tasks in %.1fs", len(task_ids), monotonic() - start)
+
+
+def cancel_tasks(worker_type: str) -> None:
+    self_task_id = os.getenv("TASK_ID")
+    tasks, scheduled = list_hook_tasks(worker_type)
+    if scheduled:
+        # if this decision task was the result of a scheduled hook, don't
+        # cancel anything. if cycle_time is shorter than max_run_time, we
+        # want prior tasks to remain running
+        LOG.info(f"{self_task_id} is scheduled, not cancelling tasks")
+        return
+    LOG.info(f"{self_task_id} is cancelling {len(tasks)} tasks")
+    cancel_task_ids([task["status"]["taskId"] for task in tasks])
+
+
+def config_fingerprint(pool: FuzzingPoolConfig, task: dict[str, Any]) -> str:
+    """Hash of the pool configuration and the task rendered from it, excluding
+    fields which differ between decision tasks"""
+    config = asdict(pool)
+    # the location of the clone doesn't affect tasks
+    del config["base_dir"]
+    task = deepcopy(task)
+    for key in VOLATILE_TASK_FIELDS:
+        task.pop(key, None)
+    task["metadata"].pop("name", None)
+    task["tags"].pop(CONFIG_TAG, None)
+    for key in VOLATILE_TASK_ENV:
+        task["payload"].get("env", {}).pop(key, None)
+    artifacts = task["payload"].get("artifacts", [])
+    if isinstance(artifacts, dict):
+        artifacts = artifacts.values()
+    for artifact in artifacts:
+        artifact.pop("expires", None)
+    data = json.dumps({"pool": config, "task": task}, sort_keys=True, default=str)
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+def reconcile_tasks(
+    pools: list[FuzzingPoolConfig],
+    existing: list[dict[str, Any]],
+    parent_task_id: str,
+    env: dict[str, str] | None = None,
+) -> tuple[list[str], list[tuple[str, dict[str, Any]]]]:
+    """Compare existing tasks with the tasks wanted for each pool.
+
+    Existing tasks with a matching configuration fingerprint are kept, up to the
+    number of tasks wanted.
+
+    Returns:
+        IDs of existing tasks to cancel, and the new tasks to create.
+    """
+    by_fingerprint: dict[str | None, list[str]] = {}
+    for task in existing:
+        fingerprint = task.get("task", {}).get("tags", {}).get(CONFIG_TAG)
+        by_fingerprint.setdefault(fingerprint, []).append(task["status"]["taskId"])
+
+    to_cancel: list[str] = []
+    to_create: list[tuple[str, dict[str, Any]]] = []
+    for pool in pools:
+        assert not pool.preprocess, "reconcile is not supported with preprocess"
+        tasks = list(build_tasks(pool, parent_task_id, env))
+        matching = []
+        if tasks:
+            matching = by_fingerprint.pop(tasks[0][1]["tags"][CONFIG_TAG], [])
+        to_cancel.extend(matching[pool.tasks :])
+        kept = min(len(matching), pool.tasks)
+        LOG.info(f"{pool.pool_id} has {kept}/{pool.tasks} tasks up to date")
+        to_create.extend(tasks[: pool.tasks - kept])
+    # anything else is stale
+    to_cancel.extend(chain.from_iterable(by_fingerprint.values()))
+    return to_cancel, to_create
+
+
+def create_tasks(tasks: Iterable[tuple[str, dict[str, Any]]]) -> None:
+    """Create tasks concurrently. Tasks which others depend on (preprocess) are
+    created first."""
+    tasks = list(tasks)
+    task_ids = {task_id for task_id, _task in tasks}
+    dependencies = task_ids.intersection(
+        chain.from_iterable(task["dependencies"] for _task_id, task in tasks)
+    )
+    queue = taskcluster.get_service("queue")
+
+    def _create(task_id: str, task: dict[str, Any]) -> None:
+        LOG.info(f"Creating task {task['metadata']['name']} as {task_id}")
+        TC_RETRY.call(
+            lambda: queue.createTask(task_id, task),
+            f"create task {task_id}",
+            is_transient_tc_error,
+        )
+
+    with ThreadPoolExecutor(MAX_CONCURRENT_REQUESTS) as executor:
+        for wave in (
+            [task for task in tasks if task[0] in dependencies],
+            [task for task in tasks if task[0] not in dependencies],
+        ):
+            for future in [executor.submit(_create, *task) for task in wave]:
+                future.result()
+
 
 def get_scopes(pool: FuzzingPoolConfig) -> list[str]:
     result = pool.scopes.copy()
@@ -301,6 +545,7 @@ def build_resources(
     providers: dict[str, Provider],
     machine_type_db: MachineTypes,
     env: dict[str, str] | None = None,
+    metrics: PoolMetrics | None = None,
 ) -> Iterator[TCWorkerPool | Hook | Role]:
     """Build the full tc-admin resources to compare and build the pool"""
 
@@ -309,12 +554,20 @@ def build_resources(
 
     if len(pools) > 1:
         # apply_to pool
-        max_capacity = max(sum(p.tasks for p in pools if p.tasks) * 2, 3)
+        max_capacity, min_capacity = recommend_capacity(
+            pool.hook_id,
+            sum(p.tasks for p in pools if p.tasks),
+            metrics,
+            pool.max_tasks,
+        )
+        max_capacity = max(max_capacity, 3)
     else:
-        # * 2 since Taskcluster seems to not reuse workers very quickly in some
-        # cases, so we end up with a lot of pending tasks.
-        max_capacity = (
-            max(1, math.ceil(pool.max_run_time / pool.cycle_time)) * pool.tasks * 2
+        # tasks from the previous cycle may still be running
+        max_capacity, min_capacity = recommend_capacity(
+            pool.hook_id,
+            max(1, math.ceil(pool.max_run_time / pool.cycle_time)) * pool.tasks,
+            metrics,
+            pool.max_tasks,
         )
 
     # Build the pool configuration for selected machines
@@ -328,7 +581,7 @@ def build_resources(
         machine_types=pool.machine_types,
         max_capacity=max_capacity,
         max_tasks=pool.max_tasks,
-        min_capacity=0,
+        min_capacity=min_capacity,
         name=pool.hook_id,
         nested_virtualization=pool.nested_virtualization,
         performance_monitoring_unit=pool.performance_monitoring_unit,
@@ -342,6 +595,8 @@ def build_resources(
     decision_task = yaml.safe_load(
         DECISION_TASK.substitute(
             description=DESCRIPTION.replace("\n", "\\n"),
+            config_artifact=POOL_CONFIG_ARTIFACT,
+            config_path=POOL_CONFIG_PATH,
             max_run_time=parse_time("1h"),
             owner_email=OWNER_EMAIL,
             pool_id=pool.config_pool_id,
@@ -424,6 +679,7 @@ def build_tasks(
                     now
                     + min(timedelta(days=5), timedelta(seconds=preprocess.cycle_time))
                 ),
+                config_artifact=POOL_CONFIG_ARTIFACT,
                 description=DESCRIPTION.replace("\n", "\\n"),
                 expires=stringDate(fromNow("4 weeks", now)),
                 max_run_time=preprocess.max_run_time,
@@ -438,36 +694,65 @@ def build_tasks(
             )
         )
         task["payload"]["env"]["TASKCLUSTER_FUZZING_PREPROCESS"] = "1"
+        # the configuration bundle is published when the decision task resolves
+        task["dependencies"].append(parent_task_id)
         configure_task(task, preprocess, now, env)
         preprocess_task_id = slugId()
         yield preprocess_task_id, task
 
-    for i in range(1, pool.tasks + 1):
-        task = yaml.safe_load(
-            FUZZING_TASK.substitute(
-                created=stringDate(now),
-                deadline=stringDate(
-                    now + min(timedelta(days=5), timedelta(seconds=pool.cycle_time))
-                ),
-                description=DESCRIPTION.replace("\n", "\\n"),
-                expires=stringDate(fromNow("4 weeks", now)),
-                max_run_time=pool.max_run_time,
-                name=f"Fuzzing task {pool.task_id} - {i}/{pool.tasks}",
-                owner_email=OWNER_EMAIL,
-                pool_id=pool.pool_id,
-                provisioner=PROVISIONER_ID,
-                scheduler=SCHEDULER_ID,
-                secret=DECISION_TASK_SECRET,
-                task_group=parent_task_id,
-                task_id=pool.hook_id,
-            )
+    if not pool.tasks:
+        return
+
+    # tasks only differ by name, so render and configure a single task, then copy it
+    template = yaml.safe_load(
+        FUZZING_TASK.substitute(
+            config_artifact=POOL_CONFIG_ARTIFACT,
+            created=stringDate(now),
+            deadline=stringDate(
+                now + min(timedelta(days=5), timedelta(seconds=pool.cycle_time))
+            ),
+            description=DESCRIPTION.replace("\n", "\\n"),
+            expires=stringDate(fromNow("4 weeks", now)),
+            max_run_time=pool.max_run_time,
+            name="",
+            owner_email=OWNER_EMAIL,
+            pool_id=pool.pool_id,
+            provisioner=PROVISIONER_ID,
+            scheduler=SCHEDULER_ID,
+            secret=DECISION_TASK_SECRET,
+            task_group=parent_task_id,
+            task_id=pool.hook_id,
         )
-        if preprocess_task_id is not None:
-            task["dependencies"].append(preprocess_task_id)
-        configure_task(task, pool, now, env)
+    )
+    # the configuration bundle is published when the decision task resolves
+    template["dependencies"].append(parent_task_id)
+    if preprocess_task_id is not None:
+        template["dependencies"].append(preprocess_task_id)
+    configure_task(template, pool, now, env)
+    template["tags"][CONFIG_TAG] = config_fingerprint(pool, template)
+
+    for i in range(1, pool.tasks + 1):
+        task = deepcopy(template)
+        task["metadata"]["name"] = f"Fuzzing task {pool.task_id} - {i}/{pool.tasks}"
         yield slugId(), task
 
 
+def build_config_bundle(
+    pools: Iterable[FuzzingPoolConfig],
+) -> dict[str, dict[str, Any]]:
+    """Resolve the launch parameters for each pool, so fuzzing tasks can load them
+    without cloning the configuration repository"""
+    bundle = {}
+    for pool in pools:
+        params = pool.launch_params()
+        params["preprocess"] = next(
+            (preprocess.launch_params() for preprocess in pool.get_preprocess()),
+            None,
+        )
+        bundle[pool.pool_id] = params
+    return bundle
+
+
 @dataclass
 class WorkerPool:
     cloud: str
@@ -535,18 +820,30 @@ class WorkerPool:
                 )
                 yield (machine, zone_blacklist)
 
+        launch_configs = provider.launch_configs(
+            self.imageset,
+            _get_machine_list(),
+            self.disk_size,
+            self.platform,
+            self.demand,
+            self.nested_virtualization,
+            self.performance_monitoring_unit,
+            self.max_tasks,
+            self.worker,
+        )
+        ranked: list[dict[str, Any]] = []
+        if launch_configs:
+            # prefer the cheapest machines & zones
+            ranked = provider.rank_launch_configs(
+                launch_configs,
+                lambda machine, zone: machine_type_db.cost(
+                    self.cloud, self.cpu, machine, zone
+                ),
+                machine_type_db.max_launch_configs,
+            )
+
         config: dict[str, object] = {
-            "launchConfigs": provider.build_launch_configs(
-                self.imageset,
-                _get_machine_list(),
-                self.disk_size,
-                self.platform,
-                self.demand,
-                self.nested_virtualization,
-                self.performance_monitoring_unit,
-                self.max_tasks,
-                self.worker,
-            ),
+            "launchConfigs": ranked,
             "maxCapacity": self.max_capacity,
             "minCapacity": self.min_capacity,
         }
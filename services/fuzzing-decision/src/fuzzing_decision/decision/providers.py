@@ -2,7 +2,8 @@ from __future__ import annotations
 
 import logging
 from abc import ABC, abstractmethod
-from collections.abc import Iterable
+from collections.abc import Callable, Iterable, Sequence
+from copy import deepcopy
 from pathlib import Path
 from typing import Any
 
@@ -13,11 +14,49 @@ from ..common.util import parse_time
 LOG = logging.getLogger(__name__)
 
 
+LaunchConfigKey = tuple[
+    str, tuple[tuple[str, frozenset[str]], ...], int, str, bool, bool, bool, int, str
+]
+
+
 class Provider(ABC):
     def __init__(self, base_dir: Path) -> None:
         self.imagesets = yaml.safe_load(
             (base_dir / "config" / "imagesets.yml").read_text()
         )
+        self._launch_configs: dict[LaunchConfigKey, tuple[dict[str, Any], ...]] = {}
+
+    def launch_configs(
+        self,
+        imageset: str,
+        machines: Iterable[tuple[str, frozenset[str]]],
+        disk_size: int,
+        platform: str,
+        demand: bool,
+        nested_virtualization: bool,
+        performance_monitoring_unit: bool,
+        max_tasks: int,
+        worker_type: str,
+    ) -> tuple[dict[str, Any], ...]:
+        """Same as `build_launch_configs`, but only built once for identical pools.
+
+        The launch configs are shared between pools, and must not be modified.
+        `rank_launch_configs` copies any launch config it changes.
+        """
+        key: LaunchConfigKey = (
+            imageset,
+            tuple(machines),
+            disk_size,
+            platform,
+            demand,
+            nested_virtualization,
+            performance_monitoring_unit,
+            max_tasks,
+            worker_type,
+        )
+        if key not in self._launch_configs:
+            self._launch_configs[key] = tuple(self.build_launch_configs(*key))
+        return self._launch_configs[key]
 
     @abstractmethod
     def build_launch_configs(
@@ -34,6 +73,59 @@ class Provider(ABC):
     ) -> list[dict[str, Any]]:
         raise NotImplementedError()
 
+    def machine_zone(self, launch_config: dict[str, Any]) -> tuple[str, str]:
+        """Get the machine type and zone used by a launch config.
+
+        Only used by `rank_launch_configs`, so providers which override it don't need
+        to implement this.
+        """
+        raise NotImplementedError()
+
+    def rank_launch_configs(
+        self,
+        launch_configs: Sequence[dict[str, Any]],
+        cost: Callable[[str, str], float | None],
+        limit: int | None = None,
+    ) -> list[dict[str, Any]]:
+        """Rank launch configs by cost, keep only the cheapest, and weight them so
+        worker-manager prefers cheaper configs.
+
+        The original order is kept, since tc-admin sorts launch configs by location
+        when comparing with the deployed worker pool.
+
+        Arguments:
+            launch_configs: launch configs from `build_launch_configs`
+            cost: get the cost of a machine type in a zone (None if unknown)
+            limit: maximum number of launch configs to keep
+
+        Returns:
+            launch configs, copied if a weight was added. If no cost is known, the
+            given launch configs are returned unranked.
+        """
+        costs = [cost(*self.machine_zone(config)) for config in launch_configs]
+        if all(value is None for value in costs):
+            return list(launch_configs)
+        # cheapest first, unknown cost last
+        ranked = sorted(
+            range(len(launch_configs)),
+            key=lambda idx: (costs[idx] is None, costs[idx] or 0.0),
+        )
+        keep = set(ranked[:limit])
+        cheapest = min(value for value in costs if value is not None)
+
+        result = []
+        for idx, config in enumerate(launch_configs):
+            if idx not in keep:
+                continue
+            config_cost = costs[idx]
+            if cheapest and config_cost:
+                config = deepcopy(config)
+                config.setdefault("workerManager", {}).update(
+                    {"initialWeight": round(cheapest / config_cost, 3)}
+                )
+            result.append(config)
+        return result
+
     def get_worker_config(
         self,
         worker: str,
@@ -42,7 +134,8 @@ class Provider(ABC):
         worker_type: str,
     ) -> dict[str, Any]:
         assert worker in self.imagesets, f"Missing worker {worker}"
-        out: dict[str, Any] = self.imagesets[worker].get("workerConfig", {})
+        # copy so the imageset isn't modified
+        out: dict[str, Any] = deepcopy(self.imagesets[worker].get("workerConfig", {}))
 
         # worker implementation might be generic-worker or docker-worker
         # although we also support d2g (docker payload on generic worker)
@@ -126,6 +219,12 @@ class AWS(Provider):
             for region, subnets in aws["subnets"].items()
         }
 
+    def machine_zone(self, launch_config: dict[str, Any]) -> tuple[str, str]:
+        return (
+            launch_config["launchConfig"]["InstanceType"],
+            launch_config["launchConfig"]["Placement"]["AvailabilityZone"],
+        )
+
     def get_amis(self, worker: str):
         assert worker in self.imagesets, f"Missing worker {worker}"
         return self.imagesets[worker]["aws"]["amis"]
@@ -202,6 +301,9 @@ class Azure(Provider):
         assert "subnets" in data, "Missing subnets in Azure config"
         return {location: subnet for location, subnet in data["subnets"].items()}
 
+    def machine_zone(self, launch_config: dict[str, Any]) -> tuple[str, str]:
+        return (launch_config["hardwareProfile"]["vmSize"], launch_config["location"])
+
     def get_images(self, worker: str):
         assert worker in self.imagesets, f"Missing worker {worker}"
         return self.imagesets[worker]["azure"]["images"]
@@ -284,6 +386,10 @@ class GCP(Provider):
         }
         LOG.info("Loaded GCP configuration")
 
+    def machine_zone(self, launch_config: dict[str, Any]) -> tuple[str, str]:
+        # machineType is zones/<zone>/machineTypes/<machine>
+        return (launch_config["machineType"].split("/")[-1], launch_config["zone"])
+
     def build_launch_configs(
         self,
         imageset: str,
@@ -357,7 +463,16 @@ class Static(Provider):
     """Fake provider for static machines not provisioned by Taskcluster"""
 
     def __init__(self) -> None:
-        pass
+        self._launch_configs = {}
+
+    def rank_launch_configs(
+        self,
+        launch_configs: Sequence[dict[str, Any]],
+        cost: Callable[[str, str], float | None],
+        limit: int | None = None,
+    ) -> list[dict[str, Any]]:
+        """Static machines have no cost, so launch configs are never ranked."""
+        return list(launch_configs)
 
     def build_launch_configs(
         self,
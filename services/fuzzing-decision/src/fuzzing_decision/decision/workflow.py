@@ -5,10 +5,14 @@
 from __future__ import annotations
 
 import atexit
+import json
 import logging
+import os
 import re
 import shutil
 import tempfile
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ProcessPoolExecutor
 from itertools import chain
 from pathlib import Path
 from typing import Any
@@ -16,17 +20,63 @@ from typing import Any
 import yaml
 from tcadmin.appconfig import AppConfig
 
-from ..common import taskcluster
-from ..common.pool import FuzzingPoolConfig, MachineTypes
+from ..common.pool import (
+    FuzzingPoolConfig,
+    MachineTypes,
+    parse_pool_files,
+    preload_yaml,
+)
 from ..common.util import onerror
 from ..common.workflow import Workflow as CommonWorkflow
 from . import HOOK_PREFIX, WORKER_POOL_PREFIX
-from .pool import WorkerPool, build_resources, build_tasks, cancel_tasks
+from .capacity import PoolMetrics
+from .pool import (
+    MountArtifactResolver,
+    WorkerPool,
+    build_config_bundle,
+    build_resources,
+    build_tasks,
+    cancel_task_ids,
+    cancel_tasks,
+    create_tasks,
+    list_hook_tasks,
+    reconcile_tasks,
+)
 from .providers import AWS, GCP, Azure, Static
 
 LOG = logging.getLogger(__name__)
 
 
+def _load_pool_file(path: Path) -> list[FuzzingPoolConfig]:
+    return list(FuzzingPoolConfig.from_file(path))
+
+
+def load_pool_files(
+    paths: Iterable[Path], jobs: int | None = None
+) -> Iterator[list[FuzzingPoolConfig]]:
+    """Resolve and validate pool files using a pool of worker processes.
+
+    Results are yielded in the order the paths are given, regardless of which
+    process finishes first. Files are parsed once in this process, and the parsed
+    files are given to each worker process.
+    """
+    paths = list(paths)
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+    jobs = min(jobs, len(paths))
+    if jobs <= 1:
+        yield from map(_load_pool_file, paths)
+        return
+    with ProcessPoolExecutor(
+        max_workers=jobs,
+        initializer=preload_yaml,
+        initargs=(parse_pool_files(paths),),
+    ) as executor:
+        yield from executor.map(
+            _load_pool_file, paths, chunksize=max(1, len(paths) // (jobs * 4))
+        )
+
+
 class Workflow(CommonWorkflow):
     """Fuzzing decision task workflow"""
 
@@ -35,6 +85,8 @@ class Workflow(CommonWorkflow):
 
         self.fuzzing_config_dir: Path | None = None
         self.community_config_dir: Path | None = None
+        # historical metrics used to set pool capacity, by worker pool name
+        self.pool_metrics: dict[str, PoolMetrics] = {}
 
         # Automatic cleanup at end of execution
         atexit.register(self.cleanup)
@@ -64,6 +116,10 @@ class Workflow(CommonWorkflow):
         )
 
         assert config is not None
+        metrics_path = appconfig.options.get("fuzzing_pool_metrics")
+        if metrics_path is not None:
+            workflow.pool_metrics = PoolMetrics.from_file(Path(metrics_path))
+
         # Retrieve remote repositories
         workflow.clone(config)
 
@@ -102,10 +158,13 @@ class Workflow(CommonWorkflow):
             env["FUZZING_GIT_REPOSITORY"] = config["fuzzing_config"]["url"]
             env["FUZZING_GIT_REVISION"] = config["fuzzing_config"]["revision"]
 
-        # Browse the files in the repo
-        for config_file in self.fuzzing_config_dir.glob("pool*.yml"):
-            pool_configs = list(FuzzingPoolConfig.from_file(config_file))
-            resources.update(build_resources(pool_configs, clouds, machines, env))
+        # Load the pool files in parallel, resources are built in filename order
+        pool_files = sorted(self.fuzzing_config_dir.glob("pool*.yml"))
+        for pool_configs in load_pool_files(pool_files):
+            metrics = self.pool_metrics.get(pool_configs[0].hook_id)
+            resources.update(
+                build_resources(pool_configs, clouds, machines, env, metrics)
+            )
 
         extra_pools_path = self.fuzzing_config_dir / "workers.yml"
         if extra_pools_path.is_file():
@@ -160,6 +219,8 @@ class Workflow(CommonWorkflow):
         task_id: str,
         config: dict[str, Any],
         dry_run: bool = False,
+        config_bundle: Path | None = None,
+        reconcile: bool = False,
     ) -> None:
         assert self.fuzzing_config_dir is not None
         path_ = self.fuzzing_config_dir / f"{pool_name}.yml"
@@ -174,18 +235,52 @@ class Workflow(CommonWorkflow):
         # Build tasks needed for a specific pool
         pool_configs = list(FuzzingPoolConfig.from_file(path_))
 
-        # cancel any previously running tasks
-        if not dry_run:
-            cancel_tasks(pool_configs[0].hook_id)
+        # Resolve indexed images mounted by generic-worker tasks in one batch
+        MountArtifactResolver.resolve(
+            pool.container["namespace"]
+            for pool in pool_configs
+            if pool.worker == "generic"
+            and pool.platform != "linux"
+            and isinstance(pool.container, dict)
+            and pool.container["type"] == "indexed-image"
+        )
 
-        tasks = chain.from_iterable(build_tasks(p, task_id, env) for p in pool_configs)
+        # Publish the resolved configuration, so tasks don't need to clone the repo
+        if config_bundle is not None:
+            LOG.info(f"Writing pool configuration bundle to {config_bundle}")
+            config_bundle.write_text(json.dumps(build_config_bundle(pool_configs)))
+
+        if reconcile and any(pool.preprocess for pool in pool_configs):
+            LOG.warning("Pool uses preprocess, replacing all tasks")
+            reconcile = False
+
+        existing: list[dict[str, Any]] = []
+        scheduled = False
+        if reconcile and not dry_run:
+            existing, scheduled = list_hook_tasks(pool_configs[0].hook_id)
+            if scheduled:
+                # tasks from the previous cycle are about to reach their deadline,
+                # so they can't be kept in place of new tasks
+                LOG.info("Decision is scheduled, not reconciling tasks")
+                reconcile = False
+
+        if reconcile:
+            # keep running tasks which match the configuration, replace the rest
+            to_cancel, tasks = reconcile_tasks(pool_configs, existing, task_id, env)
+            if not dry_run:
+                cancel_task_ids(to_cancel)
+        else:
+            # cancel any previously running tasks
+            if not dry_run and not scheduled:
+                cancel_tasks(pool_configs[0].hook_id)
+
+            tasks = list(
+                chain.from_iterable(build_tasks(p, task_id, env) for p in pool_configs)
+            )
 
         if not dry_run:
             # Create all the tasks on taskcluster
-            queue = taskcluster.get_service("queue")
-            for task_id_, task in tasks:
-                LOG.info(f"Creating task {task['metadata']['name']} as {task_id_}")
-                queue.createTask(task_id_, task)
+            create_tasks(tasks)
 
     def cleanup(self) -> None:
         """Cleanup temporary folders at end of execution"""
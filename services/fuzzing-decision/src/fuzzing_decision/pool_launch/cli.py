@@ -10,6 +10,7 @@ import os
 import shutil
 
 from ..common.cli import build_cli_parser
+from ..common.retry import STATS as RETRY_STATS
 from ..common.util import onerror
 from .launcher import PoolLauncher
 
@@ -28,6 +29,12 @@ def main(args: list[str] | None = None) -> None:
         help="Load the pre-process config instead of the normal pool config",
         default=os.environ.get("TASKCLUSTER_FUZZING_PREPROCESS") == "1",
     )
+    parser.add_argument(
+        "--decision-task",
+        help="Load the pool configuration bundle published by this decision task, "
+        "instead of cloning the configuration repository",
+        default=os.environ.get("TASKCLUSTER_FUZZING_DECISION"),
+    )
     parser.add_argument(
         "--dry-run",
         action="store_true",
@@ -55,10 +62,14 @@ def main(args: list[str] | None = None) -> None:
         fuzzing_git_revision=parsed_args.git_revision,
     )
 
-    if config is not None:
+    if config is not None and not (
+        parsed_args.decision_task is not None
+        and launcher.load_bundle(parsed_args.decision_task)
+    ):
         # Retrieve remote repository
         launcher.clone(config)
         launcher.load_params()
+        RETRY_STATS.log_summary()
         if "path" not in config["fuzzing_config"]:
             # we cloned fuzzing-tc-config, clean it up
             shutil.rmtree(launcher.fuzzing_config_dir, onerror=onerror)
@@ -4,6 +4,7 @@
 
 from __future__ import annotations
 
+import json
 import os
 import sys
 from ctypes import get_errno
@@ -14,8 +15,13 @@ from shutil import which
 from subprocess import call
 from typing import Any
 
+from taskcluster.download import downloadArtifactToBuf
+from taskcluster.exceptions import TaskclusterFailure
+
+from ..common import taskcluster
 from ..common.pool import FuzzingPoolConfig
 from ..common.workflow import Workflow
+from ..decision import POOL_CONFIG_ARTIFACT
 
 LOG = getLogger(__name__)
 
@@ -69,16 +75,57 @@ class PoolLauncher(Workflow):
             if self.preprocess:
                 pool_config = next(pool_config.get_preprocess())
 
-        if pool_config.command:
+        self._apply_params(**pool_config.launch_params())
+
+    def load_bundle(self, decision_task_id: str) -> bool:
+        """Load params from the configuration bundle published by the decision task,
+        instead of cloning and resolving the configuration repository.
+
+        Returns:
+            False if the bundle is unavailable and `load_params` must be used.
+        """
+        assert self.pool_name is not None
+        try:
+            # the queue API only returns where the artifact is stored
+            buf, _content_type = downloadArtifactToBuf(
+                taskId=decision_task_id,
+                name=POOL_CONFIG_ARTIFACT,
+                queueService=taskcluster.get_service("queue"),
+            )
+            bundle = json.loads(bytes(buf))
+        except (TaskclusterFailure, ValueError) as exc:
+            LOG.warning("Failed to get pool configuration bundle: %s", exc)
+            return False
+
+        if self.apply is not None:
+            pool_id = f"{self.pool_name}/{self.apply}"
+            params = bundle.get(pool_id)
+        else:
+            pool_id = self.pool_name
+            params = bundle.get(pool_id)
+            if params is not None and self.preprocess:
+                params = params["preprocess"]
+        if params is None:
+            LOG.warning("Pool %s is missing from configuration bundle", pool_id)
+            return False
+
+        LOG.info("Loaded pool %s from configuration bundle", pool_id)
+        self._apply_params(params["command"], params["env"], params["name"])
+        return True
+
+    def _apply_params(
+        self, command: list[str] | None, env: dict[str, str], name: str
+    ) -> None:
+        if command:
             assert not self.command, "Specify command-line args XOR pool.command"
-            self.command = pool_config.command.copy()
-        for key, value in pool_config.env.items():
+            self.command = command.copy()
+        for key, value in env.items():
             # don't override existing env vars
             if key in self.environment:
                 LOG.info("Skip setting existing environment variable '%s'", key)
                 continue
             self.environment[key] = value
-        self.environment["FUZZING_POOL_NAME"] = pool_config.name
+        self.environment["FUZZING_POOL_NAME"] = name
 
     def docker_cmd(self, image: str, expand: bool = False) -> list[str]:
         cmd = [
@@ -31,6 +31,11 @@ appconfig.options.add(
     help="A git revision for the fuzzing git repository",
     default=os.environ.get("FUZZING_GIT_REVISION"),
 )
+appconfig.options.add(
+    "--fuzzing-pool-metrics",
+    help="Historical pool metrics (YAML or JSON) used to set pool capacity",
+    default=os.environ.get("FUZZING_POOL_METRICS"),
+)
 
 # We always want to run against community Taskcluster instance
 os.environ["TASKCLUSTER_ROOT_URL"] = "https://community-tc.services.mozilla.com"
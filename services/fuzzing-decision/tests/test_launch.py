@@ -3,12 +3,14 @@
 # v. 2.0. If a copy of the MPL was not distributed with this file, You can
 # obtain one at http://mozilla.org/MPL/2.0/.
 
+import json
 import os
 from typing import Any
 from unittest.mock import Mock, patch
 
 import pytest
 import yaml
+from taskcluster.exceptions import TaskclusterFailure
 
 from fuzzing_decision.pool_launch import cli
 from fuzzing_decision.pool_launch.launcher import PoolLauncher
@@ -39,6 +41,25 @@ def test_main_calls(mock_launcher):
     mock_launcher.return_value.exec.assert_called_once()
 
 
+@patch("fuzzing_decision.pool_launch.cli.PoolLauncher", autospec=True)
+def test_main_bundle(mock_launcher):
+    """clone/load_params are skipped if the bundle is loaded"""
+    mock_launcher.return_value.configure.return_value = {
+        "fuzzing_config": {"path": None}
+    }
+    mock_launcher.return_value.load_bundle.return_value = True
+    cli.main(["--decision-task", "someTaskId"])
+    mock_launcher.return_value.load_bundle.assert_called_once_with("someTaskId")
+    mock_launcher.return_value.clone.assert_not_called()
+    mock_launcher.return_value.load_params.assert_not_called()
+
+    # fallback to clone if the bundle is unavailable
+    mock_launcher.return_value.load_bundle.return_value = False
+    cli.main(["--decision-task", "someTaskId"])
+    mock_launcher.return_value.clone.assert_called_once()
+    mock_launcher.return_value.load_params.assert_called_once()
+
+
 @pytest.fixture
 def pool_data():
     return {
@@ -222,6 +243,72 @@ def test_load_params_apply(tmp_path, pool_data):
     }
 
 
+@pytest.mark.parametrize("preprocess", [False, True])
+@patch("os.environ", {})
+def test_load_bundle(mocker, preprocess):
+    """params are loaded from the decision task bundle"""
+    os.environ["STATIC"] = "value"
+    queue = mocker.patch("fuzzing_decision.pool_launch.launcher.taskcluster")
+    artifact_url = "https://storage.example.com/pool-config.json"
+    # the queue returns a redirect stub, the content is downloaded from the url
+    queue.get_service.return_value.latestArtifact.return_value = {
+        "storageType": "s3",
+        "url": artifact_url,
+    }
+    bundle = {
+        "test-pool": {
+            "command": ["new-command"],
+            "env": {"ENVVAR1": "123456", "STATIC": "failed!"},
+            "name": "Amazing fuzzing pool",
+            "preprocess": {
+                "command": ["new-command"],
+                "env": {"PREPROC": "1"},
+                "name": "Amazing fuzzing pool (preproc)",
+            },
+        }
+    }
+
+    async def _download(url, writer_factory, _session, _max_retries):
+        assert url == artifact_url
+        writer = await writer_factory()
+        await writer.write(json.dumps(bundle).encode())
+        return "application/json"
+
+    mocker.patch("taskcluster.aio.download._s3Download", side_effect=_download)
+    launcher = PoolLauncher([], "test-pool", preprocess)
+    assert launcher.load_bundle("someTaskId")
+    queue.get_service.return_value.latestArtifact.assert_called_with(
+        "someTaskId", "private/fuzzing/pool-config.json"
+    )
+    assert launcher.command == ["new-command"]
+    if preprocess:
+        assert launcher.environment == {
+            "FUZZING_POOL_NAME": "Amazing fuzzing pool (preproc)",
+            "PREPROC": "1",
+            "STATIC": "value",
+        }
+    else:
+        assert launcher.environment == {
+            "ENVVAR1": "123456",
+            "FUZZING_POOL_NAME": "Amazing fuzzing pool",
+            "STATIC": "value",
+        }
+
+    # pool missing from the bundle
+    launcher = PoolLauncher([], "other-pool")
+    assert not launcher.load_bundle("someTaskId")
+
+
+def test_load_bundle_missing(mocker):
+    """bundle isn't used if it can't be fetched"""
+    queue = mocker.patch("fuzzing_decision.pool_launch.launcher.taskcluster")
+    queue.get_service.return_value.latestArtifact.side_effect = TaskclusterFailure(
+        "not found"
+    )
+    launcher = PoolLauncher([], "test-pool")
+    assert not launcher.load_bundle("someTaskId")
+
+
 def test_launch_exec(tmp_path, monkeypatch, mocker):
     # Start with taskcluster detection disabled, even on CI
     monkeypatch.delenv("TASK_ID", raising=False)
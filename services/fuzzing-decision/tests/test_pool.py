@@ -3,22 +3,44 @@
 # v. 2.0. If a copy of the MPL was not distributed with this file, You can
 # obtain one at http://mozilla.org/MPL/2.0/.
 
+import asyncio
+import json
+import os
+from copy import deepcopy
 from datetime import datetime, timedelta, timezone
-from itertools import chain
+from itertools import chain, product
 from pathlib import Path
 
 import dateutil.parser
 import pytest
 import slugid
 import yaml
-
-from fuzzing_decision.common.pool import FuzzingPoolConfig
+from taskcluster.exceptions import TaskclusterRestFailure
+from tcadmin.resources import Hook
+from tcadmin.resources import WorkerPool as TCWorkerPool
+
+from fuzzing_decision.common.pool import (
+    ConfigurationError,
+    FuzzingPoolConfig,
+    MachineTypes,
+    compact_crons,
+)
 from fuzzing_decision.common.util import parse_size, parse_time
+from fuzzing_decision.decision.callbacks import cancel_pool_tasks, trigger_hook
+from fuzzing_decision.decision.capacity import PoolMetrics, recommend_capacity
 from fuzzing_decision.decision.pool import (
+    CONFIG_TAG,
     DOCKER_WORKER_DEVICES,
+    MountArtifactResolver,
+    build_config_bundle,
     build_resources,
     build_tasks,
+    cancel_tasks,
+    config_fingerprint,
+    create_tasks,
+    reconcile_tasks,
 )
+from fuzzing_decision.decision.providers import Static
 
 POOL_FIXTURES = Path(__file__).parent / "fixtures" / "pools"
 
@@ -56,7 +78,7 @@ def _get_expected_hook(platform="linux"):
         "kind": "Hook",
         "name": f"{platform}-test",
         "owner": "fuzzing@allizom.org",
-        "schedule": ["0 0 12 * * *", "0 0 0 * * *"],
+        "schedule": ["0 0 0,12 * * *"],
         "task": {
             "created": {"$fromNow": "0 seconds"},
             "deadline": {"$fromNow": "1 hour"},
@@ -73,8 +95,18 @@ def _get_expected_hook(platform="linux"):
                 "source": "https://github.com/MozillaSecurity/orion",
             },
             "payload": {
-                "artifacts": {},
-                "command": ["fuzzing-decision", "test"],
+                "artifacts": {
+                    "private/fuzzing/pool-config.json": {
+                        "path": "/tmp/pool-config.json",
+                        "type": "file",
+                    }
+                },
+                "command": [
+                    "fuzzing-decision",
+                    "test",
+                    "--config-bundle",
+                    "/tmp/pool-config.json",
+                ],
                 "env": {"TASKCLUSTER_SECRET": "project/fuzzing/decision"},
                 "features": {"taskclusterProxy": True},
                 "image": {
@@ -112,6 +144,7 @@ def _get_expected_role(
             "queue:cancel-task:test/*",
             "queue:create-task:highest:proj-fuzzing/ci-decision",
             f"queue:create-task:highest:proj-fuzzing/{platform}-test",
+            "queue:get-artifact:private/fuzzing/pool-config.json",
             "queue:scheduler-id:test",
             "secrets:get:project/fuzzing/decision",
         ],
@@ -393,6 +426,115 @@ def test_azure_resources(
     assert role.to_json() == _get_expected_role(platform="windows")
 
 
+def test_worker_config_copied(mock_clouds):
+    """worker configs don't modify or share the imageset"""
+    gcp = mock_clouds["gcp"]
+    first = gcp.get_worker_config("generic-worker-A", "linux", 1, "generic")
+    second = gcp.get_worker_config("generic-worker-A", "linux", 2, "d2g")
+    assert first["genericWorker"]["config"]["numberOfTasksToRun"] == 1
+    assert "d2gConfig" not in first["genericWorker"]["config"]
+    assert second["genericWorker"]["config"]["numberOfTasksToRun"] == 2
+    assert gcp.imagesets["generic-worker-A"]["workerConfig"] == {
+        "genericWorker": {"config": {"anyKey": "anyValue"}}
+    }
+
+
+@pytest.mark.parametrize("limit", [None, 2])
+def test_rank_launch_configs(mock_clouds, limit):
+    """launch configs are pruned & weighted by cost per CPU"""
+    machines = MachineTypes(
+        {
+            "max_launch_configs": 2,
+            "gcp": {
+                "x64": {
+                    "gcp1": {
+                        "cpu": 2,
+                        "prices": {"us-west1-a": 1.0, "us-west1-b": 0.5},
+                        "preemption": {"us-west1-b": 0.5},
+                    },
+                    "gcp2": {"cpu": 4, "prices": {"us-west1-a": 1.0}},
+                    "gcp3": {"prices": {"us-west1-a": 1.0}},
+                }
+            },
+        }
+    )
+    assert machines.max_launch_configs == 2
+    assert machines.cost("gcp", "x64", "gcp1", "us-west1-a") == 0.5
+    assert machines.cost("gcp", "x64", "gcp1", "us-west1-b") == 0.5
+    assert machines.cost("gcp", "x64", "gcp2", "us-west1-a") == 0.25
+    assert machines.cost("gcp", "x64", "gcp2", "us-west1-b") is None
+    # cost per CPU is unknown without a CPU count
+    assert machines.cost("gcp", "x64", "gcp3", "us-west1-a") is None
+
+    gcp = mock_clouds["gcp"]
+    configs = gcp.build_launch_configs(
+        "generic-worker-A",
+        [("gcp1", frozenset()), ("gcp2", frozenset())],
+        10,
+        "linux",
+        False,
+        False,
+        False,
+        0,
+        "generic",
+    )
+    # existing worker-manager properties are kept
+    configs[0]["workerManager"] = {"launchConfigId": "first"}
+    original = deepcopy(configs)
+    ranked = gcp.rank_launch_configs(
+        configs,
+        lambda machine, zone: machines.cost("gcp", "x64", machine, zone),
+        limit,
+    )
+    weights = {
+        gcp.machine_zone(config): config.get("workerManager", {}).get("initialWeight")
+        for config in ranked
+    }
+    assert ranked[0]["workerManager"]["launchConfigId"] == "first"
+    expected = {
+        ("gcp1", "us-west1-a"): 0.5,
+        ("gcp2", "us-west1-a"): 1.0,
+    }
+    if limit is None:
+        expected[("gcp1", "us-west1-b")] = 0.5
+        expected[("gcp2", "us-west1-b")] = None
+    assert weights == expected
+    # original order is kept, and the given configs are not modified
+    assert [gcp.machine_zone(config) for config in ranked] == [
+        gcp.machine_zone(config)
+        for config in configs
+        if gcp.machine_zone(config) in expected
+    ]
+    assert configs == original
+
+    # ranking is skipped if no cost is known
+    unranked = gcp.rank_launch_configs(configs, lambda machine, zone: None, limit)
+    assert unranked == original
+
+
+def test_rank_launch_configs_static(mocker):
+    """static machines are never ranked"""
+    configs = [{"workerConfig": {}}]
+    cost = mocker.Mock(return_value=1.0)
+    assert Static().rank_launch_configs(configs, cost, 0) == configs
+    assert cost.call_count == 0
+
+
+def test_launch_configs_memoized(mocker, mock_clouds):
+    """launch configs are built once for identical pools"""
+    gcp = mock_clouds["gcp"]
+    build = mocker.spy(gcp, "build_launch_configs")
+    args = ("generic-worker-A", "linux", False, False, False, 0, "generic")
+    first = gcp.launch_configs(args[0], iter([("a2", frozenset())]), 10, *args[1:])
+    second = gcp.launch_configs(args[0], iter([("a2", frozenset())]), 10, *args[1:])
+    assert build.call_count == 1
+    # the result is shared, and can't be extended by callers
+    assert first is second
+    assert isinstance(first, tuple)
+    gcp.launch_configs(args[0], iter([("a2", frozenset())]), 20, *args[1:])
+    assert build.call_count == 2
+
+
 @pytest.mark.usefixtures("appconfig")
 @pytest.mark.parametrize("demand", [True, False])
 @pytest.mark.parametrize("env", [(None), ({"someKey": "someValue"})])
@@ -729,11 +871,13 @@ def test_tasks(
         return datetime.strptime(value, "%Y-%m-%dT%H:%M:%S.%fZ")
 
     for i, task in enumerate(tasks):
+        fingerprint = config_fingerprint(conf, task)
         created = _get_date(task.pop("created"))
         deadline = _get_date(task.pop("deadline"))
         expires = _get_date(task.pop("expires"))
         assert expires >= deadline > created
         expected_env = {
+            "TASKCLUSTER_FUZZING_DECISION": "someTaskId",
             "TASKCLUSTER_FUZZING_POOL": "test",
             "TASKCLUSTER_SECRET": "project/fuzzing/decision",
         }
@@ -760,6 +904,7 @@ def test_tasks(
             )
         )
         assert set(task["scopes"]) == {
+            "queue:get-artifact:private/fuzzing/pool-config.json",
             "secrets:get:project/fuzzing/decision",
             *scopes,
             *[f"queue:route:{route}" for route in task["routes"]],
@@ -802,7 +947,7 @@ def test_tasks(
             "routes": task["routes"],
             "schedulerId": "test",
             "scopes": task["scopes"],
-            "tags": {},
+            "tags": {CONFIG_TAG: fingerprint},
             "taskGroupId": "someTaskId",
             "workerType": f"{platform}-test",
         }
@@ -837,6 +982,287 @@ def test_tasks(
         assert task == expected
 
 
+def test_tasks_copied(mocker):
+    """tasks in a pool are rendered once, but each task is a separate object"""
+    conf = next(FuzzingPoolConfig.from_file(POOL_FIXTURES / "pool1.yml"))
+    conf.tasks = 5
+    safe_load = mocker.spy(yaml, "safe_load")
+    tasks = [task for _, task in build_tasks(conf, "someTaskId")]
+    assert safe_load.call_count == 1
+    assert [task["metadata"]["name"] for task in tasks] == [
+        f"Fuzzing task {conf.task_id} - {i}/5" for i in range(1, 6)
+    ]
+    tasks[0]["payload"]["env"]["NEW"] = "1"
+    tasks[0]["scopes"].append("new-scope")
+    assert all("NEW" not in task["payload"]["env"] for task in tasks[1:])
+    assert all("new-scope" not in task["scopes"] for task in tasks[1:])
+
+
+@pytest.mark.parametrize("pool_file", ["pool1.yml", "pre-pool.yml"])
+def test_tasks_depend_on_decision(pool_file):
+    """tasks wait for the decision task, which publishes the configuration bundle"""
+    conf = next(FuzzingPoolConfig.from_file(POOL_FIXTURES / pool_file))
+    conf.tasks = 2
+    tasks = list(build_tasks(conf, "someTaskId"))
+    assert len(tasks) == (3 if conf.preprocess else 2)
+    assert all(task["dependencies"][0] == "someTaskId" for _, task in tasks)
+    if conf.preprocess:
+        preprocess_task_id = tasks[0][0]
+        assert all(preprocess_task_id in task["dependencies"] for _, task in tasks[1:])
+
+
+def test_create_tasks(mocker):
+    """preprocess tasks are created first, rate limited requests are retried"""
+    mocker.patch("fuzzing_decision.common.retry.sleep")
+    taskcluster = mocker.patch("fuzzing_decision.decision.pool.taskcluster")
+    queue = taskcluster.get_service.return_value
+    conf = next(FuzzingPoolConfig.from_file(POOL_FIXTURES / "pre-pool.yml"))
+    conf.tasks = 3
+    tasks = list(build_tasks(conf, "someTaskId"))
+    task_ids = [task_id for task_id, _ in tasks]
+    created = []
+    failed = set()
+
+    def _create(task_id, _task):
+        # fail once, then succeed
+        if task_id == task_ids[2] and task_id not in failed:
+            failed.add(task_id)
+            raise TaskclusterRestFailure("error", None, status_code=429)
+        created.append(task_id)
+
+    queue.createTask.side_effect = _create
+    create_tasks(reversed(tasks))
+    assert created[0] == task_ids[0]
+    assert sorted(created) == sorted(task_ids)
+    assert queue.createTask.call_count == 5
+
+    # other errors are raised, server errors were already retried by the client
+    for status in (403, 503):
+        queue.createTask.reset_mock()
+        queue.createTask.side_effect = TaskclusterRestFailure("error", None, status)
+        with pytest.raises(TaskclusterRestFailure):
+            create_tasks(tasks)
+        assert queue.createTask.call_count == 1
+
+
+def _task_status(task_id, state):
+    return {"status": {"taskId": task_id, "runs": [{"state": state}]}}
+
+
+@pytest.mark.parametrize("use_async", [False, True])
+@pytest.mark.parametrize("fired_by", ["schedule", "triggerHook"])
+def test_cancel_tasks(mocker, monkeypatch, fired_by, use_async):
+    """pending & running tasks from recent hook fires are cancelled"""
+    monkeypatch.setenv("TASK_ID", "self")
+    if use_async:
+        taskcluster = mocker.patch("fuzzing_decision.decision.callbacks.taskcluster")
+        hooks = mocker.AsyncMock()
+        queue = mocker.AsyncMock()
+    else:
+        taskcluster = mocker.patch("fuzzing_decision.decision.pool.taskcluster")
+        hooks = mocker.Mock()
+        queue = mocker.Mock()
+    services = {"hooks": hooks, "queue": queue}
+    taskcluster.get_service.side_effect = lambda name, **_kwds: services[name]
+    now = datetime.now(timezone.utc)
+    hooks.listLastFires.return_value = {
+        "lastFires": [
+            {
+                "result": "success",
+                "taskCreateTime": (now - timedelta(hours=1)).isoformat(),
+                "taskId": "group1",
+                "firedBy": "triggerHook",
+            },
+            {
+                "result": "success",
+                "taskCreateTime": (now - timedelta(days=7)).isoformat(),
+                "taskId": "old",
+                "firedBy": "triggerHook",
+            },
+            {
+                "result": "error",
+                "taskCreateTime": now.isoformat(),
+                "taskId": "failed",
+                "firedBy": "triggerHook",
+            },
+            {
+                "result": "success",
+                "taskCreateTime": now.isoformat(),
+                "taskId": "group2",
+                "firedBy": fired_by,
+            },
+        ]
+    }
+    groups = {
+        ("group1", None): {
+            "tasks": [_task_status("a", "pending"), _task_status("b", "completed")],
+            "continuationToken": "next",
+        },
+        ("group1", "next"): {"tasks": [_task_status("c", "running")]},
+        ("group2", None): {
+            "tasks": [_task_status("self", "running"), _task_status("d", "pending")]
+        },
+    }
+
+    def _list(group, query=None):
+        return groups[(group, (query or {}).get("continuationToken"))]
+
+    queue.listTaskGroup.side_effect = _list
+    # errors cancelling a task are logged
+    queue.cancelTask.side_effect = [None, None, TaskclusterRestFailure("err", None)]
+    if use_async:
+        pool = mocker.Mock(spec=TCWorkerPool, workerPoolId="proj-fuzzing/linux-test")
+        asyncio.run(cancel_pool_tasks(["update"], pool))
+    else:
+        cancel_tasks("linux-test")
+    hooks.listLastFires.assert_called_once_with("project-fuzzing", "linux-test")
+    assert queue.listTaskGroup.call_count == 3
+    if fired_by == "schedule":
+        queue.cancelTask.assert_not_called()
+    else:
+        assert {call.args[0] for call in queue.cancelTask.call_args_list} == {
+            "a",
+            "c",
+            "d",
+        }
+
+
+def test_trigger_hook(mocker):
+    """hooks are triggered with the async client, within the request limit"""
+    mocker.patch("fuzzing_decision.decision.callbacks.MAX_CONCURRENT_REQUESTS", 2)
+    taskcluster = mocker.patch("fuzzing_decision.decision.callbacks.taskcluster")
+    hooks = taskcluster.get_service.return_value
+    in_flight = []
+    peak = []
+
+    async def _trigger(_group, hook_id, _payload):
+        in_flight.append(hook_id)
+        peak.append(len(in_flight))
+        await asyncio.sleep(0)
+        in_flight.remove(hook_id)
+
+    hooks.triggerHook = mocker.AsyncMock(side_effect=_trigger)
+
+    resources = [
+        mocker.Mock(spec=Hook, hookGroupId="project-fuzzing", hookId=str(i))
+        for i in range(5)
+    ]
+
+    async def _run():
+        await asyncio.gather(*(trigger_hook(["create"], hook) for hook in resources))
+
+    asyncio.run(_run())
+    taskcluster.get_service.assert_called_with("hooks", use_async=True)
+    assert hooks.triggerHook.await_count == 5
+    assert max(peak) == 2
+
+
+def test_config_fingerprint(mocker):
+    """fingerprint changes with the configuration and rendered task, but not the
+    clone location or fields which differ between decision tasks"""
+    conf = next(FuzzingPoolConfig.from_file(POOL_FIXTURES / "pool1.yml"))
+    _task_id, task = next(build_tasks(conf, "someTaskId"))
+    fingerprint = task["tags"][CONFIG_TAG]
+    assert config_fingerprint(conf, task) == fingerprint
+
+    mocker.patch(
+        "fuzzing_decision.decision.pool.datetime",
+        mocker.Mock(now=lambda _tz: datetime.now(timezone.utc) + timedelta(hours=1)),
+    )
+    _task_id, later = next(
+        build_tasks(conf, "otherTaskId", {"FUZZING_GIT_REVISION": "b"})
+    )
+    assert later["created"] != task["created"]
+    assert later["tags"][CONFIG_TAG] == fingerprint
+    conf.base_dir = Path("/elsewhere")
+    assert config_fingerprint(conf, task) == fingerprint
+
+    # the pool configuration is included
+    conf.env = {**conf.env, "NEW": "1"}
+    assert config_fingerprint(conf, task) != fingerprint
+
+    # and the rendered task, eg. a rebuilt image
+    conf = next(FuzzingPoolConfig.from_file(POOL_FIXTURES / "pool1.yml"))
+    conf.container = {"type": "task-image", "taskId": "rebuilt", "path": "img.tar"}
+    _task_id, task = next(build_tasks(conf, "someTaskId"))
+    assert task["tags"][CONFIG_TAG] != fingerprint
+
+
+@pytest.mark.parametrize("matching, created", [(0, 2), (1, 1), (3, 0)])
+def test_reconcile_tasks(matching, created):
+    """tasks matching the configuration are kept, others replaced"""
+    conf = next(FuzzingPoolConfig.from_file(POOL_FIXTURES / "pool1.yml"))
+    conf.tasks = 2
+
+    def _existing(task_id, tags):
+        return {**_task_status(task_id, "running"), "task": {"tags": tags}}
+
+    fingerprint = next(build_tasks(conf, "prevTaskId"))[1]["tags"][CONFIG_TAG]
+    existing = [
+        _existing(f"match{i}", {CONFIG_TAG: fingerprint}) for i in range(matching)
+    ]
+    existing.append(_existing("stale", {CONFIG_TAG: "old"}))
+    existing.append(_existing("untagged", {}))
+    to_cancel, to_create = reconcile_tasks([conf], existing, "someTaskId")
+    assert sorted(to_cancel) == sorted(
+        ["stale", "untagged"] + [f"match{i}" for i in range(2, matching)]
+    )
+    assert len(to_create) == created
+    for _, task in to_create:
+        assert task["tags"] == {CONFIG_TAG: fingerprint}
+
+
+@pytest.mark.parametrize(
+    "metrics, max_tasks, expected",
+    [
+        # no metrics: default
+        (None, 0, (8, 0)),
+        (PoolMetrics(running=[5]), 0, (8, 0)),
+        # workers are reused, but it's unknown how often: default
+        (PoolMetrics([4], [600], [36000]), 0, (8, 0)),
+        # one task per worker, workers live 1.5x as long as tasks
+        (PoolMetrics([0, 0, 3], [600, 600], [900, 900]), 1, (6, 0)),
+        # 10 tasks per worker, with 1 minute of overhead per worker
+        (PoolMetrics([2, 3, 5], [600], [6060], [10]), 0, (5, 2)),
+        # slack is bounded, tasks always running
+        (PoolMetrics([10], [60], [3600]), 1, (12, 4)),
+    ],
+)
+def test_recommend_capacity(metrics, max_tasks, expected):
+    assert recommend_capacity("linux-test", 4, metrics, max_tasks) == expected
+
+
+def test_pool_metrics_file(tmp_path):
+    metrics_file = tmp_path / "metrics.json"
+    metrics_file.write_text(
+        json.dumps({"linux-test": {"running": [1], "task_duration": [30.5]}})
+    )
+    assert PoolMetrics.from_file(metrics_file) == {
+        "linux-test": PoolMetrics(running=[1], task_duration=[30.5])
+    }
+
+
+def test_config_bundle():
+    """the bundle has launch params for each pool and its preprocess"""
+    conf = next(FuzzingPoolConfig.from_file(POOL_FIXTURES / "pre-pool.yml"))
+    preprocess = next(conf.get_preprocess())
+    bundle = build_config_bundle([conf])
+    assert bundle == {
+        "pre-pool": {
+            "command": conf.command,
+            "env": conf.env,
+            "name": "Amazing fuzzing pool",
+            "preprocess": {
+                "command": preprocess.command,
+                "env": preprocess.env,
+                "name": preprocess.name,
+            },
+        }
+    }
+    # the bundle must survive publishing as an artifact
+    assert json.loads(json.dumps(bundle)) == bundle
+
+
 def test_preprocess_tasks():
     conf = next(FuzzingPoolConfig.from_file(POOL_FIXTURES / "pre-pool.yml"))
 
@@ -858,8 +1284,14 @@ def test_preprocess_tasks():
             "deps": ["someTaskId"],
             "extra_env": {"TASKCLUSTER_FUZZING_PREPROCESS": "1"},
             "name": "preprocess",
+            "tags": {},
+        },
+        {
+            "deps": ["someTaskId", task_ids[0]],
+            "extra_env": {},
+            "name": "1/1",
+            "tags": {CONFIG_TAG: config_fingerprint(conf, tasks[1])},
         },
-        {"deps": ["someTaskId", task_ids[0]], "extra_env": {}, "name": "1/1"},
     ]
     for task, expect in zip(tasks, expected):
         created = _get_date(task.pop("created"))
@@ -867,6 +1299,7 @@ def test_preprocess_tasks():
         expires = _get_date(task.pop("expires"))
         assert expires >= deadline > created
         expected_env = {
+            "TASKCLUSTER_FUZZING_DECISION": "someTaskId",
             "TASKCLUSTER_FUZZING_POOL": "pre-pool",
             "TASKCLUSTER_SECRET": "project/fuzzing/decision",
         }
@@ -876,7 +1309,10 @@ def test_preprocess_tasks():
         assert expires == _get_date(
             task["payload"]["artifacts"]["project/fuzzing/private/logs"].pop("expires")
         )
-        assert set(task["scopes"]) == {"secrets:get:project/fuzzing/decision"}
+        assert set(task["scopes"]) == {
+            "queue:get-artifact:private/fuzzing/pool-config.json",
+            "secrets:get:project/fuzzing/decision",
+        }
         # scopes are already asserted above
         # - read the value for comparison instead of deleting the key, so the object is
         #   printed in full on failure
@@ -912,7 +1348,7 @@ def test_preprocess_tasks():
             "routes": [],
             "schedulerId": "test",
             "scopes": scopes,
-            "tags": {},
+            "tags": expect["tags"],
             "taskGroupId": "someTaskId",
             "workerType": "linux-pre-pool",
         }
@@ -947,6 +1383,37 @@ def test_flatten(pool_path):
     assert pool.max_tasks == expect.max_tasks
 
 
+def test_pool_yaml_cache(mocker, tmp_path):
+    parent = tmp_path / "parent.yml"
+    parent.write_text(yaml.dump({"name": "parent", "env": {"A": "1"}}))
+    for idx in range(3):
+        child = {"parents": ["parent"], "env": {"B": str(idx)}}
+        (tmp_path / f"pool{idx}.yml").write_text(yaml.dump(child))
+    mocker.patch.dict("fuzzing_decision.common.pool._PARSED_YAML", clear=True)
+    safe_load = mocker.spy(yaml, "safe_load")
+    for idx in range(3):
+        raw = FuzzingPoolConfig._load_partial(tmp_path / f"pool{idx}.yml", set())
+        assert raw["env"] == {"A": "1", "B": str(idx)}
+        raw["env"]["C"] = "modified"
+    # parent is parsed once, and callers can't modify the cached result
+    assert safe_load.call_count == 4
+    raw = FuzzingPoolConfig._load_partial(tmp_path / "pool0.yml", set())
+    assert raw["env"] == {"A": "1", "B": "0"}
+    assert safe_load.call_count == 4
+    # a modified file is parsed again
+    parent.write_text(yaml.dump({"name": "parent", "env": {"A": "22"}}))
+    raw = FuzzingPoolConfig._load_partial(tmp_path / "pool0.yml", set())
+    assert raw["env"] == {"A": "22", "B": "0"}
+    assert safe_load.call_count == 5
+
+
+def test_pool_cyclic(tmp_path):
+    (tmp_path / "pool1.yml").write_text(yaml.dump({"parents": ["pool2"]}))
+    (tmp_path / "pool2.yml").write_text(yaml.dump({"parents": ["pool1"]}))
+    with pytest.raises(ConfigurationError, match="cyclic"):
+        FuzzingPoolConfig._load_partial(tmp_path / "pool1.yml", set())
+
+
 def test_pool_map():
     pools = list(FuzzingPoolConfig.from_file(POOL_FIXTURES / "map1.yml"))
     expect = next(FuzzingPoolConfig.from_file(POOL_FIXTURES / "expect1.yml"))
@@ -1021,6 +1488,8 @@ def test_pool_map_admin(mocker):
     task["metadata"].pop("description")
     for artifact in task["payload"]["artifacts"]:
         artifact.pop("expires")
+    # the fingerprint is tested elsewhere
+    assert len(task["tags"].pop(CONFIG_TAG)) == 64
     # ensure lists are comparable
     for key in ("dependencies", "routes", "scopes"):
         task[key] = sorted(task[key])
@@ -1073,12 +1542,7 @@ def test_cycle_crons():
     )
 
     # cycle time 6h
-    assert list(conf.cycle_crons()) == [
-        "0 0 6 * * *",
-        "0 0 12 * * *",
-        "0 0 18 * * *",
-        "0 0 0 * * *",
-    ]
+    assert list(conf.cycle_crons()) == ["0 0 0-18/6 * * *"]
 
     # cycle time 3.5 days
     conf.cycle_time = int(3600 * 24 * 3.5)
@@ -1087,29 +1551,38 @@ def test_cycle_crons():
         "0 0 0 * * 4",
     ]
 
+    # cycle time 7h
+    conf.cycle_time = 3600 * 7
+    crons = list(conf.cycle_crons())
+    assert len(crons) == 7
+    assert crons[:2] == ["0 0 5-19/7 * * 0", "0 0 2-23/7 * * 1"]
+
     # cycle time 17h
     conf.cycle_time = 3600 * 17
     crons = list(conf.cycle_crons())
-    assert len(crons) == (365 * 24 // 17) + 1
-    assert crons[:4] == ["0 0 17 1 1 *", "0 0 10 2 1 *", "0 0 3 3 1 *", "0 0 20 3 1 *"]
+    assert len(crons) == 120
+    assert crons[:3] == ["0 0 12 1,9,26 1 *", "0 0 17 1,18 1 *", "0 0 10 2,19 1 *"]
 
     # cycle time 48h
     conf.cycle_time = 3600 * 48
-    crons = list(conf.cycle_crons())
-    assert len(crons) == (365 * 24 // 48) + 1
-    assert crons[:4] == ["0 0 0 3 1 *", "0 0 0 5 1 *", "0 0 0 7 1 *", "0 0 0 9 1 *"]
-
-    # cycle time 72h
-    conf.cycle_time = 3600 * 72
-    crons = list(conf.cycle_crons())
-    assert len(crons) == (365 * 24 // 72) + 1
-    assert crons[:4] == ["0 0 0 4 1 *", "0 0 0 7 1 *", "0 0 0 10 1 *", "0 0 0 13 1 *"]
+    assert list(conf.cycle_crons()) == [
+        "0 0 0 2,3-31/2 1 *",
+        "0 0 0 2-28/2 2 *",
+        "0 0 0 2-30/2 3,6,7,9,10 *",
+        "0 0 0 1-29/2 4,11 *",
+        "0 0 0 1-31/2 5,8,12 *",
+    ]
 
     # cycle time 17d
     conf.cycle_time = 3600 * 24 * 17
     crons = list(conf.cycle_crons())
-    assert len(crons) == (365 // 17) + 1
-    assert crons[:4] == ["0 0 0 18 1 *", "0 0 0 4 2 *", "0 0 0 21 2 *", "0 0 0 10 3 *"]
+    assert len(crons) == 7
+    assert crons[:4] == [
+        "0 0 0 10,18 1 *",
+        "0 0 0 4,21 2 *",
+        "0 0 0 10,27 3,8 *",
+        "0 0 0 13,30 4,9 *",
+    ]
 
     # using schedule_start should be the same as using datetime.now()
     conf.schedule_start = None
@@ -1125,6 +1598,39 @@ def test_cycle_crons():
         assert calc_none == list(conf.cycle_crons())
 
 
+def _expand_cron(cron):
+    """Expand a cron pattern into every combination of field values"""
+    fields = []
+    for field in cron.split():
+        if field == "*":
+            fields.append([None])
+            continue
+        values = []
+        for part in field.split(","):
+            part, _, step = part.partition("/")
+            start, _, stop = part.partition("-")
+            values.extend(range(int(start), int(stop or start) + 1, int(step or 1)))
+        fields.append(values)
+    return set(product(*fields))
+
+
+@pytest.mark.parametrize("hours", [5, 13, 17, 17.5, 100])
+def test_compact_crons(hours):
+    """compacted cron patterns fire at exactly the same times"""
+    now = datetime(2024, 3, 1, tzinfo=timezone.utc)
+    interval = timedelta(hours=hours)
+    times = set()
+    for _ in range(int(365 * 24 / hours)):
+        now += interval
+        times.add((now.second, now.minute, now.hour, now.day, now.month, None))
+    crons = compact_crons(times)
+    assert len(crons) < len(times)
+    expanded = [_expand_cron(cron) for cron in crons]
+    assert set().union(*expanded) == times
+    # patterns don't overlap
+    assert sum(len(fires) for fires in expanded) == len(times)
+
+
 @pytest.mark.parametrize(
     "attr", ("nested_virtualization", "performance_monitoring_unit")
 )
@@ -1238,11 +1744,13 @@ def test_task_image(mocker):
         return datetime.strptime(value, "%Y-%m-%dT%H:%M:%S.%fZ")
 
     for i, task in enumerate(tasks):
+        fingerprint = config_fingerprint(conf, task)
         created = _get_date(task.pop("created"))
         deadline = _get_date(task.pop("deadline"))
         expires = _get_date(task.pop("expires"))
         assert expires >= deadline > created
         expected_env = {
+            "TASKCLUSTER_FUZZING_DECISION": "someTaskId",
             "TASKCLUSTER_FUZZING_POOL": "test",
             "TASKCLUSTER_SECRET": "project/fuzzing/decision",
         }
@@ -1261,6 +1769,7 @@ def test_task_image(mocker):
             )
         )
         assert set(task["scopes"]) == {
+            "queue:get-artifact:private/fuzzing/pool-config.json",
             "secrets:get:project/fuzzing/decision",
             *[f"queue:route:{route}" for route in task["routes"]],
         }
@@ -1307,9 +1816,79 @@ def test_task_image(mocker):
             "routes": task["routes"],
             "schedulerId": "test",
             "scopes": task["scopes"],
-            "tags": {},
+            "tags": {CONFIG_TAG: fingerprint},
             "taskGroupId": "someTaskId",
             "workerType": "linux-test",
         }
 
         assert task == expected
+
+
+def test_mount_artifact_resolver(mocker, tmp_path):
+    """namespaces are resolved in a batch and cached on disk until they expire"""
+    cache_path = tmp_path / "index-tasks.json"
+    mocker.patch.dict(
+        "fuzzing_decision.decision.pool.MountArtifactResolver.CACHE", clear=True
+    )
+    mocker.patch.object(MountArtifactResolver, "CACHE_PATH", cache_path)
+    taskcluster = mocker.patch("fuzzing_decision.decision.pool.taskcluster")
+    index = taskcluster.get_service.return_value
+    now = datetime.now(timezone.utc)
+    expires = {
+        "ns.a": now + timedelta(days=30),
+        "ns.b": now + timedelta(minutes=5),
+    }
+    index.findTask.side_effect = lambda namespace: {
+        "namespace": namespace,
+        "taskId": f"task-{namespace}",
+        "expires": expires[namespace].isoformat(),
+    }
+
+    assert MountArtifactResolver.resolve(["ns.a", "ns.b"]) == {
+        "ns.a": "task-ns.a",
+        "ns.b": "task-ns.b",
+    }
+    assert index.findTask.call_count == 2
+    cached = json.loads(cache_path.read_text())
+    assert set(cached) == {"ns.a", "ns.b"}
+    # only the cache file is left
+    assert list(tmp_path.iterdir()) == [cache_path]
+    # expiry is capped by MAX_AGE
+    cached_a = dateutil.parser.isoparse(cached["ns.a"]["expires"])
+    assert cached_a <= now + MountArtifactResolver.MAX_AGE + timedelta(seconds=5)
+    assert dateutil.parser.isoparse(cached["ns.b"]["expires"]) <= expires["ns.b"]
+
+    # memory cache
+    assert MountArtifactResolver.lookup_taskid("ns.a") == "task-ns.a"
+    assert index.findTask.call_count == 2
+
+    # disk cache, expired entries are looked up again
+    MountArtifactResolver.CACHE.clear()
+    cached["ns.b"]["expires"] = (now - timedelta(minutes=1)).isoformat()
+    cache_path.write_text(json.dumps(cached))
+    assert MountArtifactResolver.resolve(["ns.a", "ns.b"])["ns.a"] == "task-ns.a"
+    index.findTask.assert_called_with("ns.b")
+    assert index.findTask.call_count == 3
+
+    # invalid cache is ignored
+    MountArtifactResolver.CACHE.clear()
+    cache_path.write_text("[]")
+    assert MountArtifactResolver.lookup_taskid("ns.a") == "task-ns.a"
+    assert index.findTask.call_count == 4
+
+
+def test_mount_artifact_resolver_default_path(mocker, tmp_path):
+    """the default cache path is found when the cache is used"""
+    mocker.patch.object(MountArtifactResolver, "CACHE_PATH", None)
+    mocker.patch.dict(os.environ, {"XDG_CACHE_HOME": str(tmp_path)})
+    os.environ.pop("ORION_INDEX_CACHE", None)
+    assert MountArtifactResolver._cache_path() == (
+        tmp_path / "orion" / "fuzzing-decision" / "index-tasks.json"
+    )
+
+    # without a home directory, the cache is only kept in memory
+    del os.environ["XDG_CACHE_HOME"]
+    mocker.patch.object(Path, "home", side_effect=RuntimeError("no home"))
+    assert MountArtifactResolver._cache_path() is None
+    assert MountArtifactResolver._load_cache() == {}
+    MountArtifactResolver._save_cache({})
@@ -4,12 +4,18 @@
 # obtain one at http://mozilla.org/MPL/2.0/.
 
 import re
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 import pytest
 import yaml
 
-from fuzzing_decision.decision.workflow import Workflow
+from fuzzing_decision.common import pool as common_pool
+from fuzzing_decision.common.pool import ConfigurationError, FuzzingPoolConfig
+from fuzzing_decision.decision.workflow import Workflow, load_pool_files
+
+POOL_FIXTURES = Path(__file__).parent / "fixtures" / "pools"
 
 YAML_CONF = """---
 fuzzing_config:
@@ -110,3 +116,94 @@ def test_configure_secret(mock_taskcluster_workflow):
         "fuzzing_config": {"revision": "deadbeef", "url": "git@server:repo.git"},
         "private_key": "ssh super secret",
     }
+
+
+@pytest.mark.parametrize(
+    "stderr, fetches",
+    [
+        ("fatal: unable to access: Connection reset by peer", 10),
+        ("fatal: couldn't find remote ref nope", 1),
+    ],
+)
+def test_git_clone_retry(mocker, stderr, fetches):
+    """git fetch is retried on transient errors only"""
+    sleep = mocker.patch("fuzzing_decision.common.retry.sleep")
+    mocker.patch("fuzzing_decision.common.workflow.subprocess.check_output")
+    run = mocker.patch("fuzzing_decision.common.workflow.subprocess.run")
+    run.side_effect = subprocess.CalledProcessError(128, ["git"], stderr=stderr)
+    workflow = Workflow()
+    with pytest.raises(subprocess.CalledProcessError):
+        workflow.git_clone(url="https://example.com/repo", revision="main")
+    assert run.call_count == fetches
+    assert sleep.call_count == fetches - 1
+
+
+@pytest.mark.parametrize("jobs", [1, 3])
+def test_load_pool_files(jobs):
+    """pool files loaded in parallel are returned in order"""
+    paths = sorted(POOL_FIXTURES.glob("pool[0-9]*.yml"))
+    expected = [list(FuzzingPoolConfig.from_file(path)) for path in paths]
+    assert list(load_pool_files(paths, jobs=jobs)) == expected
+
+
+def test_load_pool_files_parsed_once(mocker, tmp_path):
+    """pool files are parsed in the parent process and given to worker processes"""
+    (tmp_path / "parent.yml").write_text(yaml.dump({"parents": ["grandparent"]}))
+    (tmp_path / "grandparent.yml").write_text(yaml.dump({"env": {"A": "1"}}))
+    paths = []
+    for idx in range(4):
+        paths.append(tmp_path / f"pool{idx}.yml")
+        paths[-1].write_text(yaml.dump({"parents": ["parent"], "env": {"B": "2"}}))
+    mocker.patch.dict(common_pool._PARSED_YAML, clear=True)
+
+    class _WorkerPool(ThreadPoolExecutor):
+        def __init__(self, *args, **kwds):
+            # worker processes start with nothing parsed
+            common_pool._PARSED_YAML.clear()
+            super().__init__(*args, **kwds)
+
+    mocker.patch("fuzzing_decision.decision.workflow.ProcessPoolExecutor", _WorkerPool)
+    load = mocker.patch(
+        "fuzzing_decision.decision.workflow._load_pool_file",
+        side_effect=lambda path: FuzzingPoolConfig._load_partial(path, set()),
+    )
+    safe_load = mocker.spy(yaml, "safe_load")
+    results = list(load_pool_files(paths, jobs=2))
+    assert load.call_count == len(paths)
+    assert all(raw["env"] == {"A": "1", "B": "2"} for raw in results)
+    # each file is parsed once, by the parent process
+    assert safe_load.call_count == len(paths) + 2
+
+
+def test_load_pool_files_error(tmp_path):
+    """configuration errors in a worker process are raised"""
+    for idx in range(1, 3):
+        (tmp_path / f"pool{idx}.yml").write_text(yaml.dump({"parents": ["pool1"]}))
+    with pytest.raises(ConfigurationError, match="cyclic"):
+        list(load_pool_files(sorted(tmp_path.glob("pool*.yml")), jobs=2))
+
+
+@pytest.mark.parametrize("scheduled", [False, True])
+def test_build_tasks_reconcile(mocker, scheduled):
+    """tasks are reconciled, except when the decision is scheduled"""
+    prefix = "fuzzing_decision.decision.workflow"
+    list_hook_tasks = mocker.patch(f"{prefix}.list_hook_tasks")
+    list_hook_tasks.return_value = ([], scheduled)
+    reconcile_tasks = mocker.patch(f"{prefix}.reconcile_tasks")
+    reconcile_tasks.return_value = (["stale"], [])
+    cancel_task_ids = mocker.patch(f"{prefix}.cancel_task_ids")
+    cancel_tasks = mocker.patch(f"{prefix}.cancel_tasks")
+    create_tasks = mocker.patch(f"{prefix}.create_tasks")
+    workflow = Workflow()
+    workflow.fuzzing_config_dir = POOL_FIXTURES
+    workflow.build_tasks("pool1", "someTaskId", {"fuzzing_config": {}}, reconcile=True)
+    list_hook_tasks.assert_called_once_with("linux-pool1")
+    cancel_tasks.assert_not_called()
+    if scheduled:
+        # previous tasks are about to expire, so all tasks are created
+        reconcile_tasks.assert_not_called()
+        cancel_task_ids.assert_not_called()
+        assert len(create_tasks.call_args.args[0]) == 3
+    else:
+        cancel_task_ids.assert_called_once_with(["stale"])
+        create_tasks.assert_called_once_with([])
@@ -5,27 +5,131 @@
 
 import argparse
 import json
+import os
 import re
 from abc import ABC, abstractmethod
 from argparse import ArgumentParser
 from collections.abc import Iterator
 from dataclasses import dataclass
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 from functools import wraps
 from json import loads
 from logging import DEBUG, INFO, WARNING, basicConfig, getLogger
 from pathlib import Path
+from tempfile import NamedTemporaryFile
 from typing import Any
 
 from dateutil.parser import isoparse
 from Reporter.Reporter import Reporter
 from taskcluster.helper import TaskclusterConfig
+from taskcluster.utils import stringDate
 
 # Shared taskcluster configuration
 Taskcluster = TaskclusterConfig("https://community-tc.services.mozilla.com")
 LOG = getLogger(__name__)
 
 
+def _index_cache_path() -> Path | None:
+    if "ORION_INDEX_CACHE" in os.environ:
+        return Path(os.environ["ORION_INDEX_CACHE"])
+    cache_home = os.environ.get("XDG_CACHE_HOME")
+    if not cache_home:
+        try:
+            cache_home = str(Path.home() / ".cache")
+        except RuntimeError:
+            # no home directory to cache in, don't cache on disk
+            return None
+    # not shared with other services, which would overwrite each other's entries
+    return Path(cache_home) / "orion" / "grizzly-reduce-monitor" / "index-tasks.json"
+
+
+# this is a single namespace version of fuzzing-decision MountArtifactResolver
+class IndexTaskResolver:
+    """Resolve index namespaces to the task IDs they currently point to.
+
+    Results are kept in memory, and on disk at `cache_path` until the index entry
+    expires, or `max_age` passes, whichever is first. If `cache_path` is None, the
+    default location is found when the cache is used.
+    """
+
+    def __init__(
+        self,
+        cache_path: Path | None = None,
+        max_age: timedelta = timedelta(hours=1),
+    ) -> None:
+        self.cache: dict[str, str] = {}
+        self.cache_path = cache_path
+        self.max_age = max_age
+
+    def _cache_path(self) -> Path | None:
+        if self.cache_path is not None:
+            return self.cache_path
+        return _index_cache_path()
+
+    def _load_cache(self) -> dict[str, dict[str, str]]:
+        cache_path = self._cache_path()
+        if cache_path is None:
+            return {}
+        try:
+            data = json.loads(cache_path.read_text())
+            now = datetime.now(timezone.utc)
+            return {
+                namespace: entry
+                for namespace, entry in data.items()
+                if isoparse(entry["expires"]) > now
+            }
+        except FileNotFoundError:
+            return {}
+        except (AttributeError, KeyError, OSError, TypeError, ValueError) as exc:
+            LOG.warning("Ignoring invalid index cache %s: %s", cache_path, exc)
+            return {}
+
+    def _save_cache(self, entries: dict[str, dict[str, str]]) -> None:
+        cache_path = self._cache_path()
+        if cache_path is None:
+            return
+        tmp = None
+        try:
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            # write a unique temporary file and rename it over the cache, so readers
+            # never see a partial file
+            with NamedTemporaryFile(
+                "w", dir=cache_path.parent, prefix=f"{cache_path.name}.", delete=False
+            ) as out:
+                tmp = Path(out.name)
+                json.dump(entries, out, indent=2, sort_keys=True)
+            tmp.replace(cache_path)
+        except OSError as exc:
+            LOG.warning("Failed to write index cache %s: %s", cache_path, exc)
+            if tmp is not None:
+                tmp.unlink(missing_ok=True)
+
+    def lookup(self, namespace: str) -> str:
+        """Resolve a namespace.
+
+        Arguments:
+            namespace: Index namespace to resolve.
+
+        Returns:
+            taskId the namespace points to.
+        """
+        if namespace not in self.cache:
+            entries = self._load_cache()
+            if namespace in entries:
+                self.cache[namespace] = entries[namespace]["taskId"]
+            else:
+                result = Taskcluster.get_service("index").findTask(namespace)
+                max_expires = datetime.now(timezone.utc) + self.max_age
+                expires = min(isoparse(result["expires"]), max_expires)
+                self.cache[namespace] = result["taskId"]
+                entries[namespace] = {
+                    "taskId": result["taskId"],
+                    "expires": stringDate(expires),
+                }
+                self._save_cache(entries)
+        return self.cache[namespace]
+
+
 # this is duplicated from grizzly status_reporter.py
 def format_seconds(duration: float) -> str:
     # format H:M:S, and then remove all leading zeros with regex
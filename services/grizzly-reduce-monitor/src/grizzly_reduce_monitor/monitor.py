@@ -23,6 +23,7 @@ from yaml import safe_load as yaml_load
 from .common import (
     CommonArgParser,
     CrashManager,
+    IndexTaskResolver,
     ReductionWorkflow,
     Taskcluster,
     format_seconds,
@@ -33,6 +34,12 @@ LOG = getLogger(__name__)
 # GENERIC_PLATFORM is used as a first pass for all unreduced test cases.
 GENERIC_PLATFORM = "linux"
 
+# index namespaces of images mounted by generic-worker reduction tasks
+GW_IMAGE_NAMESPACES = {
+    "macosx": "project.fuzzing.orion.grizzly-macos.master",
+    "windows": "project.fuzzing.orion.grizzly-win.master",
+}
+
 TC_QUEUES = {
     "android": "grizzly-reduce-worker-android",
     "linux": "grizzly-reduce-worker",
@@ -311,7 +318,7 @@ class ReductionMonitor(ReductionWorkflow):
     ) -> None:
         super().__init__()
         self.dry_run = dry_run
-        self._gw_image_artifact_tasks: dict[str, str] = {}
+        self._gw_image_resolver = IndexTaskResolver()
         if self.dry_run:
             LOG.warning("*** DRY RUN -- SIMULATION ONLY ***")
         if not tool_list:
@@ -320,12 +327,11 @@ class ReductionMonitor(ReductionWorkflow):
         self.tool_list = list(tool_list or [])
         self.error_occurred = False
 
-    def image_artifact_task(self, namespace):
-        if namespace not in self._gw_image_artifact_tasks:
-            idx = Taskcluster.get_service("index")
-            result = idx.findTask(namespace)
-            self._gw_image_artifact_tasks[namespace] = result["taskId"]
-        return self._gw_image_artifact_tasks[namespace]
+    def image_artifact_task(self, os_name: str) -> str | None:
+        """Find the task holding the generic-worker image for an OS, if any."""
+        if os_name not in GW_IMAGE_NAMESPACES:
+            return None
+        return self._gw_image_resolver.lookup(GW_IMAGE_NAMESPACES[os_name])
 
     def queue_reduction_task(
         self, os_name: str, crash: ReducibleCrash, no_repro_quality: int | None
@@ -345,16 +351,7 @@ class ReductionMonitor(ReductionWorkflow):
         my_task_id = os.environ.get("TASK_ID")
         task_id = slugId()
         now = datetime.now(timezone.utc)
-        if os_name == "windows":
-            image_task_id = self.image_artifact_task(
-                "project.fuzzing.orion.grizzly-win.master"
-            )
-        elif os_name == "macosx":
-            image_task_id = self.image_artifact_task(
-                "project.fuzzing.orion.grizzly-macos.master"
-            )
-        else:
-            image_task_id = None
+        image_task_id = self.image_artifact_task(os_name)
         task = yaml_load(
             REDUCE_TASKS[os_name].substitute(
                 crash_id=crash.id,
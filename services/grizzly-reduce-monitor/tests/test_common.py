@@ -0,0 +1,83 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+"""Tests for Grizzly reduction common definitions"""
+
+import json
+import os
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from dateutil.parser import isoparse
+from pytest_mock import MockerFixture
+
+from grizzly_reduce_monitor.common import IndexTaskResolver
+
+
+def test_index_task_resolver(mocker: MockerFixture, tmp_path: Path) -> None:
+    """namespaces are cached on disk until they expire"""
+    cache_path = tmp_path / "index-tasks.json"
+    taskcluster = mocker.patch("grizzly_reduce_monitor.common.Taskcluster")
+    index = taskcluster.get_service.return_value
+    now = datetime.now(timezone.utc)
+    expires = {
+        "ns.a": now + timedelta(days=30),
+        "ns.b": now + timedelta(minutes=5),
+    }
+    index.findTask.side_effect = lambda namespace: {
+        "namespace": namespace,
+        "taskId": f"task-{namespace}",
+        "expires": expires[namespace].isoformat(),
+    }
+
+    resolver = IndexTaskResolver(cache_path)
+    assert resolver.lookup("ns.a") == "task-ns.a"
+    assert resolver.lookup("ns.b") == "task-ns.b"
+    assert index.findTask.call_count == 2
+    cached = json.loads(cache_path.read_text())
+    assert set(cached) == {"ns.a", "ns.b"}
+    # expiry is capped by max_age
+    cached_a = isoparse(cached["ns.a"]["expires"])
+    assert cached_a <= now + resolver.max_age + timedelta(seconds=5)
+    assert isoparse(cached["ns.b"]["expires"]) <= expires["ns.b"]
+    # only the cache file is left
+    assert list(tmp_path.iterdir()) == [cache_path]
+
+    # memory cache
+    assert resolver.lookup("ns.a") == "task-ns.a"
+    assert index.findTask.call_count == 2
+
+    # disk cache, expired entries are looked up again
+    resolver = IndexTaskResolver(cache_path)
+    cached["ns.b"]["expires"] = (now - timedelta(minutes=1)).isoformat()
+    cache_path.write_text(json.dumps(cached))
+    assert resolver.lookup("ns.a") == "task-ns.a"
+    assert index.findTask.call_count == 2
+    assert resolver.lookup("ns.b") == "task-ns.b"
+    index.findTask.assert_called_with("ns.b")
+    assert index.findTask.call_count == 3
+
+    # invalid cache is ignored
+    resolver = IndexTaskResolver(cache_path)
+    cache_path.write_text("[]")
+    assert resolver.lookup("ns.a") == "task-ns.a"
+    assert index.findTask.call_count == 4
+
+
+def test_index_task_resolver_default_path(
+    mocker: MockerFixture, tmp_path: Path
+) -> None:
+    """the default cache path is found when the cache is used"""
+    mocker.patch.dict(os.environ, {"XDG_CACHE_HOME": str(tmp_path)})
+    os.environ.pop("ORION_INDEX_CACHE", None)
+    resolver = IndexTaskResolver()
+    assert resolver._cache_path() == (
+        tmp_path / "orion" / "grizzly-reduce-monitor" / "index-tasks.json"
+    )
+
+    # without a home directory, the cache is only kept in memory
+    del os.environ["XDG_CACHE_HOME"]
+    mocker.patch.object(Path, "home", side_effect=RuntimeError("no home"))
+    assert resolver._cache_path() is None
+    assert resolver._load_cache() == {}
+    resolver._save_cache({})
@@ -6,13 +6,12 @@
 import argparse
 import logging
 import sys
-from functools import wraps
 from os import getenv
 from pathlib import Path
 from shutil import rmtree
-from subprocess import PIPE, CalledProcessError
+from subprocess import PIPE, CalledProcessError, CompletedProcess
 from tempfile import mkdtemp
-from time import sleep
+from typing import Any
 
 import taskcluster
 from taskboot.config import Configuration
@@ -21,28 +20,12 @@ from taskboot.utils import download_artifact, load_artifacts
 from yaml import safe_load as yaml_load
 
 from .cli import CommonArgs, configure_logging
+from .retry import REGISTRY_RETRY, is_transient_registry_error
+from .retry import STATS as RETRY_STATS
 
 LOG = logging.getLogger(__name__)
 
 
-def retry_call(f, retries=5, initial_delay=5):
-    """Retry a call to subprocess.* which raises CalledProcessError."""
-
-    @wraps(f)
-    def wrapper(*args, **kwds):
-        delay = initial_delay
-        for _ in range(retries):
-            try:
-                return f(*args, **kwds)
-            except CalledProcessError:
-                LOG.warning("call failed: %s, retrying in %ds...", args, delay)
-                sleep(delay)
-                delay *= 2
-        return f(*args, **kwds)
-
-    return wrapper
-
-
 class PushArgs(CommonArgs):
     """CLI arguments for Orion pusher"""
 
@@ -96,6 +79,22 @@ class PushArgs(CommonArgs):
             self.parser.error("--service-name is required!")
 
 
+def _run_registry(tool: Podman, args: list[str], **kwds: Any) -> CompletedProcess[str]:
+    """Run a podman command which talks to the registry, retrying transient errors.
+
+    stderr is captured so registry errors can be classified as transient or not.
+    """
+    try:
+        return REGISTRY_RETRY.call(
+            lambda: tool.run(args, text=True, stderr=PIPE, **kwds),
+            f"podman {args[0]}",
+            is_transient_registry_error,
+        )
+    except CalledProcessError as exc:
+        LOG.error("podman %s returned error:\n%s", args[0], exc.stderr)
+        raise
+
+
 def main(argv: list[str] | None = None) -> None:
     """Push entrypoint. Does not return."""
     args = PushArgs.parse_args(argv)
@@ -209,13 +208,20 @@ def main(argv: list[str] | None = None) -> None:
             )
 
             # 4. Push the manifest (with images) to docker.io
-            retry_call(tool.login)(
-                config.docker["registry"],
-                config.docker["username"],
-                config.docker["password"],
+            _run_registry(
+                tool,
+                [
+                    "login",
+                    "--password-stdin",
+                    "-u",
+                    config.docker["username"],
+                    config.docker["registry"],
+                ],
+                input=config.docker["password"],
             )
 
-            push_result = retry_call(tool.run)(
+            push_result = _run_registry(
+                tool,
                 [
                     "manifest",
                     "push",
@@ -223,10 +229,10 @@ def main(argv: list[str] | None = None) -> None:
                     manifest_name,
                     f"docker://{manifest_name}",
                 ],
-                text=True,
                 stdout=PIPE,
             )
             LOG.info(f"Push manifest result: {push_result}")
         finally:
             rmtree(image_path)
+            RETRY_STATS.log_summary()
     sys.exit(0)
@@ -0,0 +1,77 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+"""Tests for registry retry policy"""
+
+from subprocess import CalledProcessError
+
+import pytest
+from pytest_mock import MockerFixture
+
+from orion_builder.retry import (
+    REGISTRY_RETRY,
+    RetryPolicy,
+    RetryStats,
+    is_transient_registry_error,
+)
+
+
+def test_retry_success(mocker: MockerFixture) -> None:
+    """test call is retried until it succeeds and stats are recorded"""
+    sleep = mocker.patch("orion_builder.retry.sleep", autospec=True)
+    error = CalledProcessError(125, ["podman"], stderr="connection reset by peer")
+    func = mocker.Mock(side_effect=[error, error, "result"])
+    stats = RetryStats()
+    policy = RetryPolicy(tries=5, initial_delay=1, jitter=0)
+    assert (
+        policy.call(func, "push", is_transient_registry_error, stats=stats) == "result"
+    )
+    assert func.call_count == 3
+    assert sleep.call_count == 2
+    assert stats.retries["push"] == 2
+    assert stats.time_lost["push"] == 3
+
+
+def test_retry_permanent(mocker: MockerFixture) -> None:
+    """test permanent registry errors are not retried"""
+    sleep = mocker.patch("orion_builder.retry.sleep", autospec=True)
+    func = mocker.Mock(
+        side_effect=CalledProcessError(
+            125, ["podman"], stderr=b"Error: unauthorized: authentication required"
+        )
+    )
+    with pytest.raises(CalledProcessError):
+        REGISTRY_RETRY.call(func, "login", is_transient_registry_error)
+    assert func.call_count == 1
+    assert sleep.call_count == 0
+
+
+def test_retry_deadline(mocker: MockerFixture) -> None:
+    """test retries stop when the deadline would be exceeded"""
+    sleep = mocker.patch("orion_builder.retry.sleep", autospec=True)
+    mocker.patch("orion_builder.retry.monotonic", side_effect=[0, 0, 3, 10])
+    func = mocker.Mock(side_effect=CalledProcessError(1, ["podman"]))
+    policy = RetryPolicy(tries=10, initial_delay=2, jitter=0, deadline=10)
+    with pytest.raises(CalledProcessError):
+        policy.call(func, "push", is_transient_registry_error, stats=RetryStats())
+    # 0 + 2 <= 10: retry, 3 + 4 <= 10: retry, 10 + 8 > 10: give up
+    assert func.call_count == 3
+    assert sleep.call_count == 2
+
+
+@pytest.mark.parametrize(
+    "stderr, transient",
+    [
+        ("Error: writing blob: connection reset by peer", True),
+        ("Error: received unexpected HTTP status: 502 Bad Gateway", True),
+        ("Error: unauthorized: incorrect username or password", False),
+        (b"Error: requested access to the resource is denied", False),
+        ("Error: manifest unknown", False),
+        (None, True),
+    ],
+)
+def test_registry_error_class(stderr: str | bytes | None, transient: bool) -> None:
+    """test registry errors are classified"""
+    exc = CalledProcessError(125, ["podman", "push"], stderr=stderr)
+    assert is_transient_registry_error(exc) == transient
+    assert not is_transient_registry_error(FileNotFoundError())
@@ -6,9 +6,15 @@
 from __future__ import annotations
 
 from argparse import Namespace
+from collections.abc import Callable, Iterable
+from concurrent.futures import ProcessPoolExecutor
 from itertools import chain
+from json import dumps as json_dumps
+from json import loads as json_loads
 from logging import getLogger
 from pathlib import Path
+from time import perf_counter
+from typing import Any
 
 from jsone import render as jsone_render
 from taskcluster.utils import slugId
@@ -22,98 +28,180 @@ LOG = getLogger(__name__)
 EVENTS_PATH = Path(__file__).parent / "github_test_events"
 
 
+def _render_matrices(
+    path: str, template: dict[str, Any], event_name: str, event_data: dict[str, Any]
+) -> list[tuple[str, str | None, str]]:
+    """Render .taskcluster.yml for a test event, and find CI matrices in the result.
+
+    Errors are re-raised with the file and event name, since the traceback is
+    lost when rendering in a worker process.
+
+    Arguments:
+        path: The .taskcluster.yml path (for errors).
+        template: The parsed .taskcluster.yml.
+        event_name: Name of the test event (for errors).
+        event_data: Test event (action & event) to render with.
+
+    Returns:
+        Serialized matrix, branch and event type for each CIMatrix to check.
+    """
+    try:
+        return _find_matrices(template, event_data)
+    except Exception as exc:
+        raise RuntimeError(
+            f"Error rendering {path} for event {event_name}: {exc!r}"
+        ) from exc
+
+
+def _find_matrices(
+    template: dict[str, Any], event_data: dict[str, Any]
+) -> list[tuple[str, str | None, str]]:
+    result: list[tuple[str, str | None, str]] = []
+    rendered_taskcluster_yml = jsone_render(
+        template,
+        context={
+            "taskcluster_root_url": "https://tc.mozilla.com",
+            "tasks_for": event_data["action"],
+            "as_slugid": slugId,
+            "event": event_data["event"],
+        },
+    )
+
+    # for each resulting task
+    for task in rendered_taskcluster_yml.get("tasks", []):
+        # skip malformed tasks ...
+        # taskcluster_yml_validator will catch it
+        if "payload" not in task:
+            LOG.warning("no payload")
+            continue
+
+        if set(task["payload"]) >= {"command", "image"}:
+            # docker-worker payload
+            # does it use orion-decision image and call ci-decision?
+            cmd = yaml_dump(task["payload"]["command"])
+            if (
+                "orion-decision" not in yaml_dump(task["payload"]["image"])
+                or "ci-decision" not in cmd
+            ):
+                LOG.warning(
+                    "no orion-decision in payload image or ci-decision not in command"
+                )
+                continue
+
+        elif "command" in task["payload"]:
+            cmd = yaml_dump(task["payload"]["command"])
+            if not (
+                any(
+                    "podman" in cmd
+                    for cmd in chain.from_iterable(task["payload"]["command"])
+                )
+                and any(
+                    "orion-decision" in cmd
+                    for cmd in chain.from_iterable(task["payload"]["command"])
+                )
+                and any(
+                    "ci-decision" in cmd
+                    for cmd in chain.from_iterable(task["payload"]["command"])
+                )
+            ):
+                LOG.warning("generic-worker payload not using podman & orion-decision?")
+                continue
+        else:
+            LOG.warning("unrecognized worker payload")
+            continue
+
+        # does that job have a CI_MATRIX env var or pass --matrix? (fail if not)
+        if "--matrix" in cmd:
+            raise NotImplementedError(
+                "checking --matrix isn't supported yet, use CI_MATRIX"
+            )
+        assert "CI_MATRIX" in task["payload"].get("env", {}), (
+            "CI_MATRIX is missing (required by ci-decision)"
+        )
+        matrix = yaml_load(task["payload"]["env"]["CI_MATRIX"])
+
+        # get all `branch:` references
+        branches = {None}
+        if "jobs" in matrix and "include" in matrix["jobs"]:
+            for include in matrix["jobs"]["include"]:
+                if "on" in include and "branch" in include["on"]:
+                    branches.add(include["on"]["branch"])
+
+        # check CIMatrix for each branch (and no branch)
+        event_type = GIT_EVENT_TYPES[event_data["action"]]
+        matrix_ser = json_dumps(matrix, sort_keys=True)
+        result.extend((matrix_ser, branch, event_type) for branch in branches)
+    return result
+
+
+def _transpose(rows: list[tuple[Any, ...]], width: int) -> list[list[Any]]:
+    """Transpose rows into argument lists for `map()`, which needs at least one
+    argument list even if there are no rows."""
+    return [[row[idx] for row in rows] for idx in range(width)]
+
+
+def _check_matrix(matrix_ser: str, branch: str | None, event_type: str) -> None:
+    CIMatrix(json_loads(matrix_ser), branch, event_type)
+
+
 def check_matrix(args: Namespace) -> None:
     """Check whether the CI matrix found in .taskcluster.yml can be loaded.
 
+    Each .taskcluster.yml is rendered for every test event, and each unique
+    matrix/branch/event combination is loaded. Work is done in parallel
+    using `args.jobs` processes.
+
     Raises if any error is found.
 
     Arguments:
         args: Arguments as returned by `parse_ci_check_args()`
     """
+    start = perf_counter()
+    templates = []
     for changed in args.changed:
         # is it a taskcluster.yml?
         if changed.name != ".taskcluster.yml":
             LOG.warning("Skipping unknown file: %s", changed)
             continue
-
-        # use test data to render it
-        for event in EVENTS_PATH.glob("*.yaml"):
-            event_data = yaml_load(event.read_text())
-            rendered_taskcluster_yml = jsone_render(
-                yaml_load(changed.read_text()),
-                context={
-                    "taskcluster_root_url": "https://tc.mozilla.com",
-                    "tasks_for": event_data["action"],
-                    "as_slugid": slugId,
-                    "event": event_data["event"],
-                },
-            )
-
-            # for each resulting task
-            for task in rendered_taskcluster_yml.get("tasks", []):
-                # skip malformed tasks ...
-                # taskcluster_yml_validator will catch it
-                if "payload" not in task:
-                    LOG.warning("no payload")
-                    continue
-
-                if set(task["payload"]) >= {"command", "image"}:
-                    # docker-worker payload
-                    # does it use orion-decision image and call ci-decision?
-                    cmd = yaml_dump(task["payload"]["command"])
-                    if (
-                        "orion-decision" not in yaml_dump(task["payload"]["image"])
-                        or "ci-decision" not in cmd
-                    ):
-                        LOG.warning(
-                            "no orion-decision in payload image or "
-                            "ci-decision not in command"
-                        )
-                        continue
-
-                elif "command" in task["payload"]:
-                    cmd = yaml_dump(task["payload"]["command"])
-                    if not (
-                        any(
-                            "podman" in cmd
-                            for cmd in chain.from_iterable(task["payload"]["command"])
-                        )
-                        and any(
-                            "orion-decision" in cmd
-                            for cmd in chain.from_iterable(task["payload"]["command"])
-                        )
-                        and any(
-                            "ci-decision" in cmd
-                            for cmd in chain.from_iterable(task["payload"]["command"])
-                        )
-                    ):
-                        LOG.warning(
-                            "generic-worker payload not using podman & orion-decision?"
-                        )
-                        continue
-                else:
-                    LOG.warning("unrecognized worker payload")
-                    continue
-
-                # does that job have a CI_MATRIX env var or pass --matrix? (fail if not)
-                if "--matrix" in cmd:
-                    raise NotImplementedError(
-                        "checking --matrix isn't supported yet, use CI_MATRIX"
-                    )
-                assert "CI_MATRIX" in task["payload"].get("env", {}), (
-                    "CI_MATRIX is missing (required by ci-decision)"
-                )
-                matrix = yaml_load(task["payload"]["env"]["CI_MATRIX"])
-
-                # get all `branch:` references
-                branches = {None}
-                if "jobs" in matrix and "include" in matrix["jobs"]:
-                    for include in matrix["jobs"]["include"]:
-                        if "on" in include and "branch" in include["on"]:
-                            branches.add(include["on"]["branch"])
-
-                # create CIMatrix for each branch and is_release=True
-                event_type = GIT_EVENT_TYPES[event_data["action"]]
-                for branch in branches:
-                    CIMatrix(matrix, branch, event_type)
-                CIMatrix(matrix, None, event_type)
+        templates.append((str(changed), yaml_load(changed.read_text())))
+    if not templates:
+        return
+    events = [
+        (event.stem, yaml_load(event.read_text()))
+        for event in sorted(EVENTS_PATH.glob("*.yaml"))
+    ]
+    parsed = perf_counter()
+
+    pool = None
+    mapper: Callable[..., Iterable[Any]] = map
+    if args.jobs != 1:
+        pool = ProcessPoolExecutor(max_workers=args.jobs)
+        mapper = pool.map
+    try:
+        # use test data to render each template
+        renders = [tmpl + event for tmpl in templates for event in events]
+        to_check: list[tuple[str, str | None, str]] = []
+        for result in mapper(_render_matrices, *_transpose(renders, 4)):
+            to_check.extend(result)
+        rendered = perf_counter()
+
+        # identical matrices only need to be checked once
+        unique = sorted(set(to_check), key=lambda item: (item[0], str(item[1:])))
+        for _ in mapper(_check_matrix, *_transpose(unique, 3)):
+            pass
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    checked = perf_counter()
+
+    LOG.info(
+        "Parsed %d file(s) in %.2fs, rendered %d event(s) in %.2fs, "
+        "checked %d unique matrices (of %d) in %.2fs",
+        len(templates),
+        parsed - start,
+        len(renders),
+        rendered - parsed,
+        len(unique),
+        len(to_check),
+        checked - rendered,
+    )
@@ -6,7 +6,10 @@
 from __future__ import annotations
 
 from abc import ABC, abstractmethod
-from collections.abc import Iterator
+from collections.abc import Callable, Iterator
+from functools import cache
+from graphlib import CycleError, TopologicalSorter
+from hashlib import sha256
 from itertools import product
 from json import dumps as json_dumps
 from json import loads as json_loads
@@ -14,7 +17,8 @@ from logging import getLogger
 from pathlib import Path
 from typing import Any
 
-from jsonschema import validate
+from jsonschema.exceptions import best_match
+from jsonschema.validators import validator_for
 from referencing import Registry, Resource
 from yaml import safe_load as yaml_load
 
@@ -48,6 +52,10 @@ IMAGES = {
     ("python", "macos", "3.13"): "ci-py-313-osx",
 }
 LOG = getLogger(__name__)
+SHARD_INDEX_VAR = "CI_SHARD_INDEX"
+SHARD_TOTAL_VAR = "CI_SHARD_TOTAL"
+# hashable identity of a job, see `MatrixJob.key`
+JobKey = tuple[str, str, str, frozenset[tuple[str, str]], tuple[str, ...]]
 
 
 def _load_schema_cache() -> Registry:
@@ -63,17 +71,32 @@ def _load_schema_cache() -> Registry:
 SCHEMA_CACHE = _load_schema_cache()
 
 
+SCHEMAS_BY_NAME = {
+    SCHEMA_CACHE[uri].contents["title"]: SCHEMA_CACHE[uri].contents
+    for uri in SCHEMA_CACHE
+}
+
+
 def _schema_by_name(name: str):
-    for uri in SCHEMA_CACHE:
-        schema = SCHEMA_CACHE[uri]
-        if schema.contents["title"] == name:
-            return schema.contents
-    raise RuntimeError(f"Unknown schema name: {name}")  # pragma: no cover
+    try:
+        return SCHEMAS_BY_NAME[name]
+    except KeyError:  # pragma: no cover
+        raise RuntimeError(f"Unknown schema name: {name}") from None
 
 
-def _validate_schema_by_name(instance: dict[str, str] | str, name: str):
+@cache
+def _validator_by_name(name: str):
     schema = _schema_by_name(name)
-    return validate(instance=instance, schema=schema, registry=SCHEMA_CACHE)
+    cls = validator_for(schema)
+    cls.check_schema(schema)
+    return cls(schema, registry=SCHEMA_CACHE)
+
+
+def _validate_schema_by_name(instance: dict[str, str] | str, name: str):
+    # equivalent to `jsonschema.validate()`, but reusing the validator
+    error = best_match(_validator_by_name(name).iter_errors(instance))
+    if error is not None:
+        raise error
 
 
 class MatrixJob:
@@ -83,6 +106,8 @@ class MatrixJob:
         env): Environment variables to set for `script`.
         language: The programming language under test (must be in `LANGUAGES`)
         name: The name for this job
+        needs: Names of jobs which must pass before this job is run. If empty,
+               this job depends on all jobs in the previous stage.
         platform: The operating system to run test (must be in `PLATFORMS`)
         require_previous_stage_pass: This job should only run after all jobs
                                      with a lower `stage` have succeeded.
@@ -93,13 +118,16 @@ class MatrixJob:
         version: Version number of `language` to run (must be in
                  `VERSIONS[(language, platform)]`)
         artifacts: Artifact files/directories defined for this job.
+        caches: Directories to cache between runs of this job.
     """
 
     __slots__ = (
         "artifacts",
+        "caches",
         "env",
         "language",
         "name",
+        "needs",
         "platform",
         "require_previous_stage_pass",
         "script",
@@ -148,6 +176,8 @@ class MatrixJob:
         self.require_previous_stage_pass = previous_pass
         self.secrets: list[CISecret] = []
         self.artifacts: list[CIArtifact] = []
+        self.caches: list[CICache] = []
+        self.needs: list[str] = []
 
     @property
     def image(self) -> str:
@@ -158,6 +188,61 @@ class MatrixJob:
         """
         return IMAGES[(self.language, self.platform, self.version)]
 
+    @property
+    def key(self) -> JobKey:
+        """Get a hashable key for what this job runs.
+
+        Returns:
+            `language`, `version`, `platform`, `env` and `script` of this job.
+        """
+        return (
+            self.language,
+            self.version,
+            self.platform,
+            frozenset(self.env.items()),
+            tuple(self.script),
+        )
+
+    def shard(self, total: int) -> list[MatrixJob]:
+        """Split this job into parallel jobs.
+
+        Each shard is a copy of this job, with `SHARD_INDEX_VAR` (0 to `total` - 1)
+        and `SHARD_TOTAL_VAR` added to `env`.
+
+        Arguments:
+            total: Number of shards to create.
+
+        Returns:
+            Shard jobs (or `[self]` if `total` is 1).
+        """
+        assert total >= 1, "`shards` must be a positive integer"
+        if total == 1:
+            return [self]
+        assert SHARD_INDEX_VAR not in self.env and SHARD_TOTAL_VAR not in self.env, (
+            f"`env` must not set {SHARD_INDEX_VAR}/{SHARD_TOTAL_VAR} in a sharded job"
+        )
+        result = []
+        for index in range(total):
+            env = self.env.copy()
+            env[SHARD_INDEX_VAR] = str(index)
+            env[SHARD_TOTAL_VAR] = str(total)
+            job = MatrixJob(
+                f"{self.name} (shard {index + 1}/{total})",
+                self.language,
+                self.version,
+                self.platform,
+                env,
+                self.script.copy(),
+                stage=self.stage,
+                previous_pass=self.require_previous_stage_pass,
+            )
+            job.secrets.extend(self.secrets)
+            job.artifacts.extend(self.artifacts)
+            job.caches.extend(self.caches)
+            job.needs.extend(self.needs)
+            result.append(job)
+        return result
+
     def check(self) -> None:
         """Assert that all attributes are valid."""
         assert isinstance(self.name, str), "`name` must be a string"
@@ -209,6 +294,10 @@ class MatrixJob:
         assert len(self.artifacts) == len({a.url for a in self.artifacts}), (
             "`url` for all artifacts must be unique"
         )
+        assert len(self.caches) == len({c.path for c in self.caches}), (
+            "`path` for all caches must be unique"
+        )
+        assert self.name not in self.needs, "job must not need itself"
 
     @classmethod
     def from_json(cls, data: str) -> MatrixJob:
@@ -240,6 +329,10 @@ class MatrixJob:
         result.artifacts.extend(
             CIArtifact.from_json(artifact) for artifact in obj.get("artifacts", [])
         )
+        result.caches.extend(
+            CICache.from_json(cache) for cache in obj.get("caches", [])
+        )
+        result.needs.extend(obj.get("needs", []))
         result.check()
         return result
 
@@ -255,6 +348,11 @@ class MatrixJob:
                     return False
                 if not all(art in other.artifacts for art in self.artifacts):
                     return False
+            if attr == "caches":
+                if len(self.caches) != len(other.caches):
+                    return False
+                if not all(cache in other.caches for cache in self.caches):
+                    return False
             if getattr(self, attr) != getattr(other, attr):
                 return False
         return True
@@ -271,6 +369,7 @@ class MatrixJob:
         obj = {attr: getattr(self, attr) for attr in self.__slots__}
         obj["secrets"] = [secret.serialize() for secret in self.secrets]
         obj["artifacts"] = [art.serialize() for art in self.artifacts]
+        obj["caches"] = [cache.serialize() for cache in self.caches]
         return obj
 
     def matches(
@@ -295,28 +394,50 @@ class MatrixJob:
         Returns:
             True if self matches the given arguments.
         """
+        return self.matcher(language, version, platform, env, script)(self)
 
-        if language is not None and self.language != language:
-            return False
-
-        if version is not None and self.version != version:
-            return False
+    @staticmethod
+    def matcher(
+        language: str | None = None,
+        version: str | None = None,
+        platform: str | None = None,
+        env: dict[str, str] | None = None,
+        script: list[str] | None = None,
+    ) -> Callable[[MatrixJob], bool]:
+        """Create a predicate to check if a job matches all given arguments.
 
-        if platform is not None and self.platform != platform:
-            return False
+        This is equivalent to `matches()`, but can be reused for many jobs.
 
-        if script is not None and self.script != script:
-            return False
+        Arguments:
+            language: If not None, check for match on `language` attribute.
+            version: If not None, check for match on `version` attribute.
+            platform: If not None, check for match on `platform` attribute.
+            env: If not None, check that all given `env` values match the job.
+                 The job `env` may have other keys, only the keys passed in
+                 `env` are checked.
+            script: If not None, check for match on `script` attribute.
 
-        if env is not None:
-            for var, value in env.items():
-                if var not in self.env:
-                    return False
+        Returns:
+            Function returning True if a job matches the given arguments.
+        """
+        fields = tuple(
+            (attr, value)
+            for attr, value in (
+                ("language", language),
+                ("version", version),
+                ("platform", platform),
+                ("script", script),
+            )
+            if value is not None
+        )
+        env_items = None if env is None else env.items()
 
-                if self.env[var] != value:
-                    return False
+        def _matches(job: MatrixJob) -> bool:
+            if any(getattr(job, attr) != value for attr, value in fields):
+                return False
+            return env_items is None or env_items <= job.env.items()
 
-        return True
+        return _matches
 
 
 class CIArtifact:
@@ -372,6 +493,76 @@ class CIArtifact:
         }
 
 
+class CICache:
+    """Representation of a directory cached between CI jobs by the worker.
+
+    Attributes:
+        path: Path in the job environment.
+        key: Files in the repository which determine the cache contents.
+    """
+
+    __slots__ = ("key", "path")
+
+    def __init__(self, path: str, key: list[str] | None = None) -> None:
+        """Initialize CICache object.
+
+        Arguments:
+            path: Path in the job environment.
+            key: Files in the repository which determine the cache contents.
+        """
+        self.path = path
+        self.key = key or []
+
+    def __str__(self) -> str:
+        return json_dumps(self.serialize())
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, CICache):
+            return False
+        return self.path == other.path and self.key == other.key
+
+    def name(self, prefix: str, image: str, root: Path | None) -> str:
+        """Get the worker cache name for this cache.
+
+        The name depends on `image`, `path`, and the contents of the `key` files, so
+        the cache is invalidated whenever any of these change.
+
+        Arguments:
+            prefix: Cache name prefix (eg. identifying the repository).
+            image: Image the job runs in.
+            root: Repository checkout to read `key` files from.
+
+        Returns:
+            Cache name.
+        """
+        digest = sha256(f"{image}\0{self.path}".encode())
+        for key in self.key:
+            digest.update(f"\0{key}\0".encode())
+            if root is not None and (root / key).is_file():
+                digest.update((root / key).read_bytes())
+        return f"{prefix}-{digest.hexdigest()[:16]}"
+
+    @classmethod
+    def from_json(cls, data: dict[str, Any]) -> CICache:
+        """Deserialize and create a CICache from JSON.
+
+        Arguments:
+            data: JSON serialized CICache.
+
+        Returns:
+            CICache: Cache object.
+        """
+        _validate_schema_by_name(instance=data, name="CICache")
+        return cls(data["path"], data.get("key"))
+
+    def serialize(self) -> dict[str, Any]:
+        """Return a JSON serializable copy of self."""
+        return {
+            "key": self.key,
+            "path": self.path,
+        }
+
+
 class CISecret(ABC):
     """Representation of a Taskcluster secret used by CI jobs.
 
@@ -565,12 +756,16 @@ class CISecretFile(CISecret):
             "mask": f"{self.mask:o}" if self.mask is not None else None,
         }
 
-    def write(self) -> None:
+    def write(self, data: Any = None) -> None:
         """Write the secret to disk.
 
         If the secret contains a complex type (list/dict), it will be JSON serialized.
+
+        Arguments:
+            data: Value of the secret, if already fetched by `get_secret_data()`.
         """
-        data = self.get_secret_data()
+        if data is None:
+            data = self.get_secret_data()
         if not isinstance(data, str):
             data = json_dumps(data)
         dest = Path(self.path)
@@ -618,12 +813,15 @@ class CISecretKey(CISecret):
             "hostname": self.hostname,
         }
 
-    def write(self) -> None:
+    def write(self, key: Any = None) -> None:
         """Write the key to `~/.ssh`.
 
         The key is created as `~/.ssh/id_rsa`, unless `hostname` is set, then
         `~/.ssh/id_rsa.{hostname}` is used. In that case the `hostname` alias to
         `github.com` is also created in `~/.ssh/config`.
+
+        Arguments:
+            key: Value of the secret, if already fetched by `get_secret_data()`.
         """
         (Path.home() / ".ssh").mkdir(exist_ok=True)
         if self.hostname is not None:
@@ -634,7 +832,8 @@ class CISecretKey(CISecret):
                 print(f"IdentityFile ~/.ssh/id_rsa.{self.hostname}", file=cfg)
         else:
             dest = Path.home() / ".ssh" / "id_rsa"
-        key = self.get_secret_data()
+        if key is None:
+            key = self.get_secret_data()
         assert isinstance(key, str), f"key has type {type(key).__name__}, expected str"
         with dest.open("w", newline="\n") as fp:
             fp.write(key)
@@ -649,18 +848,30 @@ class CIMatrix:
     *NB* despite being superficially very similar to Travis syntax,
          the semantics are different!
 
-    Matrix expansion has 3 steps:
+    Matrix expansion has 4 steps:
      - cartesian product of language/version/platform/env/script
      - exclude jobs using jobs.exclude
      - include jobs using jobs.include
+     - split jobs into shards
 
      Attributes:
         jobs: CI jobs to run.
         secrets: Secrets to be fetched when each job is run.
         artifacts: Artifact files/directories defined for all jobs.
+        caches: Directories to cache between runs of all jobs.
+        fail_fast: Cancel other jobs when any job fails.
+        reuse_results: Jobs which already passed for the same source tree
+                       don't need to be run again.
     """
 
-    __slots__ = ("artifacts", "jobs", "secrets")
+    __slots__ = (
+        "artifacts",
+        "caches",
+        "fail_fast",
+        "jobs",
+        "reuse_results",
+        "secrets",
+    )
 
     def __init__(
         self,
@@ -679,6 +890,9 @@ class CIMatrix:
         self.jobs: list[MatrixJob] = []
         self.secrets: list[CISecret] = []
         self.artifacts: list[CIArtifact] = []
+        self.caches: list[CICache] = []
+        self.fail_fast = False
+        self.reuse_results = False
         self._parse_matrix(matrix, branch, event_type)
 
     def _parse_matrix(
@@ -735,6 +949,11 @@ class CIMatrix:
                     specified_scripts.append(script.copy())
             given.add("script")
 
+        # number of shards for each job, by `job.key`
+        shards: dict[JobKey, int] = {}
+        if "shards" in matrix:
+            given.add("shards")
+
         # cartesian product of everything specified so far
         if default_language is not None and specified_versions and specified_scripts:
             for platform, version, env, script in product(
@@ -752,6 +971,9 @@ class CIMatrix:
                 )
             LOG.debug("product created %d jobs", len(self.jobs))
             used |= {"language", "version", "platform", "script", env_name}
+            if "shards" in matrix:
+                shards.update((job.key, matrix["shards"]) for job in self.jobs)
+                used.add("shards")
 
         if "secrets" in matrix:
             self.secrets.extend(self._parse_secrets(matrix["secrets"]))
@@ -759,15 +981,34 @@ class CIMatrix:
         if "artifacts" in matrix:
             self.artifacts.extend(self._parse_artifacts(matrix["artifacts"]))
 
+        if "cache" in matrix:
+            self.caches.extend(CICache.from_json(data) for data in matrix["cache"])
+
+        self.fail_fast = matrix.get("fail_fast", False)
+        self.reuse_results = matrix.get("reuse_results", False)
+
         if "jobs" in matrix:
             # exclude jobs
             if "exclude" in matrix["jobs"]:
-                for exclude in matrix["jobs"]["exclude"]:
-                    self.jobs = [job for job in self.jobs if not job.matches(**exclude)]
-                    LOG.debug("%d jobs after exclude", len(self.jobs))
+                excludes = [
+                    MatrixJob.matcher(**exclude)
+                    for exclude in matrix["jobs"]["exclude"]
+                ]
+                self.jobs = [
+                    job
+                    for job in self.jobs
+                    if not any(exclude(job) for exclude in excludes)
+                ]
+                LOG.debug("%d jobs after exclude", len(self.jobs))
 
             # include jobs
             if "include" in matrix["jobs"]:
+                # index existing jobs by key, excluding `env` (which is matched
+                # as a subset of the existing job `env`)
+                job_index: dict[tuple[Any, ...], list[MatrixJob]] = {}
+                for job in self.jobs:
+                    job_key = job.key
+                    job_index.setdefault(job_key[:3] + job_key[4:], []).append(job)
                 for idx, include in enumerate(matrix["jobs"]["include"]):
                     name = include.get("name")
 
@@ -823,16 +1064,12 @@ class CIMatrix:
                         env,
                         script,
                     )
+                    job_key = job.key
+                    same_key = job_index.setdefault(job_key[:3] + job_key[4:], [])
                     assert not any(
-                        exist.matches(
-                            language=job.language,
-                            version=job.version,
-                            platform=job.platform,
-                            env=job.env,
-                            script=job.script,
-                        )
-                        for exist in self.jobs
+                        job.env.items() <= exist.env.items() for exist in same_key
                     ), f"included job #{idx} already exists"
+                    same_key.append(job)
 
                     if "secrets" in include:
                         job.secrets.extend(self._parse_secrets(include["secrets"]))
@@ -842,12 +1079,51 @@ class CIMatrix:
                             self._parse_artifacts(include["artifacts"])
                         )
 
+                    if "cache" in include:
+                        job.caches.extend(
+                            CICache.from_json(data) for data in include["cache"]
+                        )
+
+                    if "needs" in include:
+                        assert include.get("when", {}).get("all_passed") is None, (
+                            "`needs` can't be used with `when.all_passed`"
+                        )
+                        job.needs.extend(include["needs"])
+                        job.require_previous_stage_pass = True
+
                     if include.get("when", {}).get("all_passed") is not None:
                         job.stage = 2
                         job.require_previous_stage_pass = include["when"]["all_passed"]
 
+                    # always set, since an excluded job may have had the same key
+                    shards[job.key] = include.get("shards", 1)
+
                     self.jobs.append(job)
 
+        # split jobs into shards. this is done last so exclude/include match
+        # the unsharded jobs
+        if any(total > 1 for total in shards.values()):
+            sharded = []
+            # names of the shards created from each job name
+            shard_names: dict[str, list[str]] = {}
+            for job in self.jobs:
+                job_shards = job.shard(shards.get(job.key, 1))
+                shard_names.setdefault(job.name, []).extend(
+                    shard.name for shard in job_shards
+                )
+                sharded.extend(job_shards)
+            self.jobs = sharded
+            LOG.debug("%d jobs after sharding", len(self.jobs))
+            # `needs` refers to all shards of a job
+            for job in self.jobs:
+                job.needs = list(
+                    dict.fromkeys(
+                        name
+                        for need in job.needs
+                        for name in shard_names.get(need, [need])
+                    )
+                )
+
         # check for any unused matrix values and print a warning
         unused = given - used
         if unused:
@@ -872,8 +1148,16 @@ class CIMatrix:
             "`url` for all artifacts must be unique"
         )
 
+        cache_paths = {c.path for c in self.caches}
+        assert len(self.caches) == len(cache_paths), (
+            "`path` for all caches must be unique"
+        )
+
         for job in self.jobs:
             job.check()
+            assert not any(cache_paths & {c.path for c in job.caches}), (
+                "job cache path redefines matrix cache"
+            )
             assert not any(artifact_srcs & {a.src for a in job.artifacts}), (
                 "job artifact src redefines matrix artifact"
             )
@@ -881,6 +1165,9 @@ class CIMatrix:
                 "job artifact url redefines matrix artifact"
             )
 
+        # check that `needs` are valid and acyclic
+        job_dependencies(self.jobs)
+
     def _parse_secrets(self, secrets: str) -> Iterator[CISecret]:
         for secret in secrets:
             result = CISecret.from_json(secret)
@@ -892,6 +1179,45 @@ class CIMatrix:
             yield CIArtifact.from_json(data)
 
 
+def job_dependencies(jobs: list[MatrixJob]) -> list[list[int]]:
+    """Find the jobs which each job depends on.
+
+    Jobs with `needs` depend on all jobs with the given names. Other jobs depend on
+    all jobs in the previous stage.
+
+    Arguments:
+        jobs: All jobs in the matrix.
+
+    Returns:
+        Indexes in `jobs` which must be resolved before each job, in the same
+        order as `jobs`.
+    """
+    by_name: dict[str, list[int]] = {}
+    by_stage: dict[int, list[int]] = {}
+    for idx, job in enumerate(jobs):
+        by_name.setdefault(job.name, []).append(idx)
+        by_stage.setdefault(job.stage, []).append(idx)
+    stages = sorted(by_stage)
+    prev_stage = dict(zip(stages[1:], (by_stage[stage] for stage in stages)))
+    result: list[list[int]] = []
+    for job in jobs:
+        if job.needs:
+            deps = []
+            for name in job.needs:
+                assert name in by_name, f"job '{job.name}' needs unknown job '{name}'"
+                deps.extend(by_name[name])
+            result.append(deps)
+        else:
+            result.append(prev_stage.get(job.stage, []))
+    try:
+        TopologicalSorter(dict(enumerate(result))).prepare()
+    except CycleError:
+        raise AssertionError(
+            "job dependencies (`needs`/`stage`) contain a cycle"
+        ) from None
+    return result
+
+
 def _validate_globals() -> None:
     # validate VERSIONS
     valid_image_keys: list[tuple[str, str, str]] = []
@@ -6,7 +6,10 @@
 from __future__ import annotations
 
 from argparse import Namespace
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
+from graphlib import TopologicalSorter
+from hashlib import sha256
 from itertools import chain
 from json import dumps as json_dump
 from logging import getLogger
@@ -15,7 +18,7 @@ from pathlib import Path
 from string import Template
 from typing import Any
 
-from taskcluster.exceptions import TaskclusterFailure
+from taskcluster.exceptions import TaskclusterFailure, TaskclusterRestFailure
 from taskcluster.utils import slugId, stringDate
 from yaml import safe_load as yaml_load
 
@@ -29,8 +32,9 @@ from . import (
     WORKER_TYPE_MSYS,
     Taskcluster,
 )
-from .ci_matrix import CIMatrix, CISecretKey
+from .ci_matrix import CIMatrix, CISecretKey, MatrixJob, job_dependencies
 from .git import GithubEvent
+from .retry import STATS as RETRY_STATS
 
 LOG = getLogger(__name__)
 TEMPLATE_PATH = (Path(__file__).parent / "task_templates").resolve()
@@ -42,6 +46,73 @@ WORKER_TYPES = {}
 WORKER_TYPES["linux"] = WORKER_TYPE
 WORKER_TYPES["windows"] = WORKER_TYPE_MSYS
 WORKER_TYPES["macos"] = WORKER_TYPE_BREW
+# maximum number of concurrent requests to the Taskcluster API
+MAX_CONCURRENT_REQUESTS = 16
+# index namespace where passing CI jobs are recorded
+RESULT_INDEX = "project.fuzzing.orion.ci-result"
+
+
+def _has_skip_command(commit_message: str) -> bool:
+    return "[skip ci]" in commit_message or "[skip tc]" in commit_message
+
+
+def _has_full_command(commit_message: str) -> bool:
+    return "[full ci]" in commit_message
+
+
+def cancel_sibling_jobs(task_id: str, job: MatrixJob) -> int:
+    """Cancel CI tasks made redundant by the failure of a job (fail-fast).
+
+    Unresolved CI tasks in the same task group are cancelled, except those in later
+    stages which run whether or not previous stages passed.
+
+    Arguments:
+        task_id: Task ID of the failed job.
+        job: The failed job.
+
+    Returns:
+        Number of tasks cancelled.
+    """
+    queue = Taskcluster.get_service("queue")
+    task_group = queue.task(task_id)["taskGroupId"]
+    to_cancel = []
+    result = queue.listTaskGroup(task_group)
+    while True:
+        for entry in result["tasks"]:
+            if entry["status"]["taskId"] == task_id:
+                continue
+            if entry["status"]["state"] not in {"unscheduled", "pending", "running"}:
+                continue
+            ci_job = entry["task"]["payload"].get("env", {}).get("CI_JOB")
+            if ci_job is None:
+                # not a CI job (eg. decision task)
+                continue
+            other = MatrixJob.from_json(ci_job)
+            if other.stage > job.stage and not other.require_previous_stage_pass:
+                continue
+            to_cancel.append(entry["status"]["taskId"])
+        if not result.get("continuationToken"):
+            break
+        result = queue.listTaskGroup(
+            task_group, query={"continuationToken": result["continuationToken"]}
+        )
+
+    def _cancel(other_id: str) -> bool:
+        try:
+            queue.cancelTask(other_id)
+        except TaskclusterFailure as exc:
+            # the task may have resolved in the meantime
+            LOG.warning("Error cancelling task %s: %s", other_id, exc)
+            return False
+        return True
+
+    if not to_cancel:
+        return 0
+    LOG.info("fail-fast: cancelling %d tasks", len(to_cancel))
+    with ThreadPoolExecutor(
+        max_workers=min(len(to_cancel), MAX_CONCURRENT_REQUESTS)
+    ) as executor:
+        return sum(executor.map(_cancel, to_cancel))
 
 
 class CIScheduler:
@@ -56,6 +127,11 @@ class CIScheduler:
         dry_run: Calculate what should be created, but don't actually
                  create tasks in Taskcluster.
         matrix: CI job matrix
+        image_tasks: Task IDs of indexed MSYS/Homebrew images, by image name.
+        result_indexes: Index paths to record passing jobs in, by position in
+                        `matrix.jobs`.
+        reused_results: Task IDs of previous passing runs, by position in
+                        `matrix.jobs`.
     """
 
     def __init__(
@@ -90,143 +166,339 @@ class CIScheduler:
             github_event.branch,
             github_event.event_type,
         )
+        self.image_tasks: dict[str, str] = {}
+        self.result_indexes: dict[int, str] = {}
+        self.reused_results: dict[int, str] = {}
 
-    def create_tasks(self) -> None:
-        """Create CI tasks in Taskcluster."""
+    @staticmethod
+    def skip_event(github_event: GithubEvent) -> bool:
+        """Check whether an event can be ignored without cloning the repository.
+
+        Arguments:
+            github_event: Github event that triggered this run (need not be cloned).
+
+        Returns:
+            True if no CI tasks should be scheduled for this event.
+        """
+        if github_event.commit_message is not None and _has_skip_command(
+            github_event.commit_message
+        ):
+            LOG.warning(
+                "CI skip command detected in commit message, "
+                "not scheduling any CI tasks"
+            )
+            return True
         # Don't run push tasks in a PR. These are entirely redundant.
         # Ignore if branch is master/main, in case a PR is merged by push directly.
         # In that case the PR ref would still exist, although the push is to main.
-        if self.github_event.event_type == "push" and self.github_event.branch not in {
-            "master",
-            "main",
-        }:
-            assert self.github_event.repo is not None
-            for ref, commit in self.github_event.repo.refs().items():
-                if commit == self.github_event.commit:
-                    if ref.startswith("refs/pull/"):
-                        LOG.warning("Push in a PR branch. No CI tasks scheduled.")
-                        return
-        job_tasks = {id(job): slugId() for job in self.matrix.jobs}
-        prev_stage: list[str] = []
-        for stage in sorted({job.stage for job in self.matrix.jobs}):
-            this_stage = []
-            for job in self.matrix.jobs:
-                if job.stage != stage:
-                    continue
-                task_id = job_tasks[id(job)]
-                this_stage.append(task_id)
-                has_deploy_key = any(
-                    isinstance(sec, CISecretKey) and sec.hostname is None
-                    for sec in chain(self.matrix.secrets, job.secrets)
-                )
-                if has_deploy_key:
-                    clone_repo = self.github_event.ssh_url
-                else:
-                    clone_repo = self.github_event.http_url
-                job_ser = job.serialize()
-                assert isinstance(job_ser["secrets"], list)
-                job_ser["secrets"].extend(
-                    secret.serialize() for secret in self.matrix.secrets
-                )
-                job_ser["artifacts"].extend(
-                    art.serialize() for art in self.matrix.artifacts
+        if (
+            github_event.event_type == "push"
+            and github_event.branch not in {"master", "main"}
+            and github_event.pull_request_refs()
+        ):
+            LOG.warning("Push in a PR branch. No CI tasks scheduled.")
+            return True
+        return False
+
+    def resolve_images(self) -> None:
+        """Resolve the indexed task IDs of all MSYS/Homebrew images in the matrix.
+
+        Each image is looked up once, and lookups are made concurrently.
+        Results are kept in `image_tasks`.
+        """
+        images = sorted(
+            {
+                job.image
+                for job in self.matrix.jobs
+                if job.platform in {"windows", "macos"}
+                and job.image not in self.image_tasks
+            }
+        )
+        if not images:
+            return
+        idx = Taskcluster.get_service("index")
+
+        def _find(image: str) -> str:
+            result = idx.findTask(f"project.fuzzing.orion.{image}.master")
+            return str(result["taskId"])
+
+        with ThreadPoolExecutor(
+            max_workers=min(len(images), MAX_CONCURRENT_REQUESTS)
+        ) as executor:
+            self.image_tasks.update(zip(images, executor.map(_find, images)))
+
+    def find_results(self) -> None:
+        """Look up previous passing runs of each job for the same source tree.
+
+        Only used if `reuse_results` is set in the matrix. Jobs with secrets are
+        always run (and never recorded), as are all jobs for releases or when the
+        commit message contains `[full ci]`. Lookups are made concurrently.
+
+        Index paths for jobs which should be recorded are kept in `result_indexes`,
+        and task IDs of passing runs found are kept in `reused_results`.
+        """
+        if not self.matrix.reuse_results:
+            return
+        if self.github_event.event_type == "release":
+            LOG.info("Not reusing CI results for release")
+            return
+        if self.github_event.commit_message is not None and _has_full_command(
+            self.github_event.commit_message
+        ):
+            LOG.info("Full CI run requested in commit message")
+            return
+        if self.matrix.secrets:
+            return
+        assert self.github_event.repo is not None
+        assert self.github_event.commit is not None
+        tree = self.github_event.repo.tree(self.github_event.commit)
+        for job_idx, job in enumerate(self.matrix.jobs):
+            if job.secrets:
+                continue
+            inputs = {
+                "job": job.serialize(),
+                "artifacts": [art.serialize() for art in self.matrix.artifacts],
+                "caches": [cache.serialize() for cache in self.matrix.caches],
+            }
+            digest = sha256(f"{self.github_event.repo_slug}\0{tree}\0".encode())
+            digest.update(json_dump(inputs, sort_keys=True).encode())
+            self.result_indexes[job_idx] = f"{RESULT_INDEX}.{digest.hexdigest()}"
+        if not self.result_indexes:
+            return
+        idx = Taskcluster.get_service("index")
+
+        def _find(path: str) -> str | None:
+            try:
+                result = idx.findTask(path)
+            except TaskclusterRestFailure as exc:
+                if exc.status_code == 404:
+                    return None
+                raise
+            return str(result["taskId"])
+
+        with ThreadPoolExecutor(
+            max_workers=min(len(self.result_indexes), MAX_CONCURRENT_REQUESTS)
+        ) as executor:
+            found = zip(
+                self.result_indexes,
+                executor.map(_find, self.result_indexes.values()),
+            )
+            self.reused_results.update(
+                (job_id, task_id) for job_id, task_id in found if task_id is not None
+            )
+
+    def _create_job_task(
+        self,
+        job: MatrixJob,
+        task_id: str,
+        dependencies: list[str],
+        result_index: str | None = None,
+    ) -> dict[str, Any]:
+        """Generate the task definition for a CI job.
+
+        Arguments:
+            job: Job to create a task for.
+            task_id: Task ID which will be used for the job.
+            dependencies: Task IDs the job depends on.
+            result_index: Index path to record the job in if it passes.
+
+        Returns:
+            Task definition.
+        """
+        has_deploy_key = any(
+            isinstance(sec, CISecretKey) and sec.hostname is None
+            for sec in chain(self.matrix.secrets, job.secrets)
+        )
+        if has_deploy_key:
+            clone_repo = self.github_event.ssh_url
+        else:
+            clone_repo = self.github_event.http_url
+        job_ser = job.serialize()
+        assert isinstance(job_ser["secrets"], list)
+        job_ser["secrets"].extend(secret.serialize() for secret in self.matrix.secrets)
+        job_ser["artifacts"].extend(art.serialize() for art in self.matrix.artifacts)
+        job_ser["caches"].extend(cache.serialize() for cache in self.matrix.caches)
+        # set CI environment vars for compatibility with eg. codecov
+        job_ser["env"].update(
+            {
+                "CI": "true",
+                "CI_BUILD_ID": self.task_group,
+                "CI_BUILD_URL": f"{TASKCLUSTER_ROOT_URL}/tasks/{task_id}",
+                "CI_JOB_ID": task_id,
+                "VCS_BRANCH_NAME": self.github_event.branch,
+                "VCS_COMMIT_ID": self.github_event.commit,
+                "VCS_PULL_REQUEST": str(self.github_event.pull_request or "false"),
+                "VCS_SLUG": self.github_event.repo_slug,
+                "VCS_TAG": self.github_event.tag or "",
+            }
+        )
+        kwds = {
+            # need to json.dump twice so we get a string literal in the yaml
+            # template. otherwise (since it's yaml) it would be interpreted
+            # as an object.
+            "ci_job": json_dump(json_dump(job_ser)),
+            "clone_repo": clone_repo,
+            "deadline": stringDate(self.now + DEADLINE),
+            "fetch_ref": self.github_event.fetch_ref,
+            "fetch_rev": self.github_event.commit,
+            "http_repo": self.github_event.http_url,
+            "max_run_time": int(MAX_RUN_TIME.total_seconds()),
+            "name": job.name,
+            "now": stringDate(self.now),
+            "project": self.project_name,
+            "provisioner": PROVISIONER_ID,
+            "scheduler": self.scheduler_id,
+            "task_group": self.task_group,
+            "user": self.github_event.user,
+            "worker": WORKER_TYPES[job.platform],
+        }
+        if job.platform == "windows":
+            # "image" is resolved to a task ID where the MSYS artifact is
+            kwds["msys_task"] = self.image_tasks[job.image]
+        elif job.platform == "macos":
+            # "image" is resolved to a task ID where the Homebrew artifact is
+            kwds["homebrew_task"] = self.image_tasks[job.image]
+        else:
+            kwds["image"] = job.image
+        task: dict[str, Any] = yaml_load(TEMPLATES[job.platform].substitute(**kwds))
+        # if any secrets exist, use the proxy and request scopes
+        if job.secrets or self.matrix.secrets:
+            task["payload"].setdefault("features", {})
+            task["payload"]["features"]["taskclusterProxy"] = True
+            for sec in chain(job.secrets, self.matrix.secrets):
+                task["scopes"].append(f"secrets:get:{sec.secret}")
+            # ensure scopes are unique
+            task["scopes"] = list(set(task["scopes"]))
+        if job.artifacts or self.matrix.artifacts:
+            LOG.debug(
+                "adding %d job and %d matrix artifacts",
+                len(job.artifacts),
+                len(self.matrix.artifacts),
+            )
+            if job.platform == "linux":
+                task["payload"]["artifacts"].update(
+                    {
+                        art.url: {
+                            "path": art.src,
+                            "type": art.type,
+                        }
+                        for art in chain(job.artifacts, self.matrix.artifacts)
+                    }
                 )
-                # set CI environment vars for compatibility with eg. codecov
-                job_ser["env"].update(
+            else:
+                task["payload"]["artifacts"].extend(
                     {
-                        "CI": "true",
-                        "CI_BUILD_ID": self.task_group,
-                        "CI_BUILD_URL": f"{TASKCLUSTER_ROOT_URL}/tasks/{task_id}",
-                        "CI_JOB_ID": task_id,
-                        "VCS_BRANCH_NAME": self.github_event.branch,
-                        "VCS_COMMIT_ID": self.github_event.commit,
-                        "VCS_PULL_REQUEST": str(
-                            self.github_event.pull_request or "false"
-                        ),
-                        "VCS_SLUG": self.github_event.repo_slug,
-                        "VCS_TAG": self.github_event.tag or "",
+                        "name": art.url,
+                        "path": art.src,
+                        "type": art.type,
                     }
+                    for art in chain(job.artifacts, self.matrix.artifacts)
                 )
-                kwds = {
-                    # need to json.dump twice so we get a string literal in the yaml
-                    # template. otherwise (since it's yaml) it would be interpreted
-                    # as an object.
-                    "ci_job": json_dump(json_dump(job_ser)),
-                    "clone_repo": clone_repo,
-                    "deadline": stringDate(self.now + DEADLINE),
-                    "fetch_ref": self.github_event.fetch_ref,
-                    "fetch_rev": self.github_event.commit,
-                    "http_repo": self.github_event.http_url,
-                    "max_run_time": int(MAX_RUN_TIME.total_seconds()),
-                    "name": job.name,
-                    "now": stringDate(self.now),
-                    "project": self.project_name,
-                    "provisioner": PROVISIONER_ID,
-                    "scheduler": self.scheduler_id,
-                    "task_group": self.task_group,
-                    "user": self.github_event.user,
-                    "worker": WORKER_TYPES[job.platform],
-                }
-                if job.platform == "windows":
-                    # need to resolve "image" to a task ID where the MSYS
-                    # artifact is
-                    idx = Taskcluster.get_service("index")
-                    result = idx.findTask(f"project.fuzzing.orion.{job.image}.master")
-                    kwds["msys_task"] = result["taskId"]
-                elif job.platform == "macos":
-                    # need to resolve "image" to a task ID where the Homebrew
-                    # artifact is
-                    idx = Taskcluster.get_service("index")
-                    result = idx.findTask(f"project.fuzzing.orion.{job.image}.master")
-                    kwds["homebrew_task"] = result["taskId"]
-                else:
-                    kwds["image"] = job.image
-                task = yaml_load(TEMPLATES[job.platform].substitute(**kwds))
-                # if any secrets exist, use the proxy and request scopes
-                if job.secrets or self.matrix.secrets:
-                    task["payload"].setdefault("features", {})
-                    task["payload"]["features"]["taskclusterProxy"] = True
-                    for sec in chain(job.secrets, self.matrix.secrets):
-                        task["scopes"].append(f"secrets:get:{sec.secret}")
-                    # ensure scopes are unique
-                    task["scopes"] = list(set(task["scopes"]))
-                if job.artifacts or self.matrix.artifacts:
-                    LOG.debug(
-                        "adding %d job and %d matrix artifacts",
-                        len(job.artifacts),
-                        len(self.matrix.artifacts),
-                    )
-                    if job.platform == "linux":
-                        task["payload"]["artifacts"].update(
-                            {
-                                art.url: {
-                                    "path": art.src,
-                                    "type": art.type,
-                                }
-                                for art in chain(job.artifacts, self.matrix.artifacts)
-                            }
-                        )
-                    else:
-                        task["payload"]["artifacts"].extend(
-                            {
-                                "name": art.url,
-                                "path": art.src,
-                                "type": art.type,
-                            }
-                            for art in chain(job.artifacts, self.matrix.artifacts)
+        if job.caches or self.matrix.caches:
+            self._add_caches(task, job)
+        if self.matrix.fail_fast:
+            # ci-launch cancels other tasks if the job fails
+            task["payload"]["env"]["CI_FAIL_FAST"] = "1"
+            task["payload"].setdefault("features", {})
+            task["payload"]["features"]["taskclusterProxy"] = True
+            task["scopes"].append(
+                f"queue:cancel-task:{self.scheduler_id}/{self.task_group}/*"
+            )
+        if result_index is not None:
+            # record the job result if it passes
+            route = f"index.{result_index}"
+            task["routes"].append(route)
+            task["scopes"].append(f"queue:route:{route}")
+        if not job.require_previous_stage_pass:
+            task["requires"] = "all-resolved"
+        task["dependencies"].extend(dependencies)
+        return task
+
+    def _add_caches(self, task: dict[str, Any], job: MatrixJob) -> None:
+        """Add worker caches for a job to its task definition.
+
+        Arguments:
+            task: Task definition to update.
+            job: Job the task is for.
+        """
+        root = None if self.github_event.repo is None else self.github_event.repo.path
+        assert self.github_event.repo_slug is not None
+        # pull requests may come from forks, so must not share writable caches with
+        # jobs for pushes & releases, which may carry secrets or publish results
+        if self.github_event.event_type == "pull_request":
+            trust = "untrusted"
+        else:
+            trust = "trusted"
+        slug = self.github_event.repo_slug.replace("/", "-")
+        prefix = f"orion-ci-{trust}-{slug}"
+        for cache in chain(job.caches, self.matrix.caches):
+            name = cache.name(prefix, job.image, root)
+            LOG.debug("adding cache %s at %s", name, cache.path)
+            if job.platform == "linux":
+                task["payload"].setdefault("cache", {})[name] = cache.path
+                task["scopes"].append(f"docker-worker:cache:{name}")
+            else:
+                task["payload"]["mounts"].append(
+                    {"cacheName": name, "directory": cache.path}
+                )
+                task["scopes"].append(f"generic-worker:cache:{name}")
+
+    def create_tasks(self) -> None:
+        """Create CI tasks in Taskcluster.
+
+        Tasks are created concurrently as soon as all tasks they depend on exist.
+        Jobs depend on their `needs` if given, otherwise on the previous stage.
+
+        Jobs which already passed for the same source tree are not created (if
+        enabled), and jobs depending on them depend on the previous passing run
+        instead.
+        """
+        self.resolve_images()
+        self.find_results()
+        jobs = self.matrix.jobs
+        dependencies = job_dependencies(jobs)
+        job_tasks = [
+            self.reused_results.get(idx) or slugId() for idx in range(len(jobs))
+        ]
+        queue = None if self.dry_run else Taskcluster.get_service("queue")
+
+        def _submit(task_id: str, task: dict[str, Any]) -> None:
+            assert queue is not None
+            try:
+                queue.createTask(task_id, task)
+            except TaskclusterFailure as exc:  # pragma: no cover
+                LOG.error("Error creating CI task: %s", exc)
+                raise
+
+        sorter = TopologicalSorter(dict(enumerate(dependencies)))
+        sorter.prepare()
+        with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_REQUESTS) as executor:
+            while sorter.is_active():
+                ready = sorted(sorter.get_ready())
+                to_create = {}
+                for idx in ready:
+                    job = jobs[idx]
+                    task_id = job_tasks[idx]
+                    if idx in self.reused_results:
+                        LOG.info(
+                            "job %s already passed in %s, not scheduling",
+                            job.name,
+                            task_id,
                         )
-                if not job.require_previous_stage_pass:
-                    task["requires"] = "all-resolved"
-                task["dependencies"].extend(prev_stage)
-                LOG.info("task %s: %s", task_id, task["metadata"]["name"])
-                if not self.dry_run:
-                    try:
-                        Taskcluster.get_service("queue").createTask(task_id, task)
-                    except TaskclusterFailure as exc:  # pragma: no cover
-                        LOG.error("Error creating CI task: %s", exc)
-                        raise
-
-            prev_stage = this_stage
+                        continue
+                    task = self._create_job_task(
+                        job,
+                        task_id,
+                        [job_tasks[dep] for dep in dependencies[idx]],
+                        self.result_indexes.get(idx),
+                    )
+                    LOG.info("task %s: %s", task_id, task["metadata"]["name"])
+                    to_create[task_id] = task
+                if queue is not None:
+                    # wait for all tasks, and raise the first error (if any)
+                    for _ in executor.map(_submit, to_create, to_create.values()):
+                        pass
+                sorter.done(*ready)
 
     @classmethod
     def main(cls, args: Namespace) -> int:
@@ -238,6 +510,13 @@ class CIScheduler:
         Returns:
             Shell return code.
         """
+        # check the github event before cloning, in case there is nothing to do
+        evt = GithubEvent.from_payload(
+            args.github_action, args.github_event, args.clone_secret
+        )
+        if cls.skip_event(evt):
+            return 0
+
         # get schedulerId from TC queue
         if args.scheduler is None:
             task_obj = Taskcluster.get_service("queue").task(getenv("TASK_ID"))
@@ -245,13 +524,12 @@ class CIScheduler:
         else:
             scheduler_id = args.scheduler
 
-        # get the github event & repo
-        evt = GithubEvent.from_taskcluster(
-            args.github_action, args.github_event, args.clone_secret
-        )
+        # get the github repo
+        evt.clone()
         assert evt.commit_message is not None
         try:
-            if "[skip ci]" in evt.commit_message or "[skip tc]" in evt.commit_message:
+            # not all events carry commit messages in the payload, check them again
+            if _has_skip_command(evt.commit_message):
                 LOG.warning(
                     "CI skip command detected in commit message, "
                     "not scheduling any CI tasks"
@@ -272,5 +550,6 @@ class CIScheduler:
             sched.create_tasks()
         finally:
             evt.cleanup()
+            RETRY_STATS.log_summary()
 
         return 0
@@ -7,22 +7,25 @@ from __future__ import annotations
 
 import sys
 from argparse import ArgumentParser, Namespace
+from concurrent.futures import ThreadPoolExecutor
 from locale import LC_ALL, setlocale
 from logging import DEBUG, INFO, WARN, basicConfig, getLogger
 from os import chdir, getenv
 from os import environ as os_environ
 from pathlib import Path
 from shutil import which
-from subprocess import run
+from subprocess import CalledProcessError, run
+from time import monotonic
 
 from yaml import safe_load as yaml_load
 
 from .ci_check import check_matrix
 from .ci_matrix import CISecretEnv, CISecretKey, MatrixJob
-from .ci_scheduler import CIScheduler
+from .ci_scheduler import CIScheduler, cancel_sibling_jobs
 from .cron import CronScheduler
 from .git import GitRepo
 from .orion import Services
+from .retry import STATS as RETRY_STATS
 from .scheduler import Scheduler
 
 LOG = getLogger(__name__)
@@ -175,13 +178,23 @@ def parse_ci_check_args(argv: list[str] | None = None) -> Namespace:
     """
     parser = ArgumentParser(prog="ci-check")
     _define_logging_args(parser)
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=None,
+        help="Number of processes to use (default: number of CPUs, 1 for serial).",
+    )
     parser.add_argument(
         "changed",
         type=Path,
         nargs="*",
         help="Changed path(s)",
     )
-    return parser.parse_args(argv)
+    result = parser.parse_args(argv)
+    if result.jobs is not None and result.jobs < 1:
+        parser.error("--jobs must be at least 1")
+    return result
 
 
 def parse_ci_launch_args(argv: list[str] | None = None) -> Namespace:
@@ -215,6 +228,29 @@ def parse_ci_launch_args(argv: list[str] | None = None) -> Namespace:
         default=getenv("CI_JOB"),
         help="The CI job object",
     )
+    parser.add_argument(
+        "--fail-fast",
+        action="store_true",
+        default=bool(getenv("CI_FAIL_FAST")),
+        help="Cancel other CI tasks in the group if the job fails",
+    )
+    parser.add_argument(
+        "--task-id",
+        default=getenv("TASK_ID"),
+        help="Taskcluster task ID of this job (for --fail-fast)",
+    )
+    parser.add_argument(
+        "--clone-depth",
+        type=int,
+        default=getenv("CI_CLONE_DEPTH"),
+        help="Number of commits of history to clone, without tags (default: all)",
+    )
+    parser.add_argument(
+        "--git-mirror",
+        type=Path,
+        default=getenv("CI_GIT_MIRROR"),
+        help="Local repository to borrow git objects from, if it exists",
+    )
     result = parser.parse_args(argv)
     if not result.job:
         parser.error("--job (or CI_JOB) is required!")
@@ -337,23 +373,57 @@ def ci_launch() -> None:
             and [pt.casefold() for pt in Path(p).resolve().parts[1:3]]
             != ["users", "administrator"]
         )
-    # fetch secrets
+    start = monotonic()
+    timings = {}
+
+    def _clone() -> GitRepo:
+        LOG.info("Cloning repo: %s @ %s", args.clone_repo, args.fetch_rev)
+        clone_start = monotonic()
+        repo = GitRepo(
+            args.clone_repo,
+            args.fetch_ref,
+            args.fetch_rev,
+            depth=args.clone_depth or None,
+            reference=args.git_mirror,
+        )
+        timings["clone"] = monotonic() - clone_start
+        return repo
+
+    # fetch secrets concurrently, and clone the repo at the same time unless it
+    # needs a deploy key from the secrets
     LOG.info("Fetching %d secrets", len(args.job.secrets))
-    for secret in args.job.secrets:
-        LOG.info("  secret: %s", secret.secret)
-        if isinstance(secret, CISecretEnv):
-            env[secret.name] = secret.get_secret_data()
-            assert isinstance(env[secret.name], str), (
-                f"expected secret '{secret.secret}' to be a string "
-                f"(got {type(env[secret.name]).__name__})... missing `key`?"
-            )
-        else:
-            secret.write()
-    # clone repo
-    LOG.info("Cloning repo: %s @ %s", args.clone_repo, args.fetch_rev)
-    repo = GitRepo(args.clone_repo, args.fetch_ref, args.fetch_rev)
+    needs_key = any(
+        isinstance(secret, CISecretKey) and secret.hostname is None
+        for secret in args.job.secrets
+    )
+    with ThreadPoolExecutor(max_workers=len(args.job.secrets) + 1) as executor:
+        repo_future = None if needs_key else executor.submit(_clone)
+        secret_data = [
+            executor.submit(secret.get_secret_data) for secret in args.job.secrets
+        ]
+        for secret, data in zip(args.job.secrets, secret_data, strict=True):
+            LOG.info("  secret: %s", secret.secret)
+            if isinstance(secret, CISecretEnv):
+                env[secret.name] = data.result()
+                assert isinstance(env[secret.name], str), (
+                    f"expected secret '{secret.secret}' to be a string "
+                    f"(got {type(env[secret.name]).__name__})... missing `key`?"
+                )
+            else:
+                secret.write(data.result())
+        timings["secrets"] = monotonic() - start
+        if repo_future is None:
+            repo_future = executor.submit(_clone)
+        repo = repo_future.result()
     assert repo.path is not None
     chdir(repo.path)
+    LOG.info(
+        "Startup took %.1fs (secrets: %.1fs, clone: %.1fs)",
+        monotonic() - start,
+        timings["secrets"],
+        timings["clone"],
+    )
+    RETRY_STATS.log_summary()
     # update env
     env.update(args.job.env)
     # update command
@@ -364,7 +434,19 @@ def ci_launch() -> None:
             f"Couldn't resolve script executable: {args.job.script[0]}"
         )
         args.job.script[0] = binary
-    sys.exit(run(args.job.script, env=env, check=True).returncode)
+    try:
+        sys.exit(run(args.job.script, env=env, check=True).returncode)
+    except CalledProcessError:
+        if args.fail_fast:
+            if args.task_id is None:
+                LOG.warning("TASK_ID is not set, can't cancel other CI tasks")
+            else:
+                try:
+                    cancel_sibling_jobs(args.task_id, args.job)
+                except Exception:
+                    # don't hide the job failure
+                    LOG.exception("Failed to cancel other CI tasks")
+        raise
 
 
 def ci_check() -> None:
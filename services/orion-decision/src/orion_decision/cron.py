@@ -16,6 +16,7 @@ from taskcluster.exceptions import TaskclusterRestFailure
 from . import ARTIFACTS_EXPIRE, CRON_PERIOD, Taskcluster
 from .git import GitRepo
 from .orion import Services
+from .retry import STATS as RETRY_STATS
 from .scheduler import Scheduler
 
 LOG = getLogger(__name__)
@@ -174,5 +175,6 @@ class CronScheduler(Scheduler):
             sched.create_tasks()
         finally:
             repo.cleanup()
+            RETRY_STATS.log_summary()
 
         return 0
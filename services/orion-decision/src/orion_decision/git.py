@@ -11,11 +11,11 @@ from pathlib import Path
 from shutil import rmtree
 from subprocess import CalledProcessError, run
 from tempfile import mkdtemp
-from time import sleep
 from typing import Any
 
+from .retry import GIT_RETRY, is_transient_git_error
+
 LOG = getLogger(__name__)
-RETRY_SLEEP = 30
 RETRIES = 10
 
 GIT_EVENT_TYPES = {
@@ -25,6 +25,14 @@ GIT_EVENT_TYPES = {
 }
 
 
+def _parse_ls_remote(output: str) -> dict[str, str]:
+    result = {}
+    for entry in output.splitlines():
+        commit, ref = entry.split()
+        result[ref] = commit
+    return result
+
+
 class GitRepo:
     """A git repository.
 
@@ -40,6 +48,8 @@ class GitRepo:
         clone_ref: str | None,
         commit: str | None,
         _clone: bool = True,
+        depth: int | None = None,
+        reference: Path | None = None,
     ) -> None:
         """Initialize a GitRepo instance.
 
@@ -47,6 +57,10 @@ class GitRepo:
             clone_url: The location to clone the repository from.
             clone_ref: The reference to fetch. (eg. branch).
             commit: Commit to checkout (must be `FETCH_HEAD` or an ancestor).
+            depth: If given, fetch only this many commits of history from `commit`
+                   (falls back to fetching `clone_ref` if that fails).
+            reference: Local repository (eg. a mirror) to borrow objects from, if
+                       it exists.
         """
         self._cloned = _clone
         self.path: Path | None
@@ -55,7 +69,7 @@ class GitRepo:
             LOG.debug("created git repo tmp folder: %s", self.path)
             assert clone_ref is not None
             assert commit is not None
-            self._clone(clone_url, clone_ref, commit)
+            self._clone(clone_url, clone_ref, commit, depth, reference)
         else:
             self.path = Path(clone_url)
             LOG.debug("using existing git repo: %s", self.path)
@@ -67,11 +81,36 @@ class GitRepo:
         Returns:
             dictionary mapping ref name to commit hash.
         """
-        result = {}
-        for entry in self.git("ls-remote", "--quiet").splitlines():
-            commit, ref = entry.split()
-            result[ref] = commit
-        return result
+        return _parse_ls_remote(self.git("ls-remote", "--quiet"))
+
+    @staticmethod
+    def remote_refs(clone_url: Path | str) -> dict[str, str]:
+        """Get the list of refs available in a remote without cloning it.
+
+        Arguments:
+            clone_url: The location of the remote repository.
+
+        Returns:
+            dictionary mapping ref name to commit hash.
+        """
+        LOG.debug("calling: git ls-remote --quiet %s", clone_url)
+
+        def _call() -> str:
+            return run(
+                ("git", "ls-remote", "--quiet", str(clone_url)),
+                check=True,
+                capture_output=True,
+                text=True,
+            ).stdout
+
+        try:
+            output = GIT_RETRY.call(
+                _call, "git ls-remote", is_transient_git_error, tries=RETRIES
+            )
+        except CalledProcessError as exc:
+            LOG.error("git command returned error:\n%s", exc.stderr)
+            raise
+        return _parse_ls_remote(output)
 
     def head(self) -> str:
         """Get the commit ref of HEAD.
@@ -96,8 +135,8 @@ class GitRepo:
     def git(self, *args: Path | str, tries: int = 1) -> str:
         """Call a git command in the cloned repository.
 
-        If tries is specified, the command will be retried on failure,
-        with a 30s sleep between tries.
+        If tries is specified, the command will be retried on transient failure,
+        with exponential backoff between tries (see `GIT_RETRY`).
 
         Arguments:
             *args: The git command line to run (eg. `git("commit", "-a")`
@@ -109,24 +148,10 @@ class GitRepo:
         Returns:
             stdout returned by the process.
         """
-        LOG.debug("calling: git %s", " ".join(str(arg) for arg in args))
-        for _ in range(tries - 1):
-            result = run(
-                ("git", *args),
-                capture_output=True,
-                cwd=self.path,
-                text=True,
-            )
-            if result.returncode == 0:
-                return result.stdout
-            LOG.warning(
-                "`git %s` returned %d, waiting %ds before retry...",
-                " ".join(str(arg) for arg in args),
-                result.returncode,
-                RETRY_SLEEP,
-            )
-            sleep(RETRY_SLEEP)
-        try:
+        cmd_str = " ".join(str(arg) for arg in args)
+        LOG.debug("calling: git %s", cmd_str)
+
+        def _call() -> str:
             return run(
                 ("git", *args),
                 check=True,
@@ -134,14 +159,47 @@ class GitRepo:
                 cwd=self.path,
                 text=True,
             ).stdout
+
+        try:
+            return GIT_RETRY.call(
+                _call, f"git {args[0]}", is_transient_git_error, tries=tries
+            )
         except CalledProcessError as exc:
             LOG.error("git command returned error:\n%s", exc.stderr)
             raise
 
-    def _clone(self, clone_url: Path | str, clone_ref: str, commit: str) -> None:
+    def _clone(
+        self,
+        clone_url: Path | str,
+        clone_ref: str,
+        commit: str,
+        depth: int | None = None,
+        reference: Path | None = None,
+    ) -> None:
+        assert self.path is not None
         self.git("init")
+        if reference is not None:
+            objects = reference / "objects"
+            if not objects.is_dir():
+                objects = reference / ".git" / "objects"
+            if objects.is_dir():
+                LOG.info("using objects from local repository: %s", reference)
+                alternates = self.path / ".git" / "objects" / "info" / "alternates"
+                alternates.parent.mkdir(parents=True, exist_ok=True)
+                alternates.write_text(f"{objects.resolve()}\n")
+            else:
+                LOG.debug("local repository not found: %s", reference)
         self.git("remote", "add", "origin", clone_url)
-        self.git("fetch", "-t", "-q", "origin", clone_ref, tries=RETRIES)
+        if depth:
+            # the server may refuse to fetch a commit directly, which won't change
+            # by retrying, so fall back immediately
+            try:
+                self.git("fetch", "-q", f"--depth={depth}", "origin", commit)
+            except CalledProcessError:
+                LOG.warning("shallow fetch failed, fetching %s instead", clone_ref)
+                depth = None
+        if not depth:
+            self.git("fetch", "-t", "-q", "origin", clone_ref, tries=RETRIES)
         self.git("-c", "advice.detachedHead=false", "checkout", commit)
 
     def cleanup(self) -> None:
@@ -150,6 +208,17 @@ class GitRepo:
             rmtree(self.path)
         self.path = None
 
+    def tree(self, commit: str) -> str:
+        """Get the tree hash for a given commit.
+
+        Arguments:
+            commit: The commit to look up.
+
+        Returns:
+            Hash of the tree (source contents) of the commit.
+        """
+        return self.git("rev-parse", f"{commit}^{{tree}}").strip()
+
     def message(self, commit: str) -> str:
         """Get the commit message for a given commit.
 
@@ -167,6 +236,7 @@ class GithubEvent:
 
     Attributes:
         branch: Name of the branch (push), target branch (PR), or tag (release).
+        clone_url: URL the repository is cloned from.
         commit: The commit HEAD for this build.
         commit_message: Commit subject and body.
         commit_range: Range of commits included in push or PR.
@@ -196,6 +266,7 @@ class GithubEvent:
         self.repo: GitRepo | None = None
         self.fetch_ref: str | None = None
         self.user: str | None = None
+        self.clone_url: str | None = None
 
     def cleanup(self) -> None:
         """Cleanup resources held by this instance."""
@@ -221,10 +292,14 @@ class GithubEvent:
         return f"https://github.com/{self.repo_slug}"
 
     @classmethod
-    def from_taskcluster(
+    def from_payload(
         cls, action: str, event: dict[str, Any], clone_secret: str | None = None
     ) -> GithubEvent:
-        """Initialize the GithubEvent from Taskcluster context variables.
+        """Initialize the GithubEvent from the webhook payload, without cloning.
+
+        `commit_message` is populated from the commits listed in a push payload
+        (if any), which may be a subset of the commits in `commit_range`. Call
+        `clone()` to fetch the repository and read the full commit message.
 
         Arguments:
             action: The Github action string from Taskcluster
@@ -265,11 +340,44 @@ class GithubEvent:
             if set(event["before"]) != {"0"}:
                 self.commit_range = f"{event['before']}..{event['after']}"
             self.fetch_ref = event["after"]
+            messages = [
+                commit["message"]
+                for commit in event.get("commits") or ()
+                if "message" in commit
+            ]
+            if messages:
+                self.commit_message = "\n".join(messages)
         if clone_secret:
-            clone_url = self.ssh_url
+            self.clone_url = self.ssh_url
         else:
-            clone_url = self.http_url
-        self.repo = GitRepo(clone_url, self.fetch_ref, self.commit)
+            self.clone_url = self.http_url
+        return self
+
+    @classmethod
+    def from_taskcluster(
+        cls, action: str, event: dict[str, Any], clone_secret: str | None = None
+    ) -> GithubEvent:
+        """Initialize the GithubEvent from Taskcluster context variables.
+
+        Arguments:
+            action: The Github action string from Taskcluster
+                (one of "github-push", "github-pull-request", "github-release").
+            event: The raw Github Webhook event object.
+                ref: https://docs.github.com/en/free-pro-team@latest/developers
+                     /webhooks-and-events/webhook-events-and-payloads
+            clone_secret: Taskcluster secret path used to fetch clone ssh key.
+
+        Returns:
+            Object describing the Github Event we're responding to.
+        """
+        self = cls.from_payload(action, event, clone_secret)
+        self.clone()
+        return self
+
+    def clone(self) -> None:
+        """Clone the repository for this event and read the commit message."""
+        assert self.clone_url is not None
+        self.repo = GitRepo(self.clone_url, self.fetch_ref, self.commit)
 
         # fetch both sides of the commit range
         if self.commit_range is not None:
@@ -278,7 +386,25 @@ class GithubEvent:
                 self.repo.git("fetch", "-q", "origin", before, tries=RETRIES)
 
         self.commit_message = self.repo.message(str(self.commit_range or self.commit))
-        return self
+
+    def pull_request_refs(self) -> list[str]:
+        """List pull request refs pointing at the commit for this event.
+
+        If the repository has not been cloned, the remote is queried directly.
+
+        Returns:
+            pull request refs (`refs/pull/...`) for `commit`.
+        """
+        if self.repo is not None:
+            refs = self.repo.refs()
+        else:
+            assert self.clone_url is not None
+            refs = GitRepo.remote_refs(self.clone_url)
+        return [
+            ref
+            for ref, commit in refs.items()
+            if commit == self.commit and ref.startswith("refs/pull/")
+        ]
 
     def list_changed_paths(self) -> Iterator[Path]:
         """Calculate paths that were changed in the commit range.
@@ -0,0 +1,224 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+"""Retry policy for operations which may fail transiently"""
+
+# This module is duplicated in orion-decision, fuzzing-decision and orion-builder,
+# keep the copies in sync.
+
+from __future__ import annotations
+
+import re
+from collections import Counter, defaultdict
+from collections.abc import Callable
+from logging import getLogger
+from random import random
+from subprocess import CalledProcessError
+from time import monotonic, sleep
+from typing import TypeVar
+
+LOG = getLogger(__name__)
+T = TypeVar("T")
+
+# git errors which will not go away by trying again
+GIT_PERMANENT_ERRORS = re.compile(
+    r"couldn't find remote ref"
+    r"|not our ref"
+    r"|repository not found"
+    r"|does not appear to be a git repository"
+    r"|not a git repository"
+    r"|unknown revision"
+    r"|did not match any file\(s\) known to git",
+    re.IGNORECASE,
+)
+
+
+class RetryStats:
+    """Retries made and time spent waiting to retry, by operation.
+
+    Attributes:
+        retries: Number of retries per operation.
+        time_lost: Seconds spent sleeping before retries per operation.
+    """
+
+    __slots__ = ("retries", "time_lost")
+
+    def __init__(self) -> None:
+        """Initialize an empty RetryStats instance."""
+        self.retries: Counter[str] = Counter()
+        self.time_lost: defaultdict[str, float] = defaultdict(float)
+
+    def record(self, operation: str, delay: float) -> None:
+        """Record a retry.
+
+        Arguments:
+            operation: Description of the operation being retried.
+            delay: Time slept before the retry.
+        """
+        self.retries[operation] += 1
+        self.time_lost[operation] += delay
+
+    def clear(self) -> None:
+        """Reset all counts."""
+        self.retries.clear()
+        self.time_lost.clear()
+
+    def log_summary(self) -> None:
+        """Log the retries made by each operation (if any)."""
+        for operation, count in self.retries.most_common():
+            LOG.info(
+                "retry stats: %s retried %d times (%.1fs lost)",
+                operation,
+                count,
+                self.time_lost[operation],
+            )
+
+
+STATS = RetryStats()
+
+
+class RetryPolicy:
+    """Exponential backoff with jitter, bounded by a number of tries and a deadline.
+
+    Attributes:
+        tries: Maximum number of attempts (including the first).
+        initial_delay: Delay before the first retry (seconds).
+        max_delay: Upper bound for the delay between attempts (seconds).
+        multiplier: Factor the delay grows by after each retry.
+        jitter: Fraction of each delay which is randomized (0 to disable).
+        deadline: Total time budget for all attempts (seconds), or None.
+                  No retry is made if the delay would exceed the budget.
+    """
+
+    __slots__ = (
+        "deadline",
+        "initial_delay",
+        "jitter",
+        "max_delay",
+        "multiplier",
+        "tries",
+    )
+
+    def __init__(
+        self,
+        tries: int = 10,
+        initial_delay: float = 2.0,
+        max_delay: float = 60.0,
+        multiplier: float = 2.0,
+        jitter: float = 0.5,
+        deadline: float | None = None,
+    ) -> None:
+        """Initialize a RetryPolicy instance.
+
+        Arguments:
+            tries: Maximum number of attempts (including the first).
+            initial_delay: Delay before the first retry (seconds).
+            max_delay: Upper bound for the delay between attempts (seconds).
+            multiplier: Factor the delay grows by after each retry.
+            jitter: Fraction of each delay which is randomized (0 to disable).
+            deadline: Total time budget for all attempts (seconds), or None.
+        """
+        assert tries >= 1
+        assert 0 <= jitter <= 1
+        self.tries = tries
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.multiplier = multiplier
+        self.jitter = jitter
+        self.deadline = deadline
+
+    def delay(self, retry: int) -> float:
+        """Calculate the time to wait before a retry.
+
+        Arguments:
+            retry: The retry number (1 for the first retry).
+
+        Returns:
+            Delay in seconds.
+        """
+        delay = min(self.max_delay, self.initial_delay * self.multiplier ** (retry - 1))
+        return delay * (1 - self.jitter * random())
+
+    def call(
+        self,
+        func: Callable[[], T],
+        operation: str,
+        is_transient: Callable[[Exception], bool] | None = None,
+        tries: int | None = None,
+        stats: RetryStats = STATS,
+    ) -> T:
+        """Call a function, retrying when it raises a transient error.
+
+        Arguments:
+            func: The function to call.
+            operation: Description of the call, for logging and stats.
+            is_transient: Classify an exception raised by `func`. Exceptions
+                          which are not transient are raised immediately.
+                          (default: all exceptions are transient).
+            tries: Override the maximum number of attempts in this policy.
+            stats: Where to record retries.
+
+        Returns:
+            The result of `func`.
+        """
+        if tries is None:
+            tries = self.tries
+        start = monotonic()
+        lost = 0.0
+        for attempt in range(1, tries + 1):
+            try:
+                result = func()
+            except Exception as exc:
+                if attempt == tries or (
+                    is_transient is not None and not is_transient(exc)
+                ):
+                    raise
+                delay = self.delay(attempt)
+                if (
+                    self.deadline is not None
+                    and monotonic() - start + delay > self.deadline
+                ):
+                    LOG.warning(
+                        "%s failed, retry deadline (%ds) exceeded",
+                        operation,
+                        self.deadline,
+                    )
+                    raise
+                LOG.warning(
+                    "%s failed (%s), retrying in %.1fs (attempt %d/%d)",
+                    operation,
+                    exc,
+                    delay,
+                    attempt,
+                    tries,
+                )
+                sleep(delay)
+                lost += delay
+                stats.record(operation, delay)
+                continue
+            if attempt > 1:
+                LOG.info(
+                    "%s succeeded after %d retries (%.1fs lost)",
+                    operation,
+                    attempt - 1,
+                    lost,
+                )
+            return result
+        raise AssertionError("unreachable")  # pragma: no cover
+
+
+def is_transient_git_error(exc: Exception) -> bool:
+    """Classify an exception raised by a git subprocess.
+
+    Arguments:
+        exc: Exception raised by `subprocess.run(..., check=True)`.
+
+    Returns:
+        False if the git error is known to be permanent, otherwise True.
+    """
+    if isinstance(exc, CalledProcessError) and exc.stderr:
+        return GIT_PERMANENT_ERRORS.search(exc.stderr) is None
+    return isinstance(exc, CalledProcessError)
+
+
+GIT_RETRY = RetryPolicy(tries=10, initial_delay=2.0, max_delay=60.0, deadline=600)
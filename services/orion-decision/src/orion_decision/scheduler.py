@@ -40,6 +40,7 @@ from .orion import (
     ServiceTestOnly,
     ToxServiceTest,
 )
+from .retry import STATS as RETRY_STATS
 
 LOG = getLogger(__name__)
 TEMPLATES = (Path(__file__).parent / "task_templates").resolve()
@@ -132,20 +133,27 @@ class Scheduler:
             )
         return should_push
 
-    def _skip_tasks(self) -> bool:
-        if self.github_event.event_type == "release":
+    @staticmethod
+    def skip_event(github_event: GithubEvent, push_branch: str) -> bool:
+        """Check whether an event can be ignored without cloning the repository.
+
+        Arguments:
+            github_event: The event that triggered this decision (need not be cloned).
+            push_branch: The branch name that should trigger a push to Docker Hub.
+
+        Returns:
+            True if no tasks should be scheduled for this event.
+        """
+        if github_event.event_type == "release":
             LOG.warning("Detected release event. Nothing to do!")
             return True
         if (
-            self.github_event.event_type == "push"
-            and self.github_event.branch != self.push_branch
+            github_event.event_type == "push"
+            and github_event.branch != push_branch
+            and github_event.pull_request_refs()
         ):
-            assert self.github_event.repo is not None
-            for ref, commit in self.github_event.repo.refs().items():
-                if commit == self.github_event.commit:
-                    if ref.startswith("refs/pull/"):
-                        LOG.warning("Push in a PR branch. No tasks scheduled.")
-                        return True
+            LOG.warning("Push in a PR branch. No tasks scheduled.")
+            return True
         return False
 
     def mark_services_for_rebuild(self) -> None:
@@ -450,8 +458,6 @@ class Scheduler:
 
     def create_tasks(self) -> None:
         """Create test/build/push tasks in Taskcluster."""
-        if self._skip_tasks():
-            return None
         should_push = self._should_push()
         service_build_tasks = {
             (service, arch): slugId()
@@ -628,6 +634,11 @@ class Scheduler:
         Returns:
             Shell return code.
         """
+        # check the github event before cloning, in case there is nothing to do
+        evt = GithubEvent.from_payload(args.github_action, args.github_event)
+        if cls.skip_event(evt, args.push_branch):
+            return 0
+
         # get schedulerId from TC queue
         if args.scheduler is None:
             task_obj = Taskcluster.get_service("queue").task(getenv("TASK_ID"))
@@ -635,8 +646,8 @@ class Scheduler:
         else:
             scheduler_id = args.scheduler
 
-        # get the github event & repo
-        evt = GithubEvent.from_taskcluster(args.github_action, args.github_event)
+        # get the github repo
+        evt.clone()
         try:
             # create the scheduler
             sched = cls(
@@ -654,5 +665,6 @@ class Scheduler:
             sched.create_tasks()
         finally:
             evt.cleanup()
+            RETRY_STATS.log_summary()
 
         return 0
@@ -0,0 +1,86 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+"""Tests for Orion CI matrix check"""
+
+from argparse import Namespace
+from pathlib import Path
+from typing import Any
+
+import pytest
+from pytest_mock import MockerFixture
+from yaml import dump as yaml_dump
+
+from orion_decision.ci_check import check_matrix
+
+pytestmark = pytest.mark.usefixtures("mock_ci_languages")
+
+
+def _write_taskcluster_yml(path: Path, matrix: dict[str, Any]) -> Path:
+    result = path / ".taskcluster.yml"
+    result.write_text(
+        yaml_dump(
+            {
+                "version": 1,
+                "tasks": [
+                    {
+                        "payload": {
+                            "image": "mozillasecurity/orion-decision:latest",
+                            "command": ["ci-decision", "-v"],
+                            "env": {"CI_MATRIX": yaml_dump(matrix)},
+                        },
+                    },
+                ],
+            }
+        )
+    )
+    return result
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_ci_check(mocker: MockerFixture, tmp_path: Path, jobs: int) -> None:
+    """test that a valid matrix passes for all events"""
+    matrix = {"language": "python", "version": ["3.7"], "script": ["test"]}
+    changed = [_write_taskcluster_yml(tmp_path, matrix), tmp_path / "README.md"]
+    if jobs == 1:
+        cimatrix = mocker.patch("orion_decision.ci_check.CIMatrix", autospec=True)
+    check_matrix(Namespace(changed=changed, jobs=jobs))
+    if jobs == 1:
+        # the same matrix is rendered for every event, but only checked once
+        # per event type
+        event_types = {call[0][2] for call in cimatrix.call_args_list}
+        assert cimatrix.call_count == len(event_types) == 3
+        assert all(call[0][0] == matrix for call in cimatrix.call_args_list)
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_ci_check_error(tmp_path: Path, jobs: int) -> None:
+    """test that an invalid matrix fails"""
+    matrix = {"language": "python", "version": ["1.0"], "script": ["test"]}
+    changed = [_write_taskcluster_yml(tmp_path, matrix)]
+    with pytest.raises(AssertionError, match="unknown version"):
+        check_matrix(Namespace(changed=changed, jobs=jobs))
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_ci_check_no_matrix(tmp_path: Path, jobs: int) -> None:
+    """test that a .taskcluster.yml without a CI matrix passes"""
+    changed = tmp_path / ".taskcluster.yml"
+    changed.write_text(
+        yaml_dump(
+            {
+                "version": 1,
+                "tasks": [{"payload": {"image": "other", "command": ["true"]}}],
+            }
+        )
+    )
+    check_matrix(Namespace(changed=[changed], jobs=jobs))
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_ci_check_render_error(tmp_path: Path, jobs: int) -> None:
+    """test that render errors name the file and event"""
+    changed = tmp_path / ".taskcluster.yml"
+    changed.write_text(yaml_dump({"version": 1, "tasks": {"$eval": "nope"}}))
+    with pytest.raises(RuntimeError, match=f"Error rendering {changed} for event"):
+        check_matrix(Namespace(changed=[changed], jobs=jobs))
@@ -6,16 +6,20 @@
 from pathlib import Path
 
 import pytest
+from jsonschema.exceptions import ValidationError
 from yaml import safe_load as yaml_load
 
 from orion_decision.ci_matrix import (
     CIArtifact,
+    CICache,
     CIMatrix,
     CISecret,
     CISecretEnv,
     CISecretFile,
     CISecretKey,
     MatrixJob,
+    _validator_by_name,
+    job_dependencies,
 )
 
 FIXTURES = (Path(__file__).parent / "fixtures").resolve()
@@ -37,6 +41,8 @@ pytestmark = pytest.mark.usefixtures("mock_ci_languages")
         "matrix07",
         # artifacts
         "matrix08",
+        # shards
+        "matrix09",
     ],
 )
 def test_matrix_load(fixture: str) -> None:
@@ -89,6 +95,67 @@ def test_matrix_unused(caplog: pytest.LogCaptureFixture) -> None:
     assert any(rec.levelname == "WARNING" for rec in caplog.get_records("call"))
 
 
+@pytest.mark.parametrize(
+    "include",
+    [
+        # exact duplicate of a product job
+        {"version": "3.6", "env": {"A": "1"}},
+        # env is a subset of a product job
+        {"version": "3.6", "env": {}},
+        # duplicate of an earlier include
+        {"version": "3.9", "env": {"A": "1"}},
+    ],
+)
+def test_matrix_include_duplicate(include: dict[str, object]) -> None:
+    """test that included jobs which already exist are rejected"""
+    obj = {
+        "language": "python",
+        "version": ["3.6", "3.7"],
+        "env": [{"A": "1"}, {"A": "2"}],
+        "script": ["test"],
+        "jobs": {
+            "exclude": [{"version": "3.7", "env": {"A": "2"}}],
+            "include": [{"version": "3.9", "env": {"A": "1"}}, include],
+        },
+    }
+    with pytest.raises(AssertionError, match="already exists"):
+        CIMatrix(obj, "master", False)
+
+
+def test_matrix_include_exclude() -> None:
+    """test that excluded jobs can be included again"""
+    obj = {
+        "language": "python",
+        "version": ["3.6", "3.7"],
+        "env": [{"A": "1"}, {"A": "2"}],
+        "script": ["test"],
+        "jobs": {
+            "exclude": [{"version": "3.7"}, {"env": {"A": "2"}}],
+            "include": [{"version": "3.7", "env": {"A": "1", "B": "2"}}],
+        },
+    }
+    mtx = CIMatrix(obj, "master", False)
+    assert {job.key for job in mtx.jobs} == {
+        ("python", "3.6", "linux", frozenset({("A", "1")}), ("test",)),
+        ("python", "3.7", "linux", frozenset({("A", "1"), ("B", "2")}), ("test",)),
+    }
+
+
+def test_matrix_shard_env() -> None:
+    """test that sharded jobs can't set the shard variables"""
+    obj = {
+        "language": "python",
+        "version": ["3.7"],
+        "env": [{"CI_SHARD_TOTAL": "1"}],
+        "script": ["test"],
+        "shards": 2,
+    }
+    with pytest.raises(AssertionError, match="CI_SHARD_INDEX"):
+        CIMatrix(obj, "master", False)
+    obj["shards"] = 1
+    assert len(CIMatrix(obj, "master", False).jobs) == 1
+
+
 @pytest.mark.parametrize(
     "secrets",
     [
@@ -120,6 +187,7 @@ def test_matrix_job_serialize(
     )
     job.secrets.extend(secrets)
     job.artifacts.extend(artifacts)
+    job.caches.append(CICache("/cache", ["poetry.lock"]))
     job_json = str(job)
     if secrets:
         assert all(secret.secret in job_json for secret in secrets if secret)
@@ -146,3 +214,101 @@ def test_matrix_secret_serialize(secret: CISecret) -> None:
     """test that CISecret serialize/deserialize is lossless"""
     secret2 = CISecret.from_json(str(secret))
     assert secret == secret2
+
+
+def test_matrix_cache(tmp_path: Path) -> None:
+    """test that caches are parsed and named by image, path and key contents"""
+    obj = {
+        "language": "python",
+        "version": ["3.6", "3.7"],
+        "script": ["test"],
+        "cache": [{"path": "/pip", "key": ["requirements.txt"]}],
+        "jobs": {
+            "include": [
+                {"name": "tox", "version": "3.9", "cache": [{"path": "/tox"}]},
+            ],
+        },
+    }
+    mtx = CIMatrix(obj, "master", False)
+    assert mtx.caches == [CICache("/pip", ["requirements.txt"])]
+    assert [job.caches for job in mtx.jobs] == [[], [], [CICache("/tox")]]
+
+    pip = mtx.caches[0]
+    (tmp_path / "requirements.txt").write_text("a==1")
+    name = pip.name("prefix", "py37", tmp_path)
+    assert name.startswith("prefix-")
+    assert pip.name("prefix", "py37", tmp_path) == name
+    assert pip.name("prefix", "py36", tmp_path) != name
+    assert CICache("/other", pip.key).name("prefix", "py37", tmp_path) != name
+    (tmp_path / "requirements.txt").write_text("a==2")
+    assert pip.name("prefix", "py37", tmp_path) != name
+
+    obj["jobs"]["include"][0]["cache"] = [{"path": "/pip"}]  # type: ignore
+    with pytest.raises(AssertionError, match="redefines matrix cache"):
+        CIMatrix(obj, "master", False)
+
+
+def test_matrix_needs() -> None:
+    """test that `needs` creates dependencies between jobs (including shards)"""
+    obj = {
+        "language": "python",
+        "version": ["3.7"],
+        "script": ["test"],
+        "jobs": {
+            "include": [
+                {"name": "lint", "script": ["lint"], "shards": 2},
+                {"name": "docs", "script": ["docs"]},
+                {"name": "release", "script": ["release"], "needs": ["lint"]},
+            ],
+        },
+    }
+    mtx = CIMatrix(obj, "master", False)
+    jobs = {job.name: idx for idx, job in enumerate(mtx.jobs)}
+    release = mtx.jobs[jobs["release"]]
+    assert release.needs == ["lint (shard 1/2)", "lint (shard 2/2)"]
+    assert release.require_previous_stage_pass
+    deps = job_dependencies(mtx.jobs)
+    assert deps[jobs["release"]] == [jobs["lint (shard 1/2)"], jobs["lint (shard 2/2)"]]
+    assert all(not deps[idx] for name, idx in jobs.items() if name != "release")
+
+    # jobs without `needs` still depend on the previous stage
+    mtx.jobs[jobs["docs"]].stage = 2
+    assert deps[jobs["release"]] == job_dependencies(mtx.jobs)[jobs["release"]]
+    assert len(job_dependencies(mtx.jobs)[jobs["docs"]]) == len(mtx.jobs) - 1
+
+    # release can't run after docs, which runs after release
+    release.needs.append("docs")
+    with pytest.raises(AssertionError, match="cycle"):
+        job_dependencies(mtx.jobs)
+
+
+@pytest.mark.parametrize(
+    "include, error",
+    [
+        ({"needs": ["nope"]}, "unknown job"),
+        ({"needs": ["release"]}, "must not need itself"),
+        ({"needs": ["lint"], "when": {"all_passed": True}}, "all_passed"),
+    ],
+)
+def test_matrix_needs_invalid(include: dict[str, object], error: str) -> None:
+    """test that invalid `needs` are rejected"""
+    obj = {
+        "language": "python",
+        "version": ["3.7"],
+        "script": ["test"],
+        "jobs": {
+            "include": [
+                {"name": "lint", "script": ["lint"]},
+                {"name": "release", "script": ["release"], **include},
+            ],
+        },
+    }
+    with pytest.raises(AssertionError, match=error):
+        CIMatrix(obj, "master", "push")
+
+
+def test_matrix_validator_cache() -> None:
+    """test that schema validators are built once and still reject bad input"""
+    assert _validator_by_name("CIArtifact") is _validator_by_name("CIArtifact")
+    with pytest.raises(ValidationError):
+        CIArtifact.from_json({"type": "file", "src": "/src"})
@@ -5,24 +5,33 @@
 
 from datetime import datetime, timezone
 from json import dumps as json_dump
+from json import loads as json_load
 from pathlib import Path
+from typing import Any
 
 import pytest
 from freezegun import freeze_time
 from pytest_mock import MockerFixture
+from taskcluster.exceptions import TaskclusterRestFailure
 from taskcluster.utils import stringDate
 from yaml import safe_load as yaml_load
 
 from orion_decision import DEADLINE, MAX_RUN_TIME, PROVISIONER_ID
 from orion_decision.ci_matrix import (
     CIArtifact,
+    CICache,
     CISecret,
     CISecretEnv,
     CISecretFile,
     CISecretKey,
     MatrixJob,
 )
-from orion_decision.ci_scheduler import TEMPLATES, WORKER_TYPES, CIScheduler
+from orion_decision.ci_scheduler import (
+    TEMPLATES,
+    WORKER_TYPES,
+    CIScheduler,
+    cancel_sibling_jobs,
+)
 from orion_decision.git import GithubEvent
 
 FIXTURES = (Path(__file__).parent / "fixtures").resolve()
@@ -34,13 +43,17 @@ def test_ci_main(mocker: MockerFixture, commit_message: str | None) -> None:
     """test CI scheduler main"""
     evt = mocker.patch("orion_decision.ci_scheduler.GithubEvent", autospec=True)
     mtx = mocker.patch("orion_decision.ci_scheduler.CIMatrix", autospec=True)
+    mtx.return_value.fail_fast = False
+    mtx.return_value.reuse_results = False
     create = mocker.patch.object(CIScheduler, "create_tasks", autospec=True)
+    mocker.patch.object(CIScheduler, "skip_event", return_value=False)
     if commit_message is not None:
-        evt.from_taskcluster.return_value.commit_message = commit_message
+        evt.from_payload.return_value.commit_message = commit_message
     args = mocker.Mock(dry_run=False)
     assert CIScheduler.main(args) == 0
-    assert evt.from_taskcluster.call_count == 1
-    assert evt.from_taskcluster.return_value.cleanup.call_count == 1
+    assert evt.from_payload.call_count == 1
+    assert evt.from_payload.return_value.clone.call_count == 1
+    assert evt.from_payload.return_value.cleanup.call_count == 1
     assert mtx.call_count == 1
     assert create.call_count == 1
     # get the scheduler instance from create call args
@@ -49,6 +62,38 @@ def test_ci_main(mocker: MockerFixture, commit_message: str | None) -> None:
     assert sched.dry_run == bool(commit_message)
 
 
+def test_ci_main_skip(mocker: MockerFixture) -> None:
+    """test CI scheduler main exits before cloning when the event is skipped"""
+    taskcluster = mocker.patch("orion_decision.ci_scheduler.Taskcluster", autospec=True)
+    evt = mocker.patch("orion_decision.ci_scheduler.GithubEvent", autospec=True)
+    mtx = mocker.patch("orion_decision.ci_scheduler.CIMatrix", autospec=True)
+    mtx.return_value.fail_fast = False
+    mtx.return_value.reuse_results = False
+    mocker.patch.object(CIScheduler, "skip_event", return_value=True)
+    args = mocker.Mock(dry_run=False)
+    assert CIScheduler.main(args) == 0
+    assert evt.from_payload.call_count == 1
+    assert evt.from_payload.return_value.clone.call_count == 0
+    assert taskcluster.get_service.call_count == 0
+    assert mtx.call_count == 0
+
+
+@pytest.mark.parametrize(
+    "commit_message, skip",
+    [(None, False), ("test", False), ("[skip ci]", True), ("test\n[skip tc]", True)],
+)
+def test_ci_skip_message(
+    mocker: MockerFixture, commit_message: str | None, skip: bool
+) -> None:
+    """test CI skip command in payload commit message"""
+    evt = mocker.Mock(spec=GithubEvent())
+    evt.pull_request_refs.return_value = []
+    evt.event_type = "push"
+    evt.branch = "dev"
+    evt.commit_message = commit_message
+    assert CIScheduler.skip_event(evt) == skip
+
+
 def test_ci_create_01(mocker: MockerFixture) -> None:
     """test no CI task creation"""
     taskcluster = mocker.patch("orion_decision.ci_scheduler.Taskcluster", autospec=True)
@@ -58,8 +103,9 @@ def test_ci_create_01(mocker: MockerFixture) -> None:
         event_type="push",
         spec=GithubEvent(),
     )
-    evt.repo.refs.return_value = {}
-    mocker.patch("orion_decision.ci_scheduler.CIMatrix", autospec=True)
+    mtx = mocker.patch("orion_decision.ci_scheduler.CIMatrix", autospec=True)
+    mtx.return_value.fail_fast = False
+    mtx.return_value.reuse_results = False
     sched = CIScheduler("test", evt, "group", "scheduler", {})
     sched.create_tasks()
     assert queue.createTask.call_count == 0
@@ -99,8 +145,9 @@ def test_ci_create_02(
         user="testuser",
         spec=GithubEvent(),
     )
-    evt.repo.refs.return_value = {}
     mtx = mocker.patch("orion_decision.ci_scheduler.CIMatrix", autospec=True)
+    mtx.return_value.fail_fast = False
+    mtx.return_value.reuse_results = False
     job = MatrixJob(
         name="testjob",
         language="python",
@@ -241,8 +288,9 @@ def test_ci_create_03(mocker: MockerFixture, previous_pass: bool) -> None:
         tag=None,
         spec=GithubEvent(),
     )
-    evt.repo.refs.return_value = {}
     mtx = mocker.patch("orion_decision.ci_scheduler.CIMatrix", autospec=True)
+    mtx.return_value.fail_fast = False
+    mtx.return_value.reuse_results = False
     job1 = MatrixJob(
         name="testjob1",
         language="python",
@@ -301,38 +349,355 @@ def test_ci_create_03(mocker: MockerFixture, previous_pass: bool) -> None:
     assert task2 == expected
 
 
-@pytest.mark.parametrize("branch, tasks", [("dev", 0), ("main", 1), ("master", 1)])
-def test_ci_create_04(mocker: MockerFixture, branch: str, tasks: int) -> None:
-    """test PR push task skipped"""
+def test_ci_create_04(mocker: MockerFixture) -> None:
+    """test images are resolved once and stage tasks are all created"""
     taskcluster = mocker.patch("orion_decision.ci_scheduler.Taskcluster", autospec=True)
     queue = mocker.Mock()
     index = mocker.Mock()
-    index.findTask.return_value = {"taskId": "msys-task"}
+    index.findTask.side_effect = lambda path: {"taskId": f"task-{path.split('.')[3]}"}
     taskcluster.get_service.side_effect = lambda x: {"index": index, "queue": queue}[x]
     evt = mocker.Mock(
-        branch=branch,
+        branch="dev",
         event_type="push",
-        ssh_url="ssh://repo",
         http_url="test://repo",
         fetch_ref="fetchref",
+        commit="commit",
+        user="testuser",
         repo_slug="project/test",
         tag=None,
+        spec=GithubEvent(),
+    )
+    mtx = mocker.patch("orion_decision.ci_scheduler.CIMatrix", autospec=True)
+    mtx.return_value.fail_fast = False
+    mtx.return_value.reuse_results = False
+    jobs = [
+        MatrixJob(
+            name=f"testjob{num}",
+            language="python",
+            version=version,
+            platform=platform,
+            env={},
+            script=["test"],
+        )
+        for num, (platform, version) in enumerate(
+            [
+                ("windows", "3.7"),
+                ("windows", "3.7"),
+                ("macos", "3.7"),
+                ("macos", "3.7"),
+                ("linux", "3.7"),
+            ]
+        )
+    ]
+    mtx.return_value.jobs = jobs
+    mtx.return_value.secrets = []
+    mtx.return_value.artifacts = []
+    sched = CIScheduler("test", evt, "group", "scheduler", {})
+    sched.create_tasks()
+    images = {job.image for job in jobs if job.platform != "linux"}
+    assert index.findTask.call_count == len(images)
+    assert set(sched.image_tasks) == images
+    assert queue.createTask.call_count == len(jobs)
+    names = {call[0][1]["metadata"]["name"] for call in queue.createTask.call_args_list}
+    assert len(names) == len(jobs)
+    # images already resolved are not looked up again
+    sched.resolve_images()
+    assert index.findTask.call_count == len(images)
+
+
+@pytest.mark.parametrize(
+    "event_type, trust",
+    (("push", "trusted"), ("release", "trusted"), ("pull_request", "untrusted")),
+)
+@pytest.mark.parametrize("platform", ("linux", "windows"))
+def test_ci_create_05(
+    mocker: MockerFixture, platform: str, event_type: str, trust: str
+) -> None:
+    """test CI task creation with caches"""
+    taskcluster = mocker.patch("orion_decision.ci_scheduler.Taskcluster", autospec=True)
+    queue = mocker.Mock()
+    index = mocker.Mock()
+    index.findTask.return_value = {"taskId": "msys-task"}
+    taskcluster.get_service.side_effect = lambda x: {"index": index, "queue": queue}[x]
+    evt = mocker.Mock(
+        branch="dev",
+        event_type=event_type,
+        http_url="test://repo",
+        fetch_ref="fetchref",
         commit="commit",
         user="testuser",
+        repo_slug="project/test",
+        repo=None,
+        tag=None,
         spec=GithubEvent(),
     )
-    evt.repo.refs.return_value = {"HEAD": "commit", "refs/pull/1/head": "commit"}
     mtx = mocker.patch("orion_decision.ci_scheduler.CIMatrix", autospec=True)
+    mtx.return_value.fail_fast = False
+    mtx.return_value.reuse_results = False
     job = MatrixJob(
         name="testjob",
         language="python",
         version="3.7",
-        platform="linux",
+        platform=platform,
         env={},
         script=["test"],
     )
+    job.caches.append(CICache("tox"))
     mtx.return_value.jobs = [job]
     mtx.return_value.secrets = []
+    mtx.return_value.artifacts = []
+    mtx.return_value.caches = [CICache("pip", ["requirements.txt"])]
     sched = CIScheduler("test", evt, "group", "scheduler", {})
     sched.create_tasks()
-    assert queue.createTask.call_count == tasks
+    assert queue.createTask.call_count == 1
+    _, task = queue.createTask.call_args[0]
+    names = {
+        cache.name(f"orion-ci-{trust}-project-test", job.image, None): cache.path
+        for cache in (job.caches[0], mtx.return_value.caches[0])
+    }
+    if platform == "linux":
+        assert task["payload"]["cache"] == names
+        scope = "docker-worker:cache:"
+    else:
+        mounts = task["payload"]["mounts"][1:]
+        assert {mnt["cacheName"]: mnt["directory"] for mnt in mounts} == names
+        scope = "generic-worker:cache:"
+    assert {f"{scope}{name}" for name in names} <= set(task["scopes"])
+    ci_job = json_load(task["payload"]["env"]["CI_JOB"])
+    assert len(ci_job["caches"]) == 2
+
+
+@pytest.mark.parametrize("commit_message", ("test", "test [full ci]"))
+def test_ci_create_06(mocker: MockerFixture, commit_message: str) -> None:
+    """test CI task creation reusing previous results"""
+    taskcluster = mocker.patch("orion_decision.ci_scheduler.Taskcluster", autospec=True)
+    queue = mocker.Mock()
+    index = mocker.Mock()
+    taskcluster.get_service.side_effect = lambda x: {"index": index, "queue": queue}[x]
+    evt = mocker.Mock(
+        branch="dev",
+        event_type="push",
+        http_url="test://repo",
+        fetch_ref="fetchref",
+        commit="commit",
+        commit_message=commit_message,
+        user="testuser",
+        repo_slug="project/test",
+        tag=None,
+        spec=GithubEvent(),
+    )
+    evt.repo.tree.return_value = "tree"
+    mtx = mocker.patch("orion_decision.ci_scheduler.CIMatrix", autospec=True)
+    jobs = [
+        MatrixJob(
+            name=f"testjob{num}",
+            language="python",
+            version="3.7",
+            platform="linux",
+            env={},
+            script=[f"test{num}"],
+            stage=stage,
+        )
+        for num, stage in enumerate((1, 1, 1, 2))
+    ]
+    jobs[2].secrets.append(CISecretEnv("project/test/token", "TOKEN"))
+    mtx.return_value.jobs = jobs
+    mtx.return_value.secrets = []
+    mtx.return_value.artifacts = []
+    mtx.return_value.caches = []
+    mtx.return_value.fail_fast = False
+    mtx.return_value.reuse_results = True
+    sched = CIScheduler("test", evt, "group", "scheduler", {})
+
+    def _find_task(path: str) -> dict[str, str]:
+        if path == sched.result_indexes[0]:
+            return {"taskId": "passed-task"}
+        raise TaskclusterRestFailure("not found", None, status_code=404)
+
+    index.findTask.side_effect = _find_task
+    sched.create_tasks()
+    tasks = {
+        call[0][1]["metadata"]["name"]: call[0][1]
+        for call in queue.createTask.call_args_list
+    }
+    if "[full ci]" in commit_message:
+        assert index.findTask.call_count == 0
+        assert len(tasks) == len(jobs)
+        assert not sched.result_indexes
+        return
+    # job with secrets is never reused
+    assert set(sched.result_indexes) == {0, 1, 3}
+    assert index.findTask.call_count == 3
+    assert sched.reused_results == {0: "passed-task"}
+    assert set(tasks) == {"test testjob1", "test testjob2", "test testjob3"}
+    route = f"index.{sched.result_indexes[1]}"
+    assert tasks["test testjob1"]["routes"] == [route]
+    assert f"queue:route:{route}" in tasks["test testjob1"]["scopes"]
+    assert tasks["test testjob2"]["routes"] == []
+    assert "passed-task" in tasks["test testjob3"]["dependencies"]
+    assert len(tasks["test testjob3"]["dependencies"]) == 3
+
+
+def test_ci_create_07(mocker: MockerFixture) -> None:
+    """test CI task creation with fail-fast"""
+    taskcluster = mocker.patch("orion_decision.ci_scheduler.Taskcluster", autospec=True)
+    queue = taskcluster.get_service.return_value
+    evt = mocker.Mock(
+        branch="dev",
+        event_type="push",
+        http_url="test://repo",
+        fetch_ref="fetchref",
+        commit="commit",
+        user="testuser",
+        repo_slug="project/test",
+        tag=None,
+        spec=GithubEvent(),
+    )
+    mtx = mocker.patch("orion_decision.ci_scheduler.CIMatrix", autospec=True)
+    mtx.return_value.jobs = [
+        MatrixJob(
+            name="testjob",
+            language="python",
+            version="3.7",
+            platform="linux",
+            env={},
+            script=["test"],
+        )
+    ]
+    mtx.return_value.secrets = []
+    mtx.return_value.artifacts = []
+    mtx.return_value.caches = []
+    mtx.return_value.fail_fast = True
+    mtx.return_value.reuse_results = False
+    sched = CIScheduler("test", evt, "group", "scheduler", {})
+    sched.create_tasks()
+    assert queue.createTask.call_count == 1
+    _, task = queue.createTask.call_args[0]
+    assert task["payload"]["env"]["CI_FAIL_FAST"] == "1"
+    assert task["payload"]["features"]["taskclusterProxy"]
+    assert "queue:cancel-task:scheduler/group/*" in task["scopes"]
+
+
+def test_ci_create_08(mocker: MockerFixture) -> None:
+    """test CI task creation with `needs`"""
+    taskcluster = mocker.patch("orion_decision.ci_scheduler.Taskcluster", autospec=True)
+    queue = taskcluster.get_service.return_value
+    evt = mocker.Mock(
+        branch="dev",
+        event_type="push",
+        http_url="test://repo",
+        fetch_ref="fetchref",
+        commit="commit",
+        user="testuser",
+        repo_slug="project/test",
+        tag=None,
+        spec=GithubEvent(),
+    )
+    mtx = mocker.patch("orion_decision.ci_scheduler.CIMatrix", autospec=True)
+    jobs = [
+        MatrixJob(
+            name=name,
+            language="python",
+            version="3.7",
+            platform="linux",
+            env={},
+            script=[name],
+            stage=stage,
+        )
+        for name, stage in (("release", 1), ("lint", 1), ("test", 1), ("cov", 2))
+    ]
+    jobs[0].needs.append("lint")
+    mtx.return_value.jobs = jobs
+    mtx.return_value.secrets = []
+    mtx.return_value.artifacts = []
+    mtx.return_value.caches = []
+    mtx.return_value.fail_fast = False
+    mtx.return_value.reuse_results = False
+    sched = CIScheduler("test", evt, "group", "scheduler", {})
+    sched.create_tasks()
+    assert queue.createTask.call_count == 4
+    created = [call[0] for call in queue.createTask.call_args_list]
+    names = [task["metadata"]["name"] for _, task in created]
+    task_ids = {task["metadata"]["name"]: task_id for task_id, task in created}
+    tasks = {task["metadata"]["name"]: task for _, task in created}
+    # dependencies are created first
+    assert names.index("test release") > names.index("test lint")
+    assert tasks["test release"]["dependencies"] == [task_ids["test lint"]]
+    assert tasks["test lint"]["dependencies"] == []
+    assert tasks["test cov"]["dependencies"] == [
+        task_ids["test release"],
+        task_ids["test lint"],
+        task_ids["test test"],
+    ]
+
+
+def test_ci_cancel_siblings(mocker: MockerFixture) -> None:
+    """test fail-fast cancellation of other CI tasks"""
+    taskcluster = mocker.patch("orion_decision.ci_scheduler.Taskcluster", autospec=True)
+    queue = taskcluster.get_service.return_value
+    queue.task.return_value = {"taskGroupId": "group"}
+
+    def _entry(task_id: str, state: str, job: MatrixJob | None) -> dict[str, Any]:
+        env = {} if job is None else {"CI_JOB": str(job)}
+        return {
+            "status": {"taskId": task_id, "state": state},
+            "task": {"payload": {"env": env}},
+        }
+
+    def _job(stage: int, previous_pass: bool) -> MatrixJob:
+        return MatrixJob(
+            None,
+            "python",
+            "3.7",
+            "linux",
+            {},
+            ["test"],
+            stage=stage,
+            previous_pass=previous_pass,
+        )
+
+    job = _job(1, False)
+    queue.listTaskGroup.side_effect = [
+        {
+            "tasks": [
+                _entry("decision", "running", None),
+                _entry("self", "running", job),
+                _entry("done", "completed", job),
+                _entry("same-stage", "running", job),
+            ],
+            "continuationToken": "next",
+        },
+        {
+            "tasks": [
+                _entry("needs-pass", "unscheduled", _job(2, True)),
+                _entry("runs-anyway", "unscheduled", _job(2, False)),
+                _entry("race", "pending", job),
+            ],
+        },
+    ]
+
+    def _cancel(task_id: str) -> None:
+        if task_id == "race":
+            raise TaskclusterRestFailure("conflict", None, status_code=409)
+
+    queue.cancelTask.side_effect = _cancel
+    assert cancel_sibling_jobs("self", job) == 2
+    assert queue.listTaskGroup.call_count == 2
+    assert {call[0][0] for call in queue.cancelTask.call_args_list} == {
+        "same-stage",
+        "needs-pass",
+        "race",
+    }
+
+
+@pytest.mark.parametrize(
+    "branch, skip", [("dev", True), ("main", False), ("master", False)]
+)
+def test_ci_skip_pr_push(mocker: MockerFixture, branch: str, skip: bool) -> None:
+    """test PR push task skipped"""
+    evt = mocker.Mock(spec=GithubEvent())
+    evt.pull_request_refs.return_value = ["refs/pull/1/head"]
+    evt.event_type = "push"
+    evt.branch = branch
+    evt.commit_message = None
+    assert CIScheduler.skip_event(evt) == skip
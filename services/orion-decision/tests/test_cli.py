@@ -6,12 +6,13 @@
 from json import dumps as json_dump
 from logging import DEBUG
 from pathlib import Path
+from subprocess import CalledProcessError
 from unittest.mock import MagicMock, call
 
 import pytest
 from pytest_mock import MockerFixture
 
-from orion_decision.ci_matrix import CISecretEnv
+from orion_decision.ci_matrix import CISecretEnv, CISecretKey
 from orion_decision.cli import (
     check,
     ci_check,
@@ -92,6 +93,13 @@ def test_ci_check_args() -> None:
     """test CI check argument parsing"""
     result = parse_ci_check_args(["123", "456"])
     assert result.changed == [Path("123"), Path("456")]
+    assert result.jobs is None
+    result = parse_ci_check_args(["-j", "1", "123"])
+    assert result.changed == [Path("123")]
+    assert result.jobs == 1
+    for jobs in ("0", "-1"):
+        with pytest.raises(SystemExit):
+            parse_ci_check_args(["-j", jobs, "123"])
 
 
 def test_ci_launch_args(mocker: MockerFixture) -> None:
@@ -136,6 +144,9 @@ def test_ci_launch_args(mocker: MockerFixture) -> None:
     assert result.fetch_ref == "abc"
     assert result.fetch_rev == "123"
     assert result.clone_repo == "test.allizom.org"
+    assert not result.fail_fast
+    assert result.clone_depth is None
+    assert result.git_mirror is None
 
 
 def test_logging_init(mocker: MockerFixture) -> None:
@@ -246,6 +257,8 @@ def test_ci_launch_01(
         parser.return_value.clone_repo,
         parser.return_value.fetch_ref,
         parser.return_value.fetch_rev,
+        depth=parser.return_value.clone_depth,
+        reference=parser.return_value.git_mirror,
     )
     assert chdir.call_args == call(repo.return_value.path)
     assert run.call_count == 1
@@ -287,6 +300,89 @@ def test_ci_launch_02(mocker: MockerFixture) -> None:
     assert "missing `key`" in str(exc)
 
 
+@pytest.mark.parametrize("task_id", ("task", None))
+@pytest.mark.parametrize("fail_fast", (True, False))
+def test_ci_launch_03(
+    mocker: MockerFixture, fail_fast: bool, task_id: str | None
+) -> None:
+    """test CI launch cancels other tasks when the job fails with fail-fast"""
+    mocker.patch("orion_decision.cli.configure_logging", autospec=True)
+    parser = mocker.patch("orion_decision.cli.parse_ci_launch_args", autospec=True)
+    mocker.patch("orion_decision.cli.chdir", autospec=True)
+    environ = mocker.patch("orion_decision.cli.os_environ", autospec=True)
+    run = mocker.patch("orion_decision.cli.run", autospec=True)
+    mocker.patch("orion_decision.cli.GitRepo", autospec=True)
+    cancel = mocker.patch("orion_decision.cli.cancel_sibling_jobs", autospec=True)
+    environ.copy.return_value = {}
+    parser.return_value.job.secrets = []
+    parser.return_value.fail_fast = fail_fast
+    parser.return_value.task_id = task_id
+    run.side_effect = CalledProcessError(1, ["test"])
+
+    with pytest.raises(CalledProcessError):
+        ci_launch()
+
+    if fail_fast and task_id is not None:
+        assert cancel.call_args == call(task_id, parser.return_value.job)
+    else:
+        assert cancel.call_count == 0
+
+
+def test_ci_launch_cancel_error(mocker: MockerFixture) -> None:
+    """test CI launch raises the job failure if cancelling other tasks fails"""
+    mocker.patch("orion_decision.cli.configure_logging", autospec=True)
+    parser = mocker.patch("orion_decision.cli.parse_ci_launch_args", autospec=True)
+    mocker.patch("orion_decision.cli.chdir", autospec=True)
+    environ = mocker.patch("orion_decision.cli.os_environ", autospec=True)
+    run = mocker.patch("orion_decision.cli.run", autospec=True)
+    mocker.patch("orion_decision.cli.GitRepo", autospec=True)
+    cancel = mocker.patch("orion_decision.cli.cancel_sibling_jobs", autospec=True)
+    environ.copy.return_value = {}
+    parser.return_value.job.secrets = []
+    parser.return_value.fail_fast = True
+    parser.return_value.task_id = "task"
+    run.side_effect = CalledProcessError(1, ["test"])
+    cancel.side_effect = RuntimeError("no scope")
+
+    with pytest.raises(CalledProcessError):
+        ci_launch()
+
+    assert cancel.call_count == 1
+
+
+@pytest.mark.parametrize("deploy_key", (True, False))
+def test_ci_launch_04(mocker: MockerFixture, deploy_key: bool) -> None:
+    """test CI launch fetches secrets while cloning, unless a deploy key is needed"""
+    mocker.patch("orion_decision.cli.configure_logging", autospec=True)
+    parser = mocker.patch("orion_decision.cli.parse_ci_launch_args", autospec=True)
+    mocker.patch("orion_decision.cli.chdir", autospec=True)
+    environ = mocker.patch("orion_decision.cli.os_environ", autospec=True)
+    mocker.patch("orion_decision.cli.run", autospec=True)
+    repo = mocker.patch("orion_decision.cli.GitRepo", autospec=True)
+    mocker.patch.object(CISecretKey, "get_secret_data", return_value="key")
+    write = mocker.patch.object(CISecretKey, "write", autospec=True)
+    environ.copy.return_value = {}
+    key = CISecretKey("secret", hostname=None if deploy_key else "host")
+    parser.return_value.job.secrets = [key]
+    written = []
+
+    def _clone(*_args: object, **_kwds: object) -> MagicMock:
+        written.append(write.call_count)
+        return repo.return_value
+
+    repo.side_effect = _clone
+
+    with pytest.raises(SystemExit):
+        ci_launch()
+
+    assert write.call_args == call(key, "key")
+    if deploy_key:
+        # clone must wait for the key
+        assert written == [1]
+    else:
+        assert written in ([0], [1])
+
+
 def test_check(mocker: MockerFixture) -> None:
     """test CLI check entrypoint"""
     log_init = mocker.patch("orion_decision.cli.configure_logging", autospec=True)
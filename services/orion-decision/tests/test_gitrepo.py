@@ -4,7 +4,7 @@
 """Tests for GitRepo"""
 
 from pathlib import Path
-from subprocess import CalledProcessError
+from subprocess import CalledProcessError, CompletedProcess, run
 from tempfile import gettempdir
 from unittest.mock import call
 
@@ -55,6 +55,80 @@ def test_message_2() -> None:
     assert "Initial commit" not in message
 
 
+def test_tree() -> None:
+    """test that tree hash is read"""
+    repo = GitRepo.from_existing(FIXTURES / "git01")
+    # git01 HEAD has no files, so it has the hash of the empty tree
+    assert repo.tree("HEAD") == "4b825dc642cb6eb9a060e54bf8d69288fbee4904"
+
+
+@pytest.mark.parametrize(
+    "commit, count",
+    [
+        # commit is fetched directly
+        ("f52af064b7d715ea87595e9b21f1ae6323064f88", 1),
+        # can't be fetched directly, fall back to fetching the ref
+        ("FETCH_HEAD", 3),
+    ],
+)
+def test_shallow(commit: str, count: int) -> None:
+    """test that shallow clone fetches only the requested commit"""
+    repo = GitRepo(FIXTURES / "git03", "main", commit, depth=1)
+    try:
+        assert int(repo.git("rev-list", "--count", "HEAD")) == count
+    finally:
+        repo.cleanup()
+
+
+def test_shallow_refused(mocker: MockerFixture) -> None:
+    """test that a refused shallow fetch falls back to a full fetch without retry"""
+    sleep = mocker.patch("orion_decision.retry.sleep", autospec=True)
+    real_run = run
+
+    def _run(cmd: list[str], **kwds: object) -> CompletedProcess[str]:
+        if "--depth=1" in cmd:
+            raise CalledProcessError(
+                128,
+                cmd,
+                stderr="Server does not allow request for unadvertised object",
+            )
+        return real_run(cmd, **kwds)  # type: ignore[call-overload, no-any-return]
+
+    git_run = mocker.patch("orion_decision.git.run", side_effect=_run)
+    repo = GitRepo(
+        FIXTURES / "git03", "main", "f52af064b7d715ea87595e9b21f1ae6323064f88", depth=1
+    )
+    try:
+        assert int(repo.git("rev-list", "--count", "HEAD")) == 3
+    finally:
+        repo.cleanup()
+    fetches = [c.args[0] for c in git_run.call_args_list if c.args[0][1] == "fetch"]
+    assert len(fetches) == 2
+    assert sleep.call_count == 0
+
+
+def test_reference() -> None:
+    """test that objects are borrowed from a local repository"""
+    repo = GitRepo(FIXTURES / "git03", "main", "FETCH_HEAD", reference=FIXTURES)
+    try:
+        assert repo.path is not None
+        assert not (repo.path / ".git" / "objects" / "info" / "alternates").exists()
+    finally:
+        repo.cleanup()
+    repo = GitRepo(
+        FIXTURES / "git03", "main", "FETCH_HEAD", reference=FIXTURES / "git03"
+    )
+    try:
+        assert repo.path is not None
+        alternates = repo.path / ".git" / "objects" / "info" / "alternates"
+        assert alternates.read_text().strip() == str(
+            (FIXTURES / "git03" / "objects").resolve()
+        )
+        assert "Another commit" in repo.message("HEAD")
+    finally:
+        repo.cleanup()
+
+
 def test_existing() -> None:
     """test that existing repo can be accessed and is not cleaned up"""
     root = FIXTURES / "git01"
@@ -67,10 +141,25 @@ def test_existing() -> None:
 
 
 def test_retry(mocker: MockerFixture) -> None:
-    sleep = mocker.patch("orion_decision.git.sleep", autospec=True)
+    """test that transient git errors are retried"""
+    sleep = mocker.patch("orion_decision.retry.sleep", autospec=True)
+    repo = GitRepo.from_existing(FIXTURES / "git01")
+    run = mocker.patch("orion_decision.git.run", autospec=True)
+    run.side_effect = CalledProcessError(
+        128, ["git", "fetch"], stderr="fatal: unable to access: Connection reset"
+    )
     with pytest.raises(CalledProcessError):
-        GitRepo(FIXTURES / "git-noexist", "main", "FETCH_HEAD")
+        repo.git("fetch", "origin", tries=10)
     assert sleep.call_count == 9
+    assert run.call_count == 10
+
+
+def test_retry_permanent(mocker: MockerFixture) -> None:
+    """test that permanent git errors are not retried"""
+    sleep = mocker.patch("orion_decision.retry.sleep", autospec=True)
+    with pytest.raises(CalledProcessError):
+        GitRepo(FIXTURES / "git-noexist", "main", "FETCH_HEAD")
+    assert sleep.call_count == 0
 
 
 def test_refs() -> None:
@@ -85,6 +174,15 @@ def test_refs() -> None:
     }
 
 
+def test_remote_refs() -> None:
+    """test that refs can be listed without cloning"""
+    refs = GitRepo.remote_refs(FIXTURES / "git03")
+    assert refs == {
+        "HEAD": "f52af064b7d715ea87595e9b21f1ae6323064f88",
+        "refs/heads/main": "f52af064b7d715ea87595e9b21f1ae6323064f88",
+    }
+
+
 @pytest.mark.parametrize(
     "action, event, result, repo_args",
     [
@@ -243,3 +341,60 @@ def test_github_changed(mocker: MockerFixture) -> None:
         assert changed_paths == {repo.path / "a.txt"}
     finally:
         repo.cleanup()
+
+
+@pytest.mark.parametrize(
+    "commits, message",
+    [
+        (None, None),
+        ([{"id": "post"}], None),
+        ([{"id": "post", "message": "Update README.md"}], "Update README.md"),
+        (
+            [{"id": "fork", "message": "one"}, {"id": "post", "message": "two"}],
+            "one\ntwo",
+        ),
+    ],
+)
+def test_github_payload(
+    mocker: MockerFixture, commits: list[dict[str, str]] | None, message: str | None
+) -> None:
+    """test github event parsing from payload doesn't clone"""
+    repo = mocker.patch("orion_decision.git.GitRepo")
+    event = {
+        "repository": {"full_name": "allizom/test"},
+        "ref": "refs/heads/main",
+        "after": "post",
+        "before": "pre",
+        "commits": commits,
+        "sender": {
+            "login": "me",
+        },
+    }
+    evt = GithubEvent.from_payload("github-push", event)
+    assert repo.call_count == 0
+    assert evt.repo is None
+    assert evt.clone_url == "https://github.com/allizom/test"
+    assert evt.commit_message == message
+    evt.cleanup()
+
+
+@pytest.mark.parametrize("cloned", [True, False])
+def test_github_pr_refs(mocker: MockerFixture, cloned: bool) -> None:
+    """test github lists PR refs for the event commit"""
+    repo = mocker.patch("orion_decision.git.GitRepo", autospec=True)
+    refs = {
+        "HEAD": "commit",
+        "refs/heads/dev": "commit",
+        "refs/pull/1/head": "commit",
+        "refs/pull/2/head": "other",
+    }
+    evt = GithubEvent()
+    evt.commit = "commit"
+    evt.clone_url = "https://github.com/allizom/test"
+    if cloned:
+        repo.return_value.refs.return_value = refs
+        evt.repo = repo.return_value
+    else:
+        repo.remote_refs.return_value = refs
+    assert evt.pull_request_refs() == ["refs/pull/1/head"]
+    assert repo.remote_refs.call_count == int(not cloned)
@@ -0,0 +1,95 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+"""Tests for retry policy"""
+
+from subprocess import CalledProcessError
+
+import pytest
+from pytest_mock import MockerFixture
+
+from orion_decision.retry import RetryPolicy, RetryStats, is_transient_git_error
+
+
+def test_retry_backoff(mocker: MockerFixture) -> None:
+    """test delay grows exponentially up to max_delay"""
+    mocker.patch("orion_decision.retry.random", return_value=0.0)
+    policy = RetryPolicy(initial_delay=1, max_delay=5, multiplier=2, jitter=0.5)
+    assert [policy.delay(n) for n in range(1, 6)] == [1, 2, 4, 5, 5]
+
+
+def test_retry_jitter(mocker: MockerFixture) -> None:
+    """test jitter reduces delay by at most the jitter fraction"""
+    mocker.patch("orion_decision.retry.random", return_value=1.0)
+    policy = RetryPolicy(initial_delay=4, jitter=0.5)
+    assert policy.delay(1) == 2
+
+
+def test_retry_success(mocker: MockerFixture) -> None:
+    """test call is retried until it succeeds and stats are recorded"""
+    sleep = mocker.patch("orion_decision.retry.sleep", autospec=True)
+    func = mocker.Mock(side_effect=[ValueError, ValueError, "result"])
+    stats = RetryStats()
+    policy = RetryPolicy(tries=5, initial_delay=1, jitter=0)
+    assert policy.call(func, "test", stats=stats) == "result"
+    assert func.call_count == 3
+    assert sleep.call_count == 2
+    assert stats.retries["test"] == 2
+    assert stats.time_lost["test"] == 3
+
+
+def test_retry_exhausted(mocker: MockerFixture) -> None:
+    """test last error is raised when tries are exhausted"""
+    sleep = mocker.patch("orion_decision.retry.sleep", autospec=True)
+    func = mocker.Mock(side_effect=ValueError)
+    policy = RetryPolicy(tries=5, jitter=0)
+    with pytest.raises(ValueError):
+        policy.call(func, "test", tries=3, stats=RetryStats())
+    assert func.call_count == 3
+    assert sleep.call_count == 2
+
+
+def test_retry_permanent(mocker: MockerFixture) -> None:
+    """test permanent errors are not retried"""
+    sleep = mocker.patch("orion_decision.retry.sleep", autospec=True)
+    func = mocker.Mock(side_effect=KeyError)
+    policy = RetryPolicy(tries=5)
+    with pytest.raises(KeyError):
+        policy.call(
+            func,
+            "test",
+            lambda exc: not isinstance(exc, KeyError),
+            stats=RetryStats(),
+        )
+    assert func.call_count == 1
+    assert sleep.call_count == 0
+
+
+def test_retry_deadline(mocker: MockerFixture) -> None:
+    """test retries stop when the deadline would be exceeded"""
+    sleep = mocker.patch("orion_decision.retry.sleep", autospec=True)
+    mocker.patch("orion_decision.retry.monotonic", side_effect=[0, 0, 3, 10])
+    func = mocker.Mock(side_effect=ValueError)
+    policy = RetryPolicy(tries=10, initial_delay=2, jitter=0, deadline=10)
+    with pytest.raises(ValueError):
+        policy.call(func, "test", stats=RetryStats())
+    # 0 + 2 <= 10: retry, 3 + 4 <= 10: retry, 10 + 8 > 10: give up
+    assert func.call_count == 3
+    assert sleep.call_count == 2
+
+
+@pytest.mark.parametrize(
+    "stderr, transient",
+    [
+        ("fatal: unable to access: Connection reset by peer", True),
+        ("fatal: the remote end hung up unexpectedly", True),
+        ("fatal: couldn't find remote ref refs/heads/nope", False),
+        ("ERROR: Repository not found.", False),
+        (None, True),
+    ],
+)
+def test_git_error_class(stderr: str | None, transient: bool) -> None:
+    """test git errors are classified"""
+    exc = CalledProcessError(128, ["git", "fetch"], stderr=stderr)
+    assert is_transient_git_error(exc) == transient
+    assert not is_transient_git_error(FileNotFoundError())
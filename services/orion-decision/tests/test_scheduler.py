@@ -45,15 +45,32 @@ def test_main(mocker: MockerFixture) -> None:
     svcs = mocker.patch("orion_decision.scheduler.Services", autospec=True)
     mark = mocker.patch.object(Scheduler, "mark_services_for_rebuild", autospec=True)
     create = mocker.patch.object(Scheduler, "create_tasks", autospec=True)
+    skip = mocker.patch.object(Scheduler, "skip_event", return_value=False)
     args = mocker.Mock()
     assert Scheduler.main(args) == 0
+    assert skip.call_count == 1
     assert svcs.call_count == 1
-    assert evt.from_taskcluster.call_count == 1
-    assert evt.from_taskcluster.return_value.cleanup.call_count == 1
+    assert evt.from_payload.call_count == 1
+    assert evt.from_payload.return_value.clone.call_count == 1
+    assert evt.from_payload.return_value.cleanup.call_count == 1
     assert mark.call_count == 1
     assert create.call_count == 1
 
 
+def test_main_skip(mocker: MockerFixture) -> None:
+    """test scheduler main exits before cloning when the event is skipped"""
+    taskcluster = mocker.patch("orion_decision.scheduler.Taskcluster", autospec=True)
+    evt = mocker.patch("orion_decision.scheduler.GithubEvent", autospec=True)
+    svcs = mocker.patch("orion_decision.scheduler.Services", autospec=True)
+    mocker.patch.object(Scheduler, "skip_event", return_value=True)
+    args = mocker.Mock()
+    assert Scheduler.main(args) == 0
+    assert evt.from_payload.call_count == 1
+    assert evt.from_payload.return_value.clone.call_count == 0
+    assert taskcluster.get_service.call_count == 0
+    assert svcs.call_count == 0
+
+
 def test_mark_rebuild_force_all(mocker: MockerFixture) -> None:
     """test that "/force-rebuild" marks all services dirty"""
     root = FIXTURES / "services03"
@@ -184,7 +201,6 @@ def test_create_push(mocker: MockerFixture) -> None:
     evt.repo.git = mocker.Mock(
         return_value="\n".join(str(p) for p in root.glob("**/*"))
     )
-    evt.repo.refs.return_value = {}
     evt.commit = "commit"
     evt.branch = "push"
     evt.event_type = "push"
@@ -309,21 +325,12 @@ def test_create_deps(mocker: MockerFixture) -> None:
     assert task2 == expected2
 
 
-def test_create_release(mocker: MockerFixture) -> None:
-    """test no tasks are created for release event"""
-    taskcluster = mocker.patch("orion_decision.scheduler.Taskcluster", autospec=True)
-    queue = taskcluster.get_service.return_value
-    root = FIXTURES / "services03"
+def test_skip_release(mocker: MockerFixture) -> None:
+    """test release event is skipped"""
     evt = mocker.Mock(spec=GithubEvent())
-    evt.repo.path = root
-    evt.repo.git = mocker.Mock(
-        return_value="\n".join(str(p) for p in root.glob("**/*"))
-    )
     evt.event_type = "release"
-    sched = Scheduler(evt, "group", "scheduler", "secret", "push")
-    sched.services["test1"].dirty = True
-    sched.create_tasks()
-    assert queue.createTask.call_count == 0
+    assert Scheduler.skip_event(evt, "push")
+    assert evt.pull_request_refs.call_count == 0
 
 
 def test_create_dry_run(mocker: MockerFixture) -> None:
@@ -336,7 +343,6 @@ def test_create_dry_run(mocker: MockerFixture) -> None:
     evt.repo.git = mocker.Mock(
         return_value="\n".join(str(p) for p in root.glob("**/*"))
     )
-    evt.repo.refs.return_value = {}
     evt.event_type = "push"
     evt.commit = "commit"
     evt.branch = "push"
@@ -761,27 +767,24 @@ def test_create_test_only(mocker: MockerFixture) -> None:
     assert task == expected
 
 
-@pytest.mark.parametrize("branch, tasks", [("dev", 0), ("main", 0), ("push", 2)])
-def test_create_pr_no_push(mocker: MockerFixture, branch: str, tasks: int) -> None:
-    """test push in PR task creation skipped"""
-    taskcluster = mocker.patch("orion_decision.scheduler.Taskcluster", autospec=True)
-    queue = taskcluster.get_service.return_value
-    root = FIXTURES / "services03"
+@pytest.mark.parametrize(
+    "branch, pr_refs, skip",
+    [
+        ("dev", ["refs/pull/1/head"], True),
+        ("main", ["refs/pull/1/head"], True),
+        ("push", ["refs/pull/1/head"], False),
+        ("dev", [], False),
+    ],
+)
+def test_skip_pr_push(
+    mocker: MockerFixture, branch: str, pr_refs: list[str], skip: bool
+) -> None:
+    """test push in PR branch is skipped"""
     evt = mocker.Mock(spec=GithubEvent())
-    evt.repo.path = root
-    evt.repo.git = mocker.Mock(
-        return_value="\n".join(str(p) for p in root.glob("**/*"))
-    )
-    evt.repo.refs.return_value = {"HEAD": "commit", "refs/pull/1/head": "commit"}
-    evt.commit = "commit"
+    evt.pull_request_refs.return_value = pr_refs
     evt.event_type = "push"
     evt.branch = branch
-    evt.http_url = "https://example.com"
-    evt.pull_request = None
-    sched = Scheduler(evt, "group", "scheduler", "secret", "push")
-    sched.services["test1"].dirty = True
-    sched.create_tasks()
-    assert queue.createTask.call_count == tasks
+    assert Scheduler.skip_event(evt, "push") == skip
 
 
 @freeze_time()
@@ -882,7 +885,6 @@ def test_create_push_multiarch(mocker: MockerFixture) -> None:
     evt.repo.git = mocker.Mock(
         return_value="\n".join(str(p) for p in root.glob("**/*"))
     )
-    evt.repo.refs.return_value = {}
     evt.commit = "commit"
     evt.branch = "push"
     evt.event_type = "push"